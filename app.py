@@ -1,91 +1,1004 @@
-from flask import Flask, jsonify, request
-from database.db_manager import DBManager
-from utils.logger import logger  # 导入日志
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import pymysql
+from datetime import datetime, timedelta
+from flask import Flask, Response, g, jsonify, request
+from database import catalog_changes, catalog_stats, snapshot_publish
+from database.db_manager import DBManager, DatabaseUnavailableError, PoolTimeoutError, get_pool, is_connection_error
+from run_ledger import summarize
+from utils import metrics
+from utils.cache import VersionTracker, build_response_cache
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError
+from utils.logger import logger, access_sample  # 导入日志
 
 app = Flask(__name__)
 
+# ===============================
+# 指标 (Metrics)
+# ===============================
+# 路由用 url_rule (例如 /api/products/<path:name>/history) 而不是真实路径做标签，
+# 否则每个商品名都会变成一条新的时间序列 (标签基数爆炸)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "saucemall_http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+DB_QUERY_SECONDS = metrics.histogram(
+    "saucemall_db_query_seconds", "API query execution time (execute + fetch)", ["query"])
+
+# ===============================
+# 响应缓存 (Response Cache)
+# ===============================
+def _load_snapshot_version():
+    """查询当前快照版本号，查不到 (表还没建 / 数据库异常) 返回 None，此时不走缓存"""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(version) AS version FROM snapshot_versions")
+            return cursor.fetchone()['version']
+    except Exception as e:
+        logger.warning("Failed to load snapshot version: {}", e)
+        return None
+
+response_cache = build_response_cache()
+snapshot_version = VersionTracker(_load_snapshot_version, interval=float(os.getenv('CACHE_VERSION_CHECK_INTERVAL', 1)))
+
+# 连接池 / 响应缓存已经有现成的统计数字，渲染 /api/metrics 时直接读出来
+for _key in ("in_use", "idle", "size"):
+    metrics.gauge(f"saucemall_db_pool_{_key}", f"Connection pool {_key} connections",
+                  fn=lambda key=_key: get_pool().stats()[key])
+for _key in ("checkouts", "timeouts", "created", "health_check_failures"):
+    metrics.counter(f"saucemall_db_pool_{_key}_total", f"Connection pool {_key}",
+                    fn=lambda key=_key: get_pool().stats()[key])
+for _key in ("entries", "bytes"):
+    metrics.gauge(f"saucemall_response_cache_{_key}", f"Response cache {_key}",
+                  fn=lambda key=_key: response_cache.stats()[key])
+for _key in ("hits", "shared_hits", "stale_hits", "misses", "evictions"):
+    metrics.counter(f"saucemall_response_cache_{_key}_total", f"Response cache {_key}",
+                    fn=lambda key=_key: response_cache.stats()[key])
+CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+metrics.gauge("saucemall_db_circuit_state", "Database circuit breaker state (0=closed, 1=half_open, 2=open)",
+              fn=lambda: CIRCUIT_STATES[get_pool().breaker.state])
+metrics.counter("saucemall_db_circuit_rejected_total", "Requests rejected by the open database circuit",
+                fn=lambda: get_pool().breaker.rejected)
+
+# ===============================
+# 数据库不可用时的降级 (Fail Fast)
+# ===============================
+# 熔断器打开 / 连不上 / 连接池借不到连接：一律快速返回 503 + Retry-After，
+# /api/products 在有旧缓存时返回上一份快照 (X-Cache: STALE)，而不是让请求挂到连接超时。
+# SQL 写错、锁等待超时这类服务端错误 pymysql 也抛 OperationalError，它们不是"数据库不可用"，照常走 500。
+def _db_unavailable(error):
+    return isinstance(error, (CircuitOpenError, PoolTimeoutError)) or is_connection_error(error)
+
+def _service_unavailable(error):
+    """503 + Retry-After (秒)，告诉客户端 / 负载均衡多久之后再来"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        breaker = get_pool().breaker
+        retry_after = breaker.retry_after() if breaker is not None else 1
+    logger.warning("数据库不可用，返回 503: {}", error)
+    response = jsonify({"code": 503, "error": "Database temporarily unavailable"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
 # ===============================
 # API 定义部分
 # ===============================
 
+# 响应压缩：超过这个字节数、且客户端支持时才 gzip (小响应压缩反而不划算)
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+
+# 分页参数：单页最多返回多少条
+MAX_PAGE_SIZE = 1000
+# 流式输出格式 -> Content-Type
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+# 商品名搜索：q 最长多少个字符；FULLTEXT 能索引的最短词长 (和 MySQL 的 innodb_ft_min_token_size 保持一致)
+SEARCH_MAX_LENGTH = 100
+SEARCH_MIN_TOKEN = int(os.getenv('SEARCH_MIN_TOKEN', 3))
+_SEARCH_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def _search_clause(q):
+    """
+    把搜索词翻译成走索引的 WHERE 条件，返回 (sql 片段, 参数)
+    面试亮点：为什么不用 name LIKE '%backpack%'？
+    前后都带 % 的 LIKE 用不了索引，只能全表扫描，商品到几十万件时每次搜索都要几百毫秒。
+    - 词够长：FULLTEXT 布尔模式，每个词变成 "+词*" (必须出现、按词前缀匹配)，
+      "back pack" -> "+back* +pack*"，走 ft_products_name 倒排索引；
+    - 只有短词 (FULLTEXT 不收录)：退化成整个商品名的前缀匹配 name LIKE 'q%'，走 idx_products_name。
+    词是用正则切出来的，用户输入里的 + - * " 等布尔运算符不会被带进 AGAINST()。
+    """
+    tokens = [t for t in _SEARCH_TOKEN.findall(q) if len(t) >= SEARCH_MIN_TOKEN]
+    if tokens:
+        return " AND MATCH(name) AGAINST (%s IN BOOLEAN MODE)", [" ".join(f"+{t}*" for t in tokens)]
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return " AND name LIKE %s", [escaped + "%"]
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     """
     获取商品列表接口
     支持筛选参数: min_price, max_price
+    支持搜索参数: q (按商品名搜索，走 FULLTEXT / 前缀索引，可以和价格筛选、分页一起用)
+    支持分页参数: limit, after (游标分页，after 传上一页返回的 next_after，形如 "<快照版本号>:<id>"；
+                 翻页过程中快照换了版本时返回 410，客户端需要从第一页重新翻)
+    支持流式输出: stream=ndjson | json (服务端游标，边读边写，内存占用恒定；
+                 next_after 只在 json 模式的结尾给出)
     """
     # 记录请求日志
-    logger.info(f"收到 API 请求: {request.full_path}")
-    
-    db = DBManager()
+    # 访问日志按 LOG_ACCESS_SAMPLE 采样，高并发时不必每个请求都写一行
+    if access_sample():
+        logger.info("收到 API 请求: {}", request.full_path)
     
     # 1. 获取 URL 参数
     min_price = request.args.get('min_price')
     max_price = request.args.get('max_price')
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    stream = request.args.get('stream')
+    q = request.args.get('q')
 
+    # ===============================
+    # 2. 动态 SQL 构建 (Dynamic SQL)
+    # ===============================
+    # id 只用来做稳定排序和游标，不返回给客户端
+    sql = "SELECT id, name, price, scraped_at FROM products WHERE 1=1"
+    params = []
+    # 规范化后的查询条件 (字符串 -> 数字)，作为缓存 key 的一部分
+    # "?min_price=10" 和 "?min_price=10.0" 会命中同一条缓存
+    query = {}
+
+    # 2.1 处理 min_price 参数
+    if min_price:
+        try:
+            query['min_price'] = float(min_price)
+            sql += " AND price >= %s"
+            params.append(query['min_price'])
+        except ValueError:
+            logger.warning("Invalid min_price parameter: {}", min_price)
+            return jsonify({"code": 400, "error": "min_price must be a number"}), 400
+    
+    # 2.2 处理 max_price 参数
+    if max_price:
+        try:
+            query['max_price'] = float(max_price)
+            sql += " AND price <= %s"
+            params.append(query['max_price'])
+        except ValueError:
+            logger.warning("Invalid max_price parameter: {}", max_price)
+            return jsonify({"code": 400, "error": "max_price must be a number"}), 400
+
+    # 2.3 处理搜索参数：大小写和多余空格规范化后再进缓存 key ("Backpack " 和 "backpack" 是同一个查询)
+    if q:
+        q = " ".join(q.split()).lower()
+        if len(q) > SEARCH_MAX_LENGTH:
+            return jsonify({"code": 400, "error": f"q must be at most {SEARCH_MAX_LENGTH} characters"}), 400
+        if q:
+            query['q'] = q
+            clause, clause_params = _search_clause(q)
+            sql += clause
+            params.extend(clause_params)
+
+    # 2.4 处理分页参数 (Keyset Pagination)
+    # 面试亮点：为什么不用 LIMIT offset, size？
+    # OFFSET 越大，MySQL 要扫描再丢弃的行就越多，翻到后面越来越慢；
+    # 游标分页用 "id > 上一页最后一个 id"，每一页都是一次索引范围扫描。
     try:
-        db.connect()
-        with db.conn.cursor() as cursor:
-            # ===============================
-            # 2. 动态 SQL 构建 (Dynamic SQL)
-            # ===============================
-            sql = "SELECT name, price, scraped_at FROM products WHERE 1=1"
-            params = []
-
-            # 2.1 处理 min_price 参数
-            if min_price:
-                try:
-                    sql += " AND price >= %s"
-                    params.append(float(min_price))
-                except ValueError:
-                    logger.warning(f"Invalid min_price parameter: {min_price}")
-                    return jsonify({"code": 400, "error": "min_price must be a number"}), 400
-            
-            # 2.2 处理 max_price 参数
-            if max_price:
-                try:
-                    sql += " AND price <= %s"
-                    params.append(float(max_price))
-                except ValueError:
-                    logger.warning(f"Invalid max_price parameter: {max_price}")
-                    return jsonify({"code": 400, "error": "max_price must be a number"}), 400
+        page_size = int(limit) if limit else None
+        if page_size is not None and not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(limit)
+    except ValueError:
+        logger.warning("Invalid limit parameter: {}", limit)
+        return jsonify({"code": 400, "error": f"limit must be an integer between 1 and {MAX_PAGE_SIZE}"}), 400
+    # 游标里带上快照版本号：每次换快照 (CREATE TABLE ... LIKE 会重置自增) 行 id 都会重新编号，
+    # 拿旧版本的 id 去新快照里翻页会静默地漏行 / 重复，所以版本对不上时直接 410
+    version = snapshot_version.current()
+    if after:
+        try:
+            cursor_version, after_id = (int(part) for part in after.split(":"))
+        except ValueError:
+            logger.warning("Invalid after parameter: {}", after)
+            return jsonify({"code": 400, "error": "after must be a cursor returned as next_after"}), 400
+        # 数据库暂时不可用时 version 为 None，按最近一次已知的版本校验 (降级返回的旧缓存就是那个版本的)
+        known = version if version is not None else snapshot_version.last_known
+        if cursor_version != (known or 0):
+            return _stale_cursor(cursor_version, version)
+        query['after'] = after_id
+        sql += " AND id > %s"
+        params.append(after_id)
 
+    # 2.5 稳定排序：同样的参数，每次返回的顺序都一样，翻页才不会重复/漏数据
+    sql += " ORDER BY id"
+    if page_size is not None:
+        query['limit'] = page_size
+        # 多取一条，用来判断还有没有下一页
+        sql += " LIMIT %s"
+        params.append(page_size + 1)
+
+    # 2.6 流式输出 (大结果集)
+    if stream:
+        if stream not in STREAM_FORMATS:
+            return jsonify({"code": 400, "error": "stream must be one of ndjson, json"}), 400
+        # 流式响应的状态码在第一行数据之前就发出去了，熔断器打开时要提前拒绝
+        breaker = get_pool().breaker
+        if breaker is not None and breaker.state == OPEN:
+            return _service_unavailable(CircuitOpenError(breaker.name, breaker.retry_after()))
+        logger.debug("执行 SQL (stream={}): {} | Params: {}", stream, sql, params)
+        # 先把生成器推进到查询之前，拿到发布标记：状态码还没发出去，这时候还能回 503 / 410
+        body = _stream_products(sql, params, stream, page_size)
+        try:
+            seq, live_version = next(body)
+        except Exception as e:
+            if _db_unavailable(e):
+                return _service_unavailable(e)
+            logger.error("API Internal Error: {}", e)
+            return jsonify({"code": 500, "error": str(e)}), 500
+        if page_size is not None and (seq is None or seq % 2):
+            body.close()
+            return _publish_in_progress()
+        if after and cursor_version != (live_version or 0):
+            body.close()
+            return _stale_cursor(cursor_version, live_version)
+        return Response(body, mimetype=STREAM_FORMATS[stream])
+
+    # 2.7 条件请求 (Conditional GET)
+    # ETag 由"快照版本号 + 规范化后的查询参数 + 编码"算出：数据没变 -> ETag 不变。
+    # 客户端带 If-None-Match 来轮询时，直接回 304，既不查库也不传 body。
+    encoding = "gzip" if _accepts_gzip() else "identity"
+    cache_key = None
+    etag = None
+    if version is not None:
+        cache_key = ("products", version, tuple(sorted(query.items())), encoding)
+        etag = _make_etag(cache_key)
+        if request.if_none_match.contains(etag):
+            logger.debug("ETag 命中，返回 304 (version={})", version)
+            return _not_modified(etag)
+
+        # 2.8 再查缓存：key = (快照版本号, 规范化后的查询参数, 编码)
+        # 压缩后的响应体也一起缓存，命中时连 gzip 的 CPU 都省了
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("缓存命中 (version={})", version)
+            return _json_body(cached, etag, cache_status="HIT")
+
+    try:
+        # 从共享连接池借一条连接，用完自动归还 (不再每个请求都 connect + 建表)
+        with get_pool().connection() as conn, conn.cursor() as cursor:
             # ===============================
-            # 3. 执行查询
+            # 3. 执行查询 (在快照发布标记的保护下，确认读到的数据属于哪个版本)
             # ===============================
-            logger.debug(f"执行 SQL: {sql} | Params: {params}")
-            cursor.execute(sql, params)
-            results = cursor.fetchall()
-        
-        logger.info(f"查询成功，返回 {len(results)} 条数据")
+            logger.debug("执行 SQL: {} | Params: {}", sql, params)
+
+            def read(cursor):
+                with DB_QUERY_SECONDS.time(query="products"):
+                    cursor.execute(sql, params)
+                    return cursor.fetchall()
+            results, stable, live_version = _guarded_read(conn, cursor, read)
+
+        # 3.1 读的过程中有快照在换表：数据没法对应到版本号，不缓存、不发 ETag；
+        #     翻页请求发不出正确的游标，让客户端稍后重试
+        if not stable:
+            snapshot_version.invalidate()
+            if page_size is not None:
+                return _publish_in_progress()
+            cache_key = etag = None
+        elif live_version != version:
+            # 版本号跟踪器还没看到刚发布的版本：按实际读到的版本重新校验游标、计算缓存 key
+            snapshot_version.invalidate()
+            if after and cursor_version != (live_version or 0):
+                return _stale_cursor(cursor_version, live_version)
+            version = live_version
+            if version is not None:
+                cache_key = ("products", version, tuple(sorted(query.items())), encoding)
+                etag = _make_etag(cache_key)
+
+        # 3.2 计算下一页游标
+        next_after = None
+        if page_size is not None and len(results) > page_size:
+            results = results[:page_size]
+            next_after = _page_cursor(version, results[-1]['id'])
+        for row in results:
+            del row['id']
+
+        logger.info("查询成功，返回 {} 条数据", len(results))
         
         # 4. 返回标准 JSON 格式
-        return jsonify({
+        body = {
             "code": 200,
             "message": "success",
             "data": results,
             "total": len(results)
+        }
+        if page_size is not None:
+            body["next_after"] = next_after
+        payload = jsonify(body).get_data()
+        if encoding == "gzip" and len(payload) >= GZIP_MIN_BYTES:
+            payload = gzip.compress(payload, compresslevel=GZIP_LEVEL)
+        # 4.1 写缓存 (下次同样的查询直接返回序列化好的响应体)
+        if cache_key is not None:
+            response_cache.set(cache_key, payload)
+        return _json_body(payload, etag, cache_status="MISS" if cache_key else ("BYPASS" if not stable else None))
+
+    except Exception as e:
+        # 5. 数据库不可用：有上一份快照的缓存就降级返回，没有就快速 503
+        if _db_unavailable(e):
+            stale = _stale_products(query, encoding)
+            if stale is not None:
+                return stale
+            return _service_unavailable(e)
+        # 6. 全局异常兜底
+        logger.error("API Internal Error: {}", e)
+        return jsonify({"code": 500, "error": str(e)}), 500
+
+def _guarded_read(conn, cursor, read):
+    """
+    在快照发布标记 (seqlock，见 database/snapshot_publish.py) 的保护下执行 read(cursor)
+    返回 (结果, 是否稳定, 结果所属的版本号)：
+    不稳定表示读的过程中有快照在换表，结果只能给当前请求用，不能缓存、不能发 ETag / 游标
+    每一步之后都提交，结束一致性读，后一次才能读到最新的发布序号
+    """
+    before = snapshot_publish.state(cursor)
+    conn.commit()
+    result = read(cursor)
+    conn.commit()
+    after = snapshot_publish.state(cursor)
+    conn.commit()
+    return result, snapshot_publish.is_stable(before, after), before[1]
+
+def _stale_cursor(cursor_version, version):
+    logger.info("翻页游标的快照版本已过期 (cursor={}, current={})", cursor_version, version)
+    return jsonify({
+        "code": 410,
+        "error": "The snapshot changed since this cursor was issued, restart from the first page",
+        "version": version,
+    }), 410
+
+def _publish_in_progress():
+    """正在换快照，读到的数据对应不上版本号：503 + Retry-After，客户端稍后重试"""
+    logger.info("快照正在发布，请求稍后重试")
+    response = jsonify({"code": 503, "error": "A new snapshot is being published, retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+def _stale_products(query, encoding):
+    """数据库不可用时，按最近一次已知的快照版本找旧缓存 (找不到返回 None)"""
+    version = snapshot_version.last_known
+    if version is None:
+        return None
+    cache_key = ("products", version, tuple(sorted(query.items())), encoding)
+    etag = _make_etag(cache_key)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    payload = response_cache.get_stale(cache_key)
+    if payload is None:
+        return None
+    logger.warning("数据库不可用，返回旧快照缓存 (version={})", version)
+    response = _json_body(payload, etag, cache_status="STALE")
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    return response
+
+def _accepts_gzip():
+    """客户端是否接受 gzip 编码 (按 q 值判断，"gzip;q=0" 表示明确拒绝)"""
+    return request.accept_encodings["gzip"] > 0
+
+def _make_etag(cache_key):
+    """强 ETag：同一份快照 + 同样的查询 + 同样的编码 -> 同一个 ETag"""
+    return hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+def _json_body(payload, etag=None, cache_status=None):
+    """
+    把序列化好的 JSON 响应体包装成 Response
+    payload 可能已经被 gzip 压缩过 (JSON 文本不可能以 gzip 魔数 1f 8b 开头，据此判断)
+    """
+    response = Response(payload, mimetype="application/json")
+    if payload[:2] == b"\x1f\x8b":
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    if etag:
+        response.set_etag(etag)
+        # no-cache = 可以缓存，但每次使用前都要带 If-None-Match 回来校验
+        response.headers["Cache-Control"] = "no-cache"
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    return response
+
+def _page_cursor(version, last_id):
+    """翻页游标 "<快照版本号>:<本页最后一行的 id>" (还没有版本号时记为 0)"""
+    return f"{version or 0}:{last_id}"
+
+def _stream_products(sql, params, fmt, page_size=None):
+    """
+    流式输出商品列表 (生成器)
+    用 SSDictCursor (服务端游标，不缓存结果集)：MySQL 一边发，我们一边序列化一边写给客户端，
+    无论结果有多少行，进程内同时只持有一行数据。
+    连接在生成器结束 (或客户端断开) 时才归还连接池。
+    第一次 next() 只返回查询前的发布标记 (序号, 版本号)，由调用方决定要不要继续；
+    翻页游标用这个版本号，流结束时标记变了 (中途换过快照) 就不发游标，按出错截断。
+    """
+    count = 0
+    last_id = None
+    started = False
+    try:
+        with get_pool().connection() as conn, conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            before = snapshot_publish.state(cursor)
+            conn.commit()
+            yield before
+            started = True
+            cursor.execute(sql, params)
+            if fmt == "json":
+                yield '{"code": 200, "message": "success", "data": ['
+            for row in cursor:
+                if page_size is not None and count >= page_size:
+                    # 多取的那一条只用来判断有没有下一页，不输出
+                    break
+                last_id = row.pop('id')
+                line = app.json.dumps(row)
+                if fmt == "json":
+                    yield ("," if count else "") + line
+                else:
+                    yield line + "\n"
+                count += 1
+            else:
+                # 正常读完 (没有 break)，说明没有下一页
+                last_id = None
+            if fmt == "json":
+                tail = {"total": count}
+                if page_size is not None:
+                    cursor.fetchall()
+                    conn.commit()
+                    if snapshot_publish.state(cursor) != before:
+                        raise RuntimeError("snapshot was published while streaming, cursor dropped")
+                    tail["next_after"] = _page_cursor(before[1], last_id) if last_id is not None else None
+                yield "], " + app.json.dumps(tail)[1:]
+        logger.info("流式查询完成，返回 {} 条数据", count)
+    except Exception as e:
+        if not started:
+            raise
+        # 响应头已经发出去了，没法再改状态码，只能记日志并截断输出
+        logger.error("API Stream Error after {} rows: {}", count, e)
+
+@app.route('/api/products/stats', methods=['GET'])
+def get_product_stats():
+    """
+    商品目录统计接口：件数 / 最低价 / 最高价 / 平均价 + 各价格桶的分布
+    支持筛选参数: min_price, max_price (和 /api/products 一样是闭区间)
+    统计在写入快照时已经按价格桶预计算好 (见 database/catalog_stats.py)：
+    - 不带筛选，或者筛选条件正好落在桶边界上：直接合并预计算的桶 (source=precomputed)；
+    - 否则回表按同样的桶实时聚合一次 (source=live，走 price 索引)。
+    """
+    if access_sample():
+        logger.info("收到 API 请求: {}", request.full_path)
+
+    # 1. 参数校验 (规范化后作为缓存 key 的一部分)
+    query = {}
+    for name in ('min_price', 'max_price'):
+        value = request.args.get(name)
+        if value:
+            try:
+                query[name] = float(value)
+            except ValueError:
+                logger.warning("Invalid {} parameter: {}", name, value)
+                return jsonify({"code": 400, "error": f"{name} must be a number"}), 400
+    min_price = query.get('min_price')
+    max_price = query.get('max_price')
+
+    # 2. 缓存：统计结果只跟快照版本 + 筛选条件有关
+    version = snapshot_version.current()
+    cache_key = ("stats", version, tuple(sorted(query.items()))) if version is not None else None
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return _json_body(cached, cache_status="HIT")
+
+    try:
+        def read(cursor):
+            # 3. 先读预计算的分桶统计
+            stats_version, buckets = catalog_stats.load(cursor, version)
+            summary = catalog_stats.summarize(buckets, min_price, max_price) if buckets else None
+            if summary is not None:
+                return stats_version, summary, "precomputed"
+            # 4. 筛选条件不在桶边界上 (或者这个版本还没有统计)：按同样的桶边界回表实时算
+            edges = tuple(b["lo"] for b in buckets) or catalog_stats.BUCKET_EDGES
+            live = catalog_stats.aggregate(cursor, edges, min_price=min_price, max_price=max_price)
+            return stats_version, catalog_stats.summarize(live), "live"
+
+        with get_pool().connection() as conn, conn.cursor() as cursor, DB_QUERY_SECONDS.time(query="stats"):
+            (stats_version, summary, source), stable, live_version = _guarded_read(conn, cursor, read)
+        # 读的过程中换过快照 / 版本号跟踪器还没跟上：结果不一定属于 version，不缓存
+        if not stable or live_version != version:
+            snapshot_version.invalidate()
+            cache_key = None
+
+        logger.info("统计查询成功 (source={})", source)
+        body = {
+            "code": 200,
+            "message": "success",
+            "data": dict(summary, version=stats_version or version, source=source, filters=query),
+        }
+        payload = jsonify(body).get_data()
+        if cache_key is not None:
+            response_cache.set(cache_key, payload)
+        return _json_body(payload, cache_status="MISS" if cache_key else None)
+
+    except Exception as e:
+        if _db_unavailable(e):
+            return _service_unavailable(e)
+        logger.error("API Internal Error: {}", e)
+        return jsonify({"code": 500, "error": str(e)}), 500
+
+@app.route('/api/products/digest', methods=['GET'])
+def get_product_digest():
+    """
+    快照摘要接口：当前版本号 + 内容摘要 + 商品件数 (只读 snapshot_versions 的最后一行)
+    轮询方只比较 digest (或者带 If-None-Match 拿 304)，变了再去 /api/products/changes 拉增量。
+    digest 为 null 表示这个版本是在增量同步上线之前写入的，只能全量比较。
+    """
+    version = snapshot_version.current()
+    cache_key = ("digest", version) if version is not None else None
+    etag = None
+    if cache_key is not None:
+        etag = _make_etag(cache_key)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return _json_body(cached, etag, cache_status="HIT")
+
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor, DB_QUERY_SECONDS.time(query="digest"):
+            cursor.execute(
+                "SELECT version, digest, item_count, created_at "
+                "FROM snapshot_versions ORDER BY version DESC LIMIT 1"
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return jsonify({"code": 404, "error": "No snapshot has been published yet"}), 404
+
+        payload = jsonify({"code": 200, "message": "success", "data": row}).get_data()
+        # 版本号追踪器最多落后 CACHE_VERSION_CHECK_INTERVAL 秒，只缓存和它一致的结果
+        if cache_key is not None and row["version"] == version:
+            response_cache.set(cache_key, payload)
+            return _json_body(payload, etag, cache_status="MISS")
+        return _json_body(payload)
+
+    except Exception as e:
+        if _db_unavailable(e):
+            return _service_unavailable(e)
+        logger.error("API Internal Error: {}", e)
+        return jsonify({"code": 500, "error": str(e)}), 500
+
+# 增量查询过程中恰好有新快照发布时，最多重读几次 (保证变更列表和商品行来自同一个版本)
+CHANGES_READ_ATTEMPTS = 3
+
+@app.route('/api/products/changes', methods=['GET'])
+def get_product_changes():
+    """
+    增量同步接口：返回版本 since 之后新增 / 删除 / 变化的商品 (多个版本的变化已合并成净变化)
+    必填参数: since (客户端手里的快照版本号，第一次同步先全量拉 /api/products 并记下 digest 接口里的 version)
+    返回: added / changed 是商品的当前数据 (changed 额外带 old_price)，removed 只有商品名和旧价格；
+          version / digest 是客户端应用完增量之后所处的版本。
+    since 太旧 (变更日志已清理) 或者比当前版本还新 (数据库被重建过) 时返回 410，客户端需要全量重新同步。
+    """
+    if access_sample():
+        logger.info("收到 API 请求: {}", request.full_path)
+
+    # 1. 参数校验
+    try:
+        since = int(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({"code": 400, "error": "since is required and must be an integer version"}), 400
+    if since < 0:
+        return jsonify({"code": 400, "error": "since must be >= 0"}), 400
+
+    # 2. 同一个 (版本, since) 的增量结果不会变，可以缓存 + ETag
+    version = snapshot_version.current()
+    cache_key = ("changes", version, since) if version is not None else None
+    etag = None
+    if cache_key is not None:
+        etag = _make_etag(cache_key)
+        if request.if_none_match.contains(etag):
+            return _not_modified(etag)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return _json_body(cached, etag, cache_status="HIT")
+
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor, DB_QUERY_SECONDS.time(query="changes"):
+            for _ in range(CHANGES_READ_ATTEMPTS):
+                data, stable, _ = _guarded_read(conn, cursor, lambda cursor: _load_changes(cursor, since))
+                if stable:
+                    break
+                # 读的过程中在换快照，商品行和变更列表可能不属于同一个版本，重读一次
+                logger.debug("增量查询期间快照正在发布，重新读取 (since={})", since)
+
+        if not stable:
+            snapshot_version.invalidate()
+            return _publish_in_progress()
+        if data is None:
+            return jsonify({"code": 404, "error": "No snapshot has been published yet"}), 404
+        if data.get("full_resync"):
+            return jsonify({
+                "code": 410,
+                "error": "since is outside the retained change history, do a full resync",
+                "data": data,
+            }), 410
+
+        total = len(data["added"]) + len(data["changed"]) + len(data["removed"])
+        logger.info("增量查询成功 (since={}, version={}, {} 条变化)", since, data["version"], total)
+        payload = jsonify({"code": 200, "message": "success", "data": data, "total": total}).get_data()
+        if cache_key is not None and data["version"] == version:
+            response_cache.set(cache_key, payload)
+            return _json_body(payload, etag, cache_status="MISS")
+        return _json_body(payload)
+
+    except Exception as e:
+        if _db_unavailable(e):
+            return _service_unavailable(e)
+        logger.error("API Internal Error: {}", e)
+        return jsonify({"code": 500, "error": str(e)}), 500
+
+def _load_changes(cursor, since):
+    """
+    读取 since 之后的净变化；since 不在可增量同步的范围内时返回带 full_resync=True 的字典
+    还没有任何快照时返回 None
+    """
+    cursor.execute("SELECT version, digest FROM snapshot_versions ORDER BY version DESC LIMIT 1")
+    latest = cursor.fetchone()
+    if latest is None:
+        return None
+    version = latest["version"]
+    data = {"since": since, "version": version, "digest": latest["digest"]}
+    if since > version:
+        return dict(data, full_resync=True)
+    if since < version:
+        oldest = catalog_changes.oldest_since(cursor, version)
+        if oldest is None or since < oldest:
+            return dict(data, full_resync=True)
+
+    net = catalog_changes.collapse(catalog_changes.load(cursor, since, version))
+    current = {}
+    names = [name for name, change in net.items() if change["kind"] != catalog_changes.REMOVED]
+    if names:
+        cursor.execute(
+            "SELECT name, price, scraped_at, item_id, description, image_url FROM products "
+            f"WHERE name IN ({', '.join(['%s'] * len(names))})",
+            names
+        )
+        current = {row["name"]: row for row in cursor.fetchall()}
+
+    data.update(added=[], changed=[], removed=[])
+    for name in sorted(net):
+        change = net[name]
+        if change["kind"] == catalog_changes.REMOVED:
+            data["removed"].append({"name": name, "old_price": change["old_price"]})
+        elif name in current:
+            row = current[name]
+            if change["kind"] == catalog_changes.CHANGED:
+                row = dict(row, old_price=change["old_price"])
+            data[change["kind"]].append(row)
+    return data
+
+# 历史降采样粒度 -> MySQL DATE_FORMAT 格式 (同一个桶里的时间格式化后相同)
+HISTORY_BUCKETS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d",
+}
+# raw 模式最多返回多少个点，防止一次拉全量
+HISTORY_RAW_LIMIT = 5000
+
+@app.route('/api/products/<path:name>/history', methods=['GET'])
+def get_product_history(name):
+    """
+    商品价格历史接口
+    支持参数:
+      start / end: ISO 时间 (默认最近 30 天)
+      bucket: raw | hour | day (默认 day)，按桶在数据库端降采样，每个桶返回 min / max / last
+    """
+    # 访问日志按 LOG_ACCESS_SAMPLE 采样，高并发时不必每个请求都写一行
+    if access_sample():
+        logger.info("收到 API 请求: {}", request.full_path)
+
+    # 1. 参数校验
+    bucket = request.args.get('bucket', 'day')
+    if bucket != 'raw' and bucket not in HISTORY_BUCKETS:
+        return jsonify({"code": 400, "error": "bucket must be one of raw, hour, day"}), 400
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=30)
+    except ValueError:
+        logger.warning("Invalid history window: {}", request.args)
+        return jsonify({"code": 400, "error": "start/end must be ISO 8601 datetimes"}), 400
+
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor, DB_QUERY_SECONDS.time(query="history"):
+            # 2. 窗口开始前的最后一个价格 (历史是去重写入的，窗口内没变价时靠它画出起点)
+            cursor.execute(
+                "SELECT price, scraped_at FROM price_history "
+                "WHERE name = %s AND scraped_at < %s ORDER BY scraped_at DESC LIMIT 1",
+                (name, start)
+            )
+            initial = cursor.fetchone()
+
+            # 3. 窗口内的序列 (走 (name, scraped_at) 联合索引)
+            if bucket == 'raw':
+                cursor.execute(
+                    "SELECT price, scraped_at FROM price_history "
+                    "WHERE name = %s AND scraped_at >= %s AND scraped_at < %s "
+                    "ORDER BY scraped_at LIMIT %s",
+                    (name, start, end, HISTORY_RAW_LIMIT)
+                )
+            else:
+                # 降采样在数据库里做：一年的数据按天聚合也只有 365 行
+                cursor.execute(
+                    "SELECT DATE_FORMAT(scraped_at, %s) AS bucket, "
+                    "MIN(price) AS min, MAX(price) AS max, "
+                    "SUBSTRING_INDEX(GROUP_CONCAT(price ORDER BY scraped_at DESC, id DESC), ',', 1) AS last, "
+                    "COUNT(*) AS points "
+                    "FROM price_history "
+                    "WHERE name = %s AND scraped_at >= %s AND scraped_at < %s "
+                    "GROUP BY bucket ORDER BY bucket",
+                    (HISTORY_BUCKETS[bucket], name, start, end)
+                )
+            series = cursor.fetchall()
+
+        logger.info("历史查询成功，{} 返回 {} 个点", name, len(series))
+        return jsonify({
+            "code": 200,
+            "message": "success",
+            "data": {
+                "name": name,
+                "bucket": bucket,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "initial": initial,
+                "series": series
+            },
+            "total": len(series)
+        })
+
+    except Exception as e:
+        if _db_unavailable(e):
+            return _service_unavailable(e)
+        logger.error("API Internal Error: {}", e)
+        return jsonify({"code": 500, "error": str(e)}), 500
+
+# 抓取台账一次最多返回 / 汇总多少条
+RUNS_DEFAULT_LIMIT = 100
+RUNS_MAX_LIMIT = 1000
+
+@app.route('/api/runs', methods=['GET'])
+def get_scrape_runs():
+    """
+    抓取台账接口：最近 N 次抓取的明细 + 分位数汇总
+    支持参数:
+      limit: 最近多少次 (默认 100，最多 1000)
+      status: success | scrape_failed | save_failed | crashed
+      source: scraper | daemon
+      since: ISO 时间，只看这之后开始的抓取
+    汇总里的耗时分位数 (p50 / p90 / p95 / p99) 只统计成功的抓取。
+    """
+    if access_sample():
+        logger.info("收到 API 请求: {}", request.full_path)
+
+    # 1. 参数校验
+    try:
+        limit = int(request.args.get('limit', RUNS_DEFAULT_LIMIT))
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        logger.warning("Invalid runs query: {}", request.args)
+        return jsonify({"code": 400, "error": "limit must be an integer, since must be an ISO 8601 datetime"}), 400
+    if not 1 <= limit <= RUNS_MAX_LIMIT:
+        return jsonify({"code": 400, "error": f"limit must be between 1 and {RUNS_MAX_LIMIT}"}), 400
+
+    sql = ("SELECT run_id, source, username, status, error, started_at, finished_at, duration_ms, "
+           "phases, item_count, request_count, bytes_transferred, snapshot_version "
+           "FROM scrape_runs WHERE 1=1")
+    params = []
+    for column in ('status', 'source'):
+        if request.args.get(column):
+            sql += f" AND {column} = %s"
+            params.append(request.args[column])
+    if since:
+        sql += " AND started_at >= %s"
+        params.append(since)
+    # 走 started_at 索引倒序取最近 N 条
+    sql += " ORDER BY started_at DESC LIMIT %s"
+    params.append(limit)
+
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor, DB_QUERY_SECONDS.time(query="runs"):
+            cursor.execute(sql, params)
+            runs = cursor.fetchall()
+        for run in runs:
+            run["phases"] = json.loads(run["phases"]) if run["phases"] else {}
+
+        return jsonify({
+            "code": 200,
+            "message": "success",
+            "data": {
+                "summary": summarize(runs),
+                "runs": runs
+            },
+            "total": len(runs)
         })
 
     except Exception as e:
-        # 5. 全局异常兜底
-        logger.error(f"API Internal Error: {e}")
+        if _db_unavailable(e):
+            return _service_unavailable(e)
+        logger.error("API Internal Error: {}", e)
         return jsonify({"code": 500, "error": str(e)}), 500
-    finally:
-        db.close()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录每个请求的耗时 (流式响应只统计到响应头发出为止)"""
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=route, status=response.status_code)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    其它 JSON 接口 (历史、统计等) 的通用 gzip 压缩
+    /api/products 自己已经压缩并缓存好了，这里会跳过带 Content-Encoding 的响应
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"
+            or not _accepts_gzip()):
+        return response
+    payload = response.get_data()
+    if len(payload) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(payload, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+# 距离上次成功抓取超过这么多秒，健康检查标记为 stale (默认 26 小时，CI 每天抓一次)
+HEALTH_MAX_SCRAPE_AGE = float(os.getenv('HEALTH_MAX_SCRAPE_AGE', 26 * 3600))
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查接口 (Health Check) - 供运维监控使用"""
-    # 健康检查一般跑得很频繁，用 debug 级别避免刷屏，或者 info 级别看心跳
-    # 这里用 debug
+    """
+    健康检查接口 (Health Check) - 供运维监控使用
+    - 数据库是否可达 (从连接池借一条连接查一次，附带耗时)；
+    - 距离上次成功抓取 (最新快照发布) 过去了多少秒，超过阈值标记为 stale。
+    数据库不可达返回 503，方便负载均衡把这个实例摘掉；抓取过期只是告警，仍然返回 200。
+    """
+    # 健康检查一般跑得很频繁，用 debug 级别避免刷屏
     logger.debug("Health Check Request received.")
-    return jsonify({
-        "status": "ok",
-        "message": "API is running"
-    })
+    body = {"status": "ok", "message": "API is running"}
+    database = {"reachable": False}
+    start = time.perf_counter()
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT TIMESTAMPDIFF(SECOND, created_at, NOW()) AS age "
+                "FROM snapshot_versions ORDER BY version DESC LIMIT 1"
+            )
+            row = cursor.fetchone()
+        database["reachable"] = True
+        age = row["age"] if row else None
+        body["last_scrape_age_seconds"] = age
+        body["scrape_stale"] = age is None or age > HEALTH_MAX_SCRAPE_AGE
+    except Exception as e:
+        database["error"] = str(e)
+    database["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    # 熔断器打开时上面的查询直接被拒绝，不会真的去连数据库，健康检查本身也不会被拖慢
+    breaker = get_pool().breaker
+    database["circuit"] = breaker.state if breaker is not None else None
+    body["database"] = database
+
+    if not database["reachable"]:
+        body["status"] = "unavailable"
+        body["message"] = "Database is unreachable"
+        return jsonify(body), 503
+    if body["scrape_stale"]:
+        body["status"] = "degraded"
+        body["message"] = "No successful scrape within HEALTH_MAX_SCRAPE_AGE"
+    return jsonify(body)
+
+# gunicorn 多 worker 时由 init_worker() 创建：/api/metrics 返回所有 worker 汇总后的指标
+_metrics_exporter = None
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 文本格式的指标 (请求耗时、SQL 耗时、连接池、缓存...)"""
+    body = _metrics_exporter.render() if _metrics_exporter is not None else metrics.render()
+    return Response(body, content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """连接池指标：借出中 / 空闲 / 等待耗时，用来给连接池调大小"""
+    return jsonify(get_pool().stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """响应缓存指标：命中 / 未命中 / 淘汰次数，用来确认读流量确实从数据库挪走了"""
+    stats = response_cache.stats()
+    stats["snapshot_version"] = snapshot_version.current()
+    return jsonify(stats)
+
+# ===============================
+# 启动入口 (开发服务器 / WSGI 服务器共用)
+# ===============================
+def create_app(migrate=True):
+    """
+    WSGI 应用工厂
+    生产环境: gunicorn -c gunicorn.conf.py wsgi:app (多进程 pre-fork + 每个进程多线程)
+    开发环境: python app.py
+    这里只做"整个服务做一次"的初始化 (表结构迁移)，不碰连接池：
+    gunicorn 开了 preload_app 时，工厂在 master 进程里执行，连接要等 fork 之后由 init_worker() 建。
+    """
+    if migrate:
+        # 启动时执行一次表结构迁移 (之前是每个请求都建一次表)；多个进程同时启动有迁移锁保护
+        db = DBManager()
+        try:
+            db.migrate()
+        except DatabaseUnavailableError as e:
+            # 数据库没起来也让 API 先起来：请求会被熔断器快速拒绝，数据库恢复后自动可用
+            logger.critical("启动时无法连接数据库，跳过表结构迁移: {}", e)
+        finally:
+            db.close()
+    return app
+
+def init_worker():
+    """
+    每个 worker 进程启动后执行 (gunicorn 的 post_fork 钩子)
+    连接池在 fork 时已经被 reset_pool_after_fork() 清掉，这里为本进程预热一个新的池，
+    第一批请求不用再付建连成本。数据库暂时连不上也不影响 worker 启动，交给熔断器处理。
+    设置了 METRICS_MULTIPROC_DIR (gunicorn.conf.py 默认设置) 时，本进程的指标定期写到共享目录，供 /api/metrics 汇总。
+    """
+    global _metrics_exporter
+    metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+    if metrics_dir and _metrics_exporter is None:
+        # fork 出来的 worker 继承了 master 里的计数，清零后只算本进程的，汇总时才不会重复计算
+        metrics.REGISTRY.reset()
+        _metrics_exporter = metrics.MultiprocessExporter(metrics_dir).start()
+    try:
+        get_pool().warmup()
+    except Exception as e:
+        logger.warning("连接池预热失败 (pid={}): {}", os.getpid(), e)
+
+def shutdown_worker():
+    """
+    worker 退出时执行 (gunicorn 的 worker_exit 钩子)：关闭本进程的空闲连接
+    日志不用在这里 flush：开了 LOG_ENQUEUE 时消息已经在队列里，由 master 进程的写日志线程负责写完
+    """
+    get_pool().close()
+    if _metrics_exporter is not None:
+        _metrics_exporter.stop()
 
 if __name__ == '__main__':
+    create_app()
+    init_worker()
+
     # host='0.0.0.0' 允许外网访问（Docker 容器内必须这么设）
-    logger.info("Flask Server Starting on port 5000...")
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    # 注意：这是单进程的开发服务器，生产环境请用 gunicorn (见 gunicorn.conf.py)
+    port = int(os.getenv('API_PORT', 5000))
+    logger.info("Flask Server Starting on port {}...", port)
+    app.run(host='0.0.0.0', port=port, threaded=True)
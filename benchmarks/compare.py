@@ -0,0 +1,46 @@
+import argparse
+import sys
+from benchmarks.report import COMPARED_METRICS, compare, load_results
+
+# ===============================
+# 对比两次基准测试结果
+# ===============================
+# 用法: python -m benchmarks.compare benchmarks/results/micro-旧.json benchmarks/results/micro-新.json
+# 任何一个用例的 p50 / p95 / p99 变慢超过 --threshold (默认 10%) 时退出码为 1，可以直接放进 CI。
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果，找出性能退化")
+    parser.add_argument("baseline", help="基线结果 JSON")
+    parser.add_argument("current", help="本次结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.10, help="变慢超过这个比例算退化 (默认 0.10)")
+    parser.add_argument("--metrics", default=",".join(COMPARED_METRICS), help="对比哪些指标 (逗号分隔)")
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    if baseline.get("suite") != current.get("suite"):
+        print(f"⚠️ 两次结果的 suite 不同: {baseline.get('suite')} vs {current.get('suite')}")
+
+    rows = compare(baseline, current, args.threshold, tuple(m.strip() for m in args.metrics.split(",")))
+    if not rows:
+        print("两次结果没有可以对比的用例。")
+        return 0
+
+    print(f"基线 {baseline.get('git_commit')} ({baseline.get('created_at')}) -> "
+          f"本次 {current.get('git_commit')} ({current.get('created_at')})")
+    width = max(len(case) for case, *_ in rows)
+    for case, metric, old, new, change, regressed in rows:
+        flag = "❌ 退化" if regressed else ""
+        print(f"{case:<{width}}  {metric:<7} {old:>10.2f} -> {new:>10.2f}  {change:+7.1%}  {flag}")
+
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项性能退化 (阈值 {args.threshold:.0%})")
+        return 1
+    print("\n✅ 没有发现性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
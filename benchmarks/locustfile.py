@@ -0,0 +1,143 @@
+import os
+import random
+from locust import HttpUser, LoadTestShape, between, events, task
+from benchmarks.report import write_results
+
+# ===============================
+# API 压测场景 (Locust, 无界面模式)
+# ===============================
+# 和根目录的 locustfile.py (只打 /api/products 和 /api/health) 相比：
+# 1. 按真实流量配比混合请求：全量列表、各种价格区间、分页、搜索、统计、摘要轮询 (带 ETag)；
+# 2. 阶梯加压 (StepLoadShape)：每 BENCH_STEP_SECONDS 秒增加 BENCH_STEP_USERS 个用户，看延迟在哪一级开始恶化；
+# 3. 结束时按 SLO 检查总体 p50 / p95 / p99 和失败率，不达标进程退出码为 1 (CI 可以直接用)；
+# 4. 结果按 benchmarks/report.py 的格式写成 JSON，python -m benchmarks.compare 对比两次压测。
+#
+# 用法 (先用 gunicorn 起好 API，数据库里先灌好 1k / 50k 件商品的快照，见 README):
+#   locust -f benchmarks/locustfile.py --headless --host http://127.0.0.1:5000
+
+# 阶梯加压参数
+STEP_USERS = int(os.getenv("BENCH_STEP_USERS", 10))
+STEP_SECONDS = int(os.getenv("BENCH_STEP_SECONDS", 30))
+STEPS = int(os.getenv("BENCH_STEPS", 5))
+SPAWN_RATE = float(os.getenv("BENCH_SPAWN_RATE", STEP_USERS))
+
+# SLO (毫秒 / 比例)：总体响应时间分位数和失败率的上限
+SLO = {
+    "p50_ms": float(os.getenv("BENCH_SLO_P50_MS", 50)),
+    "p95_ms": float(os.getenv("BENCH_SLO_P95_MS", 200)),
+    "p99_ms": float(os.getenv("BENCH_SLO_P99_MS", 500)),
+    "fail_ratio": float(os.getenv("BENCH_SLO_FAIL_RATIO", 0.01)),
+}
+
+# 价格筛选区间：一半落在目录统计的桶边界上，一半不在 (两条代码路径都要压到)
+PRICE_RANGES = [(0, 10), (10, 30), (20, 50), (7.5, 15.99), (12.5, 42), (30, None), (None, 20)]
+SEARCH_TERMS = ["backpack", "sauce labs", "t-shirt", "jacket", "item 00", "sa"]
+
+
+class ApiUser(HttpUser):
+    wait_time = between(0.1, 0.5)
+
+    def on_start(self):
+        # 摘要轮询用的 ETag (每个虚拟用户各自记住上一次看到的版本)
+        self.digest_etag = None
+
+    @task(3)
+    def list_all(self):
+        self.client.get("/api/products", name="/api/products")
+
+    @task(5)
+    def price_range(self):
+        low, high = random.choice(PRICE_RANGES)
+        params = {}
+        if low is not None:
+            params["min_price"] = low
+        if high is not None:
+            params["max_price"] = high
+        self.client.get("/api/products", params=params, name="/api/products?min_price&max_price")
+
+    @task(2)
+    def paginate(self):
+        self.client.get("/api/products", params={"limit": 100}, name="/api/products?limit")
+
+    @task(1)
+    def search(self):
+        self.client.get("/api/products", params={"q": random.choice(SEARCH_TERMS)}, name="/api/products?q")
+
+    @task(1)
+    def stats(self):
+        low, high = random.choice(PRICE_RANGES)
+        params = {k: v for k, v in (("min_price", low), ("max_price", high)) if v is not None}
+        self.client.get("/api/products/stats", params=params, name="/api/products/stats")
+
+    @task(2)
+    def poll_digest(self):
+        headers = {"If-None-Match": self.digest_etag} if self.digest_etag else {}
+        with self.client.get("/api/products/digest", headers=headers, name="/api/products/digest",
+                             catch_response=True) as response:
+            if response.status_code in (200, 304):
+                self.digest_etag = response.headers.get("ETag", self.digest_etag)
+                response.success()
+
+    @task(1)
+    def health(self):
+        self.client.get("/api/health", name="/api/health")
+
+
+class StepLoadShape(LoadTestShape):
+    """阶梯加压：第 k 级 (k 从 1 开始) 有 k * STEP_USERS 个用户，每级持续 STEP_SECONDS 秒，跑完 STEPS 级结束"""
+
+    def tick(self):
+        run_time = self.get_run_time()
+        step = int(run_time // STEP_SECONDS) + 1
+        if step > STEPS:
+            return None
+        return step * STEP_USERS, SPAWN_RATE
+
+
+def _entry_result(entry):
+    """Locust 的统计条目 -> 结果 JSON 里的一个用例"""
+    return {
+        "n": entry.num_requests,
+        "failures": entry.num_failures,
+        "fail_ratio": round(entry.fail_ratio, 4),
+        "rps": round(entry.total_rps, 2),
+        "p50_ms": entry.get_response_time_percentile(0.50),
+        "p95_ms": entry.get_response_time_percentile(0.95),
+        "p99_ms": entry.get_response_time_percentile(0.99),
+        "max_ms": entry.max_response_time,
+        "mean_ms": round(entry.avg_response_time, 3),
+    }
+
+
+def check_slo(total):
+    """总体结果和 SLO 逐项比较，返回不达标的项 [(指标, 实际值, 上限)]"""
+    return [(name, total[name], limit) for name, limit in SLO.items() if total.get(name) is not None
+            and total[name] > limit]
+
+
+@events.quitting.add_listener
+def _on_quitting(environment, **kwargs):
+    stats = environment.stats
+    results = {
+        f"{entry.method} {entry.name}": _entry_result(entry)
+        for entry in stats.entries.values()
+    }
+    total = _entry_result(stats.total)
+    results["total"] = total
+
+    violations = check_slo(total)
+    path = write_results(
+        "load", results,
+        host=environment.host,
+        shape={"step_users": STEP_USERS, "step_seconds": STEP_SECONDS, "steps": STEPS},
+        slo=SLO,
+        slo_violations=[{"metric": m, "value": v, "limit": limit} for m, v, limit in violations],
+    )
+    print(f"压测结果已保存: {path}")
+
+    for metric, value, limit in violations:
+        print(f"❌ SLO 不达标: {metric} = {value} (上限 {limit})")
+    if violations:
+        environment.process_exit_code = 1
+    else:
+        print("✅ 所有 SLO 达标")
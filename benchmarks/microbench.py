@@ -0,0 +1,194 @@
+import argparse
+import os
+import sys
+import time
+from benchmarks.report import summarize, write_results
+from benchmarks.standin_site import PASSWORD, StandinSite, catalog_products
+
+# ===============================
+# 微基准测试 (Microbenchmarks)
+# ===============================
+# 三条热路径，每条都在 6 / 1k / 50k 件商品三种规模下各跑 --repeat 次，记录 p50 / p95 / p99：
+#   inventory  InventoryPage.get_products (批量提取 vs 逐个 Locator)，对着本地替身站点抓
+#   save       DBManager.save_product (影子表写入 + 原子交换 + 价格历史 / 版本 / 增量 / 统计)
+#   api        /api/products 各种查询 (Flask test client，进程内调用，不含 HTTP 网络开销)，
+#              分 cold (每次先清空响应缓存) 和 warm (缓存命中) 两种
+# 完全离线：爬虫打 benchmarks/standin_site.py，数据库用 docker-compose 里的 bench-db (见 README)。
+#
+# 用法: DB_PORT=3308 DB_NAME=saucemall_bench python -m benchmarks.microbench --sizes 6,1000,50000
+# 结果写到 benchmarks/results/micro-<时间>.json，用 python -m benchmarks.compare 对比两次运行。
+
+SUITES = ("inventory", "save", "api")
+DEFAULT_SIZES = "6,1000,50000"
+# 逐个 Locator 提取是 O(N) 次浏览器往返，商品太多时只测批量模式
+LOCATOR_MAX_ITEMS = int(os.getenv("BENCH_LOCATOR_MAX_ITEMS", 1000))
+# 基准测试会整张替换 products 表，默认拒绝在生产库上跑
+PROTECTED_DATABASES = ("saucemall",)
+# inventory 基准只测页面可用的耗时：关掉 BasePage.open 的 networkidle 基线抽样 (显式设置时以环境变量为准)
+os.environ.setdefault("SCRAPER_WAIT_BASELINE_SAMPLE", "0")
+
+# /api 基准的查询 (用例名 -> URL)
+API_CASES = {
+    "all": "/api/products",
+    "price_range": "/api/products?min_price=10&max_price=30",
+    "page": "/api/products?limit=100",
+    "search": "/api/products?q=backpack",
+    "stats": "/api/products/stats?min_price=10&max_price=30",
+    "digest": "/api/products/digest",
+}
+
+
+def _timeit(fn, repeat, warmup=1):
+    """先空跑 warmup 次 (JIT / 连接 / 页面缓存预热)，再计时 repeat 次，返回毫秒列表"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _per_second(samples, items):
+    """按 p50 耗时折算的每秒处理商品数"""
+    p50 = sorted(samples)[len(samples) // 2]
+    return round(items / (p50 / 1000), 1) if p50 else None
+
+
+def _repriced(products, round_no):
+    """每轮把 1% 的商品调价，让入库时的价格历史 / 增量变更有真实的工作量"""
+    step = max(1, len(products) // 100)
+    return [
+        dict(p, price=round(p["price"] + 1, 2)) if (i + round_no) % step == 0 else p
+        for i, p in enumerate(products)
+    ]
+
+
+def bench_inventory(site, sizes, repeat):
+    from playwright.sync_api import sync_playwright
+    from pages.base_page import RequestPolicy
+    from pages.inventory_page import InventoryPage
+    from pages.login_page import LoginPage
+
+    results = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context()
+        policy = RequestPolicy.from_env().apply(context)
+        page = context.new_page()
+        try:
+            for size in sizes:
+                login_page = LoginPage(page, policy)
+                inventory_page = InventoryPage(page, policy)
+                login_page.url = site.base_url(size)
+                inventory_page.url = site.base_url(size) + "inventory.html"
+                login_page.login("standard_user", PASSWORD)
+                inventory_page.wait_until_ready()
+
+                samples = _timeit(lambda: inventory_page.open(inventory_page.url), repeat)
+                results[f"inventory_page.open[{size}]"] = summarize(samples, items=size)
+
+                modes = ["batched"] + (["locator"] if size <= LOCATOR_MAX_ITEMS else [])
+                for mode in modes:
+                    def extract():
+                        products = inventory_page.get_products(batched=(mode == "batched"))
+                        if len(products) != size:
+                            raise RuntimeError(f"expected {size} products, got {len(products)}")
+                    samples = _timeit(extract, repeat)
+                    key = f"inventory_page.get_products[{mode},{size}]"
+                    results[key] = summarize(samples, items=size, items_per_sec=_per_second(samples, size))
+                    print(f"inventory {mode:<8} {size:>6} 件  p50={results[key]['p50_ms']} ms")
+        finally:
+            browser.close()
+    return results
+
+
+def bench_save(db, sizes, repeat):
+    results = {}
+    for size in sizes:
+        products = catalog_products(size)
+        rounds = iter(range(repeat + 1))
+
+        def save():
+            if db.save_product(_repriced(products, next(rounds))) is None:
+                raise RuntimeError("save_product failed, see logs")
+        samples = _timeit(save, repeat)
+        key = f"db.save_product[{size}]"
+        results[key] = summarize(samples, items=size, items_per_sec=_per_second(samples, size))
+        print(f"save_product {size:>6} 件  p50={results[key]['p50_ms']} ms")
+    return results
+
+
+def bench_api(db, sizes, repeat):
+    import app as api
+
+    client = api.app.test_client()
+    results = {}
+    for size in sizes:
+        # 先换上这个规模的快照，并让 API 立刻看到新版本号
+        db.save_product(catalog_products(size))
+        api.snapshot_version.invalidate()
+
+        for case, url in API_CASES.items():
+            def call():
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}")
+
+            def cold_call():
+                api.response_cache.clear()
+                call()
+
+            for mode, fn in (("cold", cold_call), ("warm", call)):
+                key = f"api.{case}[{size},{mode}]"
+                results[key] = summarize(_timeit(fn, repeat), items=size)
+                print(f"api {case:<12} {size:>6} 件 {mode}  p50={results[key]['p50_ms']} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬虫 / 入库 / API 热路径的微基准测试 (离线)")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"要跑的测试 (逗号分隔): {', '.join(SUITES)}")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="商品规模 (逗号分隔)")
+    parser.add_argument("--repeat", type=int, default=int(os.getenv("BENCH_REPEAT", 5)), help="每个用例计时几次")
+    parser.add_argument("--output", help="结果文件路径 (默认 benchmarks/results/micro-<时间>.json)")
+    parser.add_argument("--allow-production-db", action="store_true", help="允许在 DB_NAME=saucemall 上运行")
+    args = parser.parse_args(argv)
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    db = None
+    if "save" in suites or "api" in suites:
+        from database.db_manager import DBManager
+        db = DBManager()
+        if db.db_name in PROTECTED_DATABASES and not args.allow_production_db:
+            parser.error(f"refusing to overwrite products in '{db.db_name}', "
+                         "point DB_NAME at a benchmark database (e.g. saucemall_bench)")
+        db.connect()
+        db.migrate()
+
+    results = {}
+    try:
+        if "inventory" in suites:
+            with StandinSite() as site:
+                results.update(bench_inventory(site, sizes, args.repeat))
+        if "save" in suites:
+            results.update(bench_save(db, sizes, args.repeat))
+        if "api" in suites:
+            results.update(bench_api(db, sizes, args.repeat))
+    finally:
+        if db is not None:
+            db.close()
+
+    path = write_results("micro", results, args.output, sizes=sizes, repeat=args.repeat, suites=suites)
+    print(f"结果已保存: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+from run_ledger import percentile
+
+# ===============================
+# 基准测试结果 (JSON)
+# ===============================
+# 微基准 (microbench.py) 和压测 (locustfile.py) 写同一种格式，compare.py 可以直接对比两次运行：
+# {
+#   "suite": "micro", "created_at": "...", "git_commit": "...", "environment": {...},
+#   "results": {"用例名": {"n": 20, "p50_ms": ..., "p95_ms": ..., "p99_ms": ..., "mean_ms": ..., ...}}
+# }
+
+RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", os.path.join(os.path.dirname(__file__), "results"))
+
+# compare.py 默认对比的指标
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def summarize(samples_ms, **extra):
+    """一组耗时样本 (毫秒) -> 分位数汇总；extra 里可以附带吞吐量、商品数之类的额外字段"""
+    values = sorted(samples_ms)
+    if not values:
+        return dict(extra, n=0)
+    return dict(
+        extra,
+        n=len(values),
+        min_ms=round(values[0], 3),
+        p50_ms=round(percentile(values, 50), 3),
+        p95_ms=round(percentile(values, 95), 3),
+        p99_ms=round(percentile(values, 99), 3),
+        max_ms=round(values[-1], 3),
+        mean_ms=round(sum(values) / len(values), 3),
+    )
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(suite, results, output=None, **meta):
+    """把一次运行的结果写成 JSON，返回文件路径 (默认 benchmarks/results/<suite>-<时间>.json)"""
+    created_at = datetime.now()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{created_at:%Y%m%d-%H%M%S}.json")
+    document = {
+        "suite": suite,
+        "created_at": created_at.isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **meta,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.10, metrics=COMPARED_METRICS):
+    """
+    对比两次运行 (load_results 的返回值)，返回 [(用例, 指标, 基线, 本次, 变化比例, 是否退化)]
+    只对比两边都有的用例；变慢超过 threshold (默认 10%) 算退化
+    """
+    rows = []
+    base_results = baseline["results"]
+    for case, stats in current["results"].items():
+        if case not in base_results:
+            continue
+        for metric in metrics:
+            old = base_results[case].get(metric)
+            new = stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            rows.append((case, metric, old, new, change, change > threshold))
+    return rows
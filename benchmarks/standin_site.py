@@ -0,0 +1,248 @@
+import argparse
+import html
+import random
+import threading
+import time
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ===============================
+# SauceDemo 本地替身站点 (Stand-in Site)
+# ===============================
+# 压测爬虫时不能去打线上的 saucedemo.com：网络抖动让结果没法复现，而且线上只有 6 件商品，
+# 测不出"商品变多以后抓取 / 入库会不会变慢"。
+# 这里用标准库起一个本地 HTTP 服务，页面结构 (CSS 选择器、登录 Cookie、未登录跳回登录页)
+# 和 SauceDemo 保持一致，Page Object 不用改一行代码，只要设置 SAUCEDEMO_BASE_URL。
+# 商品数量由 URL 前缀决定：http://127.0.0.1:8001/1000/ 就是一个有 1000 件商品的站点，
+# 一个服务可以同时模拟 6 / 1k / 50k 三种规模。
+#
+# 启动: python -m benchmarks.standin_site --port 8001 --items 6
+# 抓取: SAUCEDEMO_BASE_URL=http://127.0.0.1:8001/1000/ python scraper.py
+
+PASSWORD = "secret_sauce"
+SESSION_COOKIE = "session-username"
+# 单个站点最多模拟多少件商品 (防止 URL 写错把内存吃光)
+MAX_ITEMS = 200_000
+
+# 前 6 件和线上 SauceDemo 一模一样，后面的商品按固定随机种子生成 (每次运行都相同)
+SAUCEDEMO_CATALOG = [
+    (4, "Sauce Labs Backpack", 29.99),
+    (0, "Sauce Labs Bike Light", 9.99),
+    (1, "Sauce Labs Bolt T-Shirt", 15.99),
+    (5, "Sauce Labs Fleece Jacket", 49.99),
+    (2, "Sauce Labs Onesie", 7.99),
+    (3, "Test.allTheThings() T-Shirt (Red)", 15.99),
+]
+
+LOGIN_HTML = """<!DOCTYPE html>
+<html><head><title>Swag Labs</title></head>
+<body>
+<div class="login_logo">Swag Labs</div>
+<form id="login_form" onsubmit="return login()">
+  <input id="user-name" name="user-name" type="text" placeholder="Username">
+  <input id="password" name="password" type="password" placeholder="Password">
+  <div class="error-message-container"></div>
+  <input id="login-button" type="submit" value="Login">
+</form>
+<script>
+function login() {
+  var user = document.getElementById("user-name").value;
+  var password = document.getElementById("password").value;
+  if (!user || password !== "%(password)s") {
+    document.querySelector(".error-message-container").innerHTML =
+      '<h3 data-test="error">Epic sadface: Username and password do not match any user in this service</h3>';
+    return false;
+  }
+  document.cookie = "%(cookie)s=" + encodeURIComponent(user) + "; path=/";
+  window.location.href = "inventory.html";
+  return false;
+}
+</script>
+</body></html>
+""" % {"password": PASSWORD, "cookie": SESSION_COOKIE}
+
+CARD_HTML = """<div class="inventory_item">
+<div class="inventory_item_img"><a href="#" id="item_{id}_img_link"><img alt="{name}" class="inventory_item_img" src="static/img/item-{id}.jpg"></a></div>
+<div class="inventory_item_description">
+<div class="inventory_item_label"><a href="inventory-item.html?id={id}" id="item_{id}_title_link"><div class="inventory_item_name">{name}</div></a>
+<div class="inventory_item_desc">{desc}</div></div>
+<div class="pricebar"><div class="inventory_item_price">${price:.2f}</div><button class="btn_inventory" id="add-to-cart-{id}">Add to cart</button></div>
+</div></div>
+"""
+
+DETAIL_HTML = """<!DOCTYPE html>
+<html><head><title>Swag Labs</title></head>
+<body><div class="inventory_details">
+<img class="inventory_details_img" alt="{name}" src="static/img/item-{id}.jpg">
+<div class="inventory_details_desc_container">
+<div class="inventory_details_name large_size">{name}</div>
+<div class="inventory_details_desc large_size">{desc}</div>
+<div class="inventory_details_price">${price:.2f}</div>
+</div></div></body></html>
+"""
+
+# 1x1 透明 GIF，图片请求没被拦截时也有东西可回
+PIXEL_GIF = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+
+def build_catalog(size, seed=0):
+    """生成 size 件商品 [(item_id, name, price, description), ...]，同样的 size 和 seed 结果完全相同"""
+    rng = random.Random(seed)
+    catalog = [
+        (item_id, name, price, f"{name} description.")
+        for item_id, name, price in SAUCEDEMO_CATALOG[:size]
+    ]
+    for item_id in range(len(SAUCEDEMO_CATALOG), size):
+        price = rng.randint(7, 49) + 0.99
+        name = f"Sauce Labs Item {item_id:06d}"
+        catalog.append((item_id, name, price, f"{name} description."))
+    return catalog
+
+
+def catalog_products(size, seed=0):
+    """和 InventoryPage.get_products() 返回格式一致的商品字典列表 (入库 / API 基准测试直接用)"""
+    return [
+        {"name": name, "price": price, "item_id": str(item_id), "description": desc, "image_url": None}
+        for item_id, name, price, desc in build_catalog(size, seed)
+    ]
+
+
+@lru_cache(maxsize=8)
+def _inventory_page(size):
+    # 50k 件商品的页面有二十多 MB，渲染一次缓存起来，压测时不让替身站点自己成为瓶颈
+    cards = "".join(
+        CARD_HTML.format(id=item_id, name=html.escape(name), desc=html.escape(desc), price=price)
+        for item_id, name, price, desc in build_catalog(size)
+    )
+    body = (
+        '<!DOCTYPE html><html><head><title>Swag Labs</title></head><body>'
+        f'<div class="inventory_list">{cards}</div></body></html>'
+    )
+    return body.encode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def _catalog_index(size):
+    return {item_id: (item_id, name, price, desc) for item_id, name, price, desc in build_catalog(size)}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """路由: [/<商品数>]/ 登录页, inventory.html 列表页, inventory-item.html?id=N 详情页, static/img/* 图片"""
+    server_version = "SauceDemoStandin/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        size = self.server.default_items
+        if parts and parts[0].isdigit():
+            size = min(int(parts.pop(0)), MAX_ITEMS)
+        page = parts[-1] if parts else ""
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if "static" in parts:
+            return self._send(200, PIXEL_GIF, "image/gif")
+        if page in ("", "index.html"):
+            return self._send(200, LOGIN_HTML.encode("utf-8"))
+        if page in ("inventory.html", "inventory-item.html"):
+            # 和 SauceDemo 一样：没登录就只能看到登录页 (页面上出现 #login-button)
+            if not self._logged_in():
+                return self._send(200, LOGIN_HTML.encode("utf-8"))
+            if page == "inventory.html":
+                return self._send(200, _inventory_page(size))
+            item = _catalog_index(size).get(self._item_id(url.query))
+            if item is None:
+                return self._send(404, b"Item not found", "text/plain")
+            item_id, name, price, desc = item
+            body = DETAIL_HTML.format(id=item_id, name=html.escape(name), desc=html.escape(desc), price=price)
+            return self._send(200, body.encode("utf-8"))
+        return self._send(404, b"Not found", "text/plain")
+
+    def _logged_in(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return SESSION_COOKIE in cookie and bool(cookie[SESSION_COOKIE].value)
+
+    @staticmethod
+    def _item_id(query):
+        try:
+            return int(parse_qs(query).get("id", [""])[0])
+        except ValueError:
+            return None
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 压测时每个请求一行访问日志太吵了
+        pass
+
+
+class StandinSite:
+    """
+    在后台线程里运行的替身站点
+    用法:
+        with StandinSite(port=0) as site:
+            login_url = site.base_url(1000)                  # http://127.0.0.1:<port>/1000/
+            inventory_url = site.base_url(1000) + "inventory.html"
+    port=0 表示随机选一个空闲端口；latency 是每个请求额外等待的秒数 (模拟网络延迟)
+    """
+    def __init__(self, host="127.0.0.1", port=0, default_items=len(SAUCEDEMO_CATALOG), latency=0.0):
+        self.server = ThreadingHTTPServer((host, port), StandinHandler)
+        self.server.daemon_threads = True
+        self.server.default_items = default_items
+        self.server.latency = latency
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def base_url(self, items=None):
+        host = self.server.server_address[0]
+        prefix = f"{items}/" if items is not None else ""
+        return f"http://{host}:{self.port}/{prefix}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="standin-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SauceDemo 本地替身站点")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--items", type=int, default=len(SAUCEDEMO_CATALOG), help="不带 URL 前缀时的商品数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求额外的延迟 (毫秒)")
+    args = parser.parse_args()
+
+    site = StandinSite(args.host, args.port, args.items, args.latency_ms / 1000)
+    print(f"替身站点已启动: {site.base_url()} (默认 {args.items} 件商品，"
+          f"{site.base_url(1000)} 就是 1000 件)，Ctrl+C 退出")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
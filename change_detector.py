@@ -0,0 +1,171 @@
+import os
+from database.db_manager import DBManager
+from utils.logger import logger
+
+# ===============================
+# 价格变动检测 (Snapshot Diff)
+# ===============================
+# 每次抓取完，把新快照和上一份快照逐个商品比对，产出三类事件：
+#   added   新上架的商品
+#   removed 下架的商品 (上一轮有、这一轮没有)
+#   changed 价格变化超过阈值的商品
+# 面试亮点：为什么是 O(n)？
+# 上一份快照先按商品 key 建一个哈希表 (dict)，新快照每个商品查一次表，O(1)；
+# 查到的从表里删掉，最后表里剩下的就是下架商品。总共每个商品只碰一次，
+# 不需要两层循环 (O(n^2)) 也不需要排序 (O(n log n))。
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def product_key(product):
+    """商品的唯一 key：优先用站点的商品 id，没有 id (逐个 Locator 的兜底路径) 时用名称"""
+    item_id = product.get("item_id")
+    return f"id:{item_id}" if item_id else f"name:{product['name']}"
+
+
+class ChangeEvent:
+    """一条商品变动事件"""
+    __slots__ = ("kind", "name", "old_price", "new_price")
+
+    def __init__(self, kind, name, old_price=None, new_price=None):
+        self.kind = kind
+        self.name = name
+        self.old_price = old_price
+        self.new_price = new_price
+
+    @property
+    def delta(self):
+        if self.old_price is None or self.new_price is None:
+            return None
+        return round(self.new_price - self.old_price, 2)
+
+    @property
+    def pct(self):
+        """价格变化百分比 (原价为 0 时返回 None)"""
+        if self.delta is None or not self.old_price:
+            return None
+        return round(self.delta / self.old_price * 100, 2)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "old_price": self.old_price,
+            "new_price": self.new_price,
+            "delta": self.delta,
+            "pct": self.pct,
+        }
+
+    def __repr__(self):
+        return f"ChangeEvent({self.to_dict()})"
+
+
+class DiffReport:
+    """一次比对的结果"""
+    def __init__(self, events, unchanged, below_threshold):
+        self.events = events
+        self.unchanged = unchanged
+        # 价格变了但没超过阈值 (不报警) 的商品数
+        self.below_threshold = below_threshold
+
+    def of(self, kind):
+        return [e for e in self.events if e.kind == kind]
+
+    def summary(self):
+        return {
+            ADDED: len(self.of(ADDED)),
+            REMOVED: len(self.of(REMOVED)),
+            CHANGED: len(self.of(CHANGED)),
+            "unchanged": self.unchanged,
+            "below_threshold": self.below_threshold,
+        }
+
+    def __bool__(self):
+        return bool(self.events)
+
+
+class SnapshotDiffer:
+    """
+    增量比对器：新快照的商品可以边抓边 feed()，不需要先攒成完整列表
+    用法:
+        differ = SnapshotDiffer(previous=db.load_known_details())
+        for product in inventory_page.iter_products():
+            differ.feed(product)
+        report = differ.finish()
+    """
+    def __init__(self, previous, min_abs=None, min_pct=None):
+        # 价格变化的报警阈值：绝对值和百分比都要达到才算 "changed" (默认任何变化都报)
+        self.min_abs = min_abs if min_abs is not None else float(os.getenv('DIFF_MIN_ABS', 0))
+        self.min_pct = min_pct if min_pct is not None else float(os.getenv('DIFF_MIN_PCT', 0))
+        # 上一份快照: key -> (名称, 价格)；previous 可以是 {name: row} 字典或商品列表
+        rows = previous.values() if isinstance(previous, dict) else (previous or ())
+        self._remaining = {product_key(p): (p["name"], float(p["price"])) for p in rows}
+        self._seen = set()
+        self.events = []
+        self.unchanged = 0
+        self.below_threshold = 0
+
+    def feed(self, product):
+        """比对新快照里的一个商品，产生事件时返回该事件，否则返回 None"""
+        key = product_key(product)
+        if key in self._seen:
+            # 同一轮里重复出现的商品只比对一次
+            return None
+        self._seen.add(key)
+
+        new_price = float(product["price"])
+        previous = self._remaining.pop(key, None)
+        if previous is None and product.get("item_id"):
+            # 上一轮走的兜底路径，没有存 id：按名称再找一次
+            previous = self._remaining.pop(f"name:{product['name']}", None)
+        if previous is None:
+            return self._emit(ChangeEvent(ADDED, product["name"], new_price=new_price))
+
+        old_price = previous[1]
+        if old_price == new_price:
+            self.unchanged += 1
+            return None
+        event = ChangeEvent(CHANGED, product["name"], old_price, new_price)
+        if abs(event.delta) < self.min_abs or (event.pct is not None and abs(event.pct) < self.min_pct):
+            self.below_threshold += 1
+            return None
+        return self._emit(event)
+
+    def finish(self):
+        """新快照喂完之后调用：上一份快照里没被匹配到的商品就是下架商品"""
+        for name, old_price in self._remaining.values():
+            self._emit(ChangeEvent(REMOVED, name, old_price=old_price))
+        self._remaining = {}
+        report = DiffReport(self.events, self.unchanged, self.below_threshold)
+        logger.info(f"快照比对完成 | {report.summary()}")
+        return report
+
+    def _emit(self, event):
+        self.events.append(event)
+        return event
+
+
+def diff_snapshots(previous, current, min_abs=None, min_pct=None):
+    """一次性比对两份快照 (current 为商品列表)"""
+    differ = SnapshotDiffer(previous, min_abs=min_abs, min_pct=min_pct)
+    for product in current:
+        differ.feed(product)
+    return differ.finish()
+
+
+def load_previous_snapshot():
+    """
+    读取当前线上快照 {商品名: 行}，作为价格比对和"详情没变就跳过"的基线
+    数据库不可用时返回 None：本轮不做比对，详情全部重新抓；连接无论成败都会关闭
+    """
+    db = DBManager()
+    try:
+        db.connect()
+        return db.load_known_details()
+    except Exception as e:
+        logger.warning(f"读取上一份快照失败，本轮没有比对基线: {e}")
+        return None
+    finally:
+        db.close()
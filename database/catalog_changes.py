@@ -0,0 +1,147 @@
+import hashlib
+import os
+from utils.logger import logger
+
+# ===============================
+# 快照摘要 + 增量变更 (Delta Sync)
+# ===============================
+# 下游 (看板、E2E 一致性校验) 想知道"商品有没有变"，以前只能把 /api/products 整个拉回去逐条比。
+# 现在每个快照版本发布时：
+#   1. 算一个内容摘要 (digest) 存进 snapshot_versions —— 轮询方只比一个哈希就知道变没变；
+#   2. 把新旧两张表 JOIN 一次，新增 / 删除 / 变化的商品写进 catalog_changes ——
+#      客户端带着自己手里的版本号来问 /api/products/changes?since=N，只拿回这之后变了的那几行。
+# 面试亮点：
+# 1. 摘要和行的顺序无关：每行先 SHA1，再把前 64 位做 BIT_XOR，整张表在 MySQL 里一条聚合就算完，
+#    不用把数据拉回 Python；Python 端 content_digest() 用同样的算法，可以离线核对；
+# 2. 变更日志只保留最近 CHANGES_RETENTION 个版本，太旧的 since 返回 410，让客户端全量重拉一次。
+
+# 行摘要用的字段 (顺序固定) 和分隔符 (CHAR(31)，单元分隔符，正常文本里不会出现)
+DIGEST_COLUMNS = ("name", "price", "item_id", "description", "image_url")
+DIGEST_SEPARATOR = "\x1f"
+
+# 变更日志保留多少个版本
+CHANGES_RETENTION = int(os.getenv('CATALOG_CHANGES_RETENTION', 500))
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def _row_hash_sql():
+    """单行摘要的 SQL 表达式：SHA1 的前 16 个十六进制字符 -> 64 位无符号整数"""
+    fields = ", ".join(
+        f"IFNULL({c}, '')" if c not in ("name", "price") else c for c in DIGEST_COLUMNS
+    )
+    return f"CAST(CONV(LEFT(SHA1(CONCAT_WS(CHAR(31), {fields})), 16), 16, 10) AS UNSIGNED)"
+
+
+def format_digest(item_count, xor):
+    """(行数, 行摘要异或值) -> 40 位十六进制摘要；带上行数是为了让重复行不会互相抵消"""
+    return hashlib.sha1(f"{item_count}:{xor:016x}".encode("ascii")).hexdigest()
+
+
+def snapshot_digest(cursor, table="products"):
+    """在 MySQL 里算整张表的内容摘要，返回 (item_count, digest)"""
+    cursor.execute(f"SELECT COUNT(*) AS item_count, BIT_XOR({_row_hash_sql()}) AS xor_hash FROM {table}")
+    row = cursor.fetchone()
+    count = int(row["item_count"])
+    return count, format_digest(count, int(row["xor_hash"] or 0))
+
+
+def content_digest(products):
+    """
+    Python 版的 snapshot_digest (算法完全一致)，products 是商品字典列表
+    价格按 DECIMAL(10, 2) 的格式化规则写成两位小数，缺失的详情字段按空字符串处理。
+    """
+    xor = 0
+    for p in products:
+        values = [
+            f"{float(p['price']):.2f}" if c == "price" else ("" if p.get(c) is None else str(p[c]))
+            for c in DIGEST_COLUMNS
+        ]
+        row_hash = hashlib.sha1(DIGEST_SEPARATOR.join(values).encode("utf-8")).hexdigest()
+        xor ^= int(row_hash[:16], 16)
+    return format_digest(len(products), xor)
+
+
+def record(cursor, version, old_table):
+    """
+    快照发布时调用 (和版本号在同一个事务里)：对比旧快照 old_table 和新的 products，
+    把新增 / 删除 / 变化 (价格或详情字段) 的商品写进 catalog_changes，并清理超出保留期的旧变更
+    两边都按 name 关联，走 idx_products_name。
+    """
+    same = " AND ".join(f"n.{c} <=> o.{c}" for c in DIGEST_COLUMNS[1:])
+    cursor.execute(
+        "INSERT IGNORE INTO catalog_changes (version, name, kind, old_price, new_price) "
+        f"SELECT %s, n.name, '{ADDED}', NULL, n.price FROM products n "
+        f"LEFT JOIN {old_table} o ON o.name = n.name WHERE o.name IS NULL "
+        "UNION ALL "
+        f"SELECT %s, o.name, '{REMOVED}', o.price, NULL FROM {old_table} o "
+        "LEFT JOIN products n ON n.name = o.name WHERE n.name IS NULL "
+        "UNION ALL "
+        f"SELECT %s, n.name, '{CHANGED}', o.price, n.price FROM products n "
+        f"JOIN {old_table} o ON o.name = n.name WHERE NOT ({same})",
+        (version, version, version)
+    )
+    changed = cursor.rowcount
+    cursor.execute("DELETE FROM catalog_changes WHERE version <= %s", (version - CHANGES_RETENTION,))
+    logger.info(f"增量变更已记录 {changed} 条 (version={version})")
+    return changed
+
+
+def oldest_since(cursor, latest):
+    """
+    最旧还能做增量同步的 since：变更日志从第一个带摘要的版本开始记录，且只保留 CHANGES_RETENTION 个版本
+    还没有任何带摘要的版本时返回 None
+    """
+    cursor.execute("SELECT MIN(version) AS version FROM snapshot_versions WHERE digest IS NOT NULL")
+    first = cursor.fetchone()["version"]
+    if first is None:
+        return None
+    return max(first - 1, latest - CHANGES_RETENTION)
+
+
+def load(cursor, since, until):
+    """读取 (since, until] 之间的变更事件，按版本号升序"""
+    cursor.execute(
+        "SELECT version, name, kind, old_price, new_price FROM catalog_changes "
+        "WHERE version > %s AND version <= %s ORDER BY version",
+        (since, until)
+    )
+    return cursor.fetchall()
+
+
+def collapse(events):
+    """
+    把多个版本的变更事件合并成每个商品的净变化，返回 {name: {"kind", "old_price", "new_price"}}
+    只看每个商品第一条和最后一条事件：
+      since 时存在吗 = 第一条不是 added；现在存在吗 = 最后一条不是 removed
+      例：v3 added -> v5 changed => added；v3 added -> v6 removed => 没变化 (不返回)；
+          v3 removed -> v4 added => changed
+    events 必须按版本号升序。
+    """
+    first = {}
+    last = {}
+    for event in events:
+        first.setdefault(event["name"], event)
+        last[event["name"]] = event
+
+    net = {}
+    for name, start in first.items():
+        end = last[name]
+        existed = start["kind"] != ADDED
+        exists = end["kind"] != REMOVED
+        if existed and exists:
+            kind = CHANGED
+        elif exists:
+            kind = ADDED
+        elif existed:
+            kind = REMOVED
+        else:
+            continue
+        net[name] = {
+            "kind": kind,
+            "old_price": start["old_price"] if existed else None,
+            "new_price": end["new_price"] if exists else None,
+        }
+    return net
@@ -0,0 +1,175 @@
+import os
+from utils.logger import logger
+
+# ===============================
+# 商品目录统计 (预计算)
+# ===============================
+# 看板要的是 "一共多少件、最低 / 最高 / 平均价、各价格区间各有多少件"，
+# 以前是把 /api/products 整个拉回去在前端算，商品越多越慢。
+# 现在每次写入新快照时 (SnapshotWriter.commit)，用一条 GROUP BY 把每个价格桶的
+# 件数 / 最低价 / 最高价 / 价格总和算好存进 catalog_stats，/api/products/stats 只读这几行。
+# 面试亮点：
+# 1. 接口耗时和商品数量无关 (桶的个数是固定的)，算一次、读很多次；
+# 2. 存"总和"而不是"平均值"：多个桶的平均价 = 总和相加 / 件数相加，可以任意合并；
+# 3. 价格筛选条件正好落在桶边界上时，直接合并相邻的桶，不用回表扫描。
+
+# 价格桶边界 (逗号分隔，升序)，第 i 个桶是 [edges[i], edges[i+1])，最后一个桶没有上限
+# 默认值按 SauceDemo 的价格分布 (7.99 ~ 49.99) 设置
+DEFAULT_EDGES = "0,10,20,30,40,50"
+
+
+def parse_edges(value):
+    """解析桶边界配置 "0,10,20" -> (0.0, 10.0, 20.0)；总是从 0 开始，保证每个商品都落在某个桶里"""
+    edges = sorted({float(item) for item in value.split(",") if item.strip()})
+    if not edges or edges[0] > 0:
+        edges.insert(0, 0.0)
+    return tuple(edges)
+
+
+BUCKET_EDGES = parse_edges(os.getenv('CATALOG_STATS_BUCKETS', DEFAULT_EDGES))
+
+
+def _bucket_case(edges):
+    """价格 -> 桶编号的 SQL 表达式 (CASE WHEN price < 10 THEN 0 WHEN price < 20 THEN 1 ... ELSE n-1 END)"""
+    whens = " ".join(f"WHEN price < %s THEN {i}" for i in range(len(edges) - 1))
+    return f"CASE {whens} ELSE {len(edges) - 1} END", list(edges[1:])
+
+
+def aggregate(cursor, edges=BUCKET_EDGES, table="products", min_price=None, max_price=None):
+    """
+    按价格桶聚合一次，返回每个桶的统计 (空桶也返回，件数为 0)
+    edge_count 是"价格正好等于桶下界"的件数：筛选条件 price <= 某个边界时，
+    要把下一个桶里正好等于这个边界的商品也算进去 (见 summarize)。
+    """
+    case_sql, params = _bucket_case(edges)
+    sql = (
+        f"SELECT {case_sql} AS bucket, COUNT(*) AS item_count, "
+        "MIN(price) AS min_price, MAX(price) AS max_price, SUM(price) AS sum_price, "
+        f"SUM(price IN ({', '.join(['%s'] * len(edges))})) AS edge_count "
+        f"FROM {table} WHERE 1=1"
+    )
+    params += list(edges)
+    if min_price is not None:
+        sql += " AND price >= %s"
+        params.append(min_price)
+    if max_price is not None:
+        sql += " AND price <= %s"
+        params.append(max_price)
+    cursor.execute(sql + " GROUP BY bucket", params)
+    found = {row["bucket"]: row for row in cursor.fetchall()}
+
+    buckets = []
+    for i, lo in enumerate(edges):
+        row = found.get(i) or {}
+        buckets.append({
+            "bucket": i,
+            "lo": lo,
+            "hi": edges[i + 1] if i + 1 < len(edges) else None,
+            "item_count": int(row.get("item_count") or 0),
+            "min_price": _float(row.get("min_price")),
+            "max_price": _float(row.get("max_price")),
+            "sum_price": _float(row.get("sum_price")) or 0.0,
+            "edge_count": int(row.get("edge_count") or 0),
+        })
+    return buckets
+
+
+def record(cursor, version, edges=BUCKET_EDGES):
+    """快照发布时调用 (和版本号在同一个事务里)：算好本版本的分桶统计写入 catalog_stats"""
+    buckets = aggregate(cursor, edges)
+    cursor.executemany(
+        "INSERT INTO catalog_stats (version, bucket, lo, hi, item_count, min_price, max_price, sum_price, edge_count) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        [
+            (version, b["bucket"], b["lo"], b["hi"], b["item_count"], b["min_price"],
+             b["max_price"], b["sum_price"], b["edge_count"])
+            for b in buckets
+        ]
+    )
+    logger.info(f"目录统计已预计算 (version={version}, {len(buckets)} 个价格桶)")
+
+
+def load(cursor, version=None):
+    """读取某个版本 (默认最新版本) 的分桶统计，返回 (version, buckets)；还没有统计时返回 (None, [])"""
+    if version is None:
+        cursor.execute("SELECT MAX(version) AS version FROM catalog_stats")
+        version = cursor.fetchone()["version"]
+        if version is None:
+            return None, []
+    cursor.execute(
+        "SELECT bucket, lo, hi, item_count, min_price, max_price, sum_price, edge_count "
+        "FROM catalog_stats WHERE version = %s ORDER BY bucket",
+        (version,)
+    )
+    buckets = [
+        dict(row, lo=float(row["lo"]), hi=_float(row["hi"]), min_price=_float(row["min_price"]),
+             max_price=_float(row["max_price"]), sum_price=float(row["sum_price"]))
+        for row in cursor.fetchall()
+    ]
+    return (version, buckets) if buckets else (None, [])
+
+
+def summarize(buckets, min_price=None, max_price=None):
+    """
+    用分桶统计回答一个价格区间查询 (min_price <= price <= max_price)
+    只有两端都落在桶边界上 (或者不限) 时才能精确回答，否则返回 None，由调用方回表实时计算。
+    例：桶边界 0,10,20,30，查询 min_price=10&max_price=30
+        = 桶 [10,20) + 桶 [20,30) + 桶 [30,...) 里价格正好是 30 的那些商品
+    """
+    lows = [b["lo"] for b in buckets]
+    start = 0
+    end = len(buckets)
+    if min_price is not None:
+        if min_price not in lows:
+            return None
+        start = lows.index(min_price)
+    if max_price is not None:
+        if max_price not in lows:
+            return None
+        end = lows.index(max_price)
+    if end < start:
+        return _result([])
+
+    selected = list(buckets[start:end])
+    # 上界是闭区间：下一个桶里正好等于上界的商品也要算上
+    if end < len(buckets) and buckets[end]["edge_count"]:
+        edge = buckets[end]
+        price = edge["lo"]
+        selected.append({
+            "bucket": edge["bucket"], "lo": price, "hi": price,
+            "item_count": edge["edge_count"], "min_price": price, "max_price": price,
+            "sum_price": price * edge["edge_count"], "edge_count": edge["edge_count"],
+        })
+    return _result(selected)
+
+
+def _result(buckets):
+    """把若干个桶合并成总体统计 + 每个桶的明细 (件数 / 最低 / 最高 / 平均)"""
+    count = sum(b["item_count"] for b in buckets)
+    total = sum(b["sum_price"] for b in buckets)
+    mins = [b["min_price"] for b in buckets if b["item_count"]]
+    maxs = [b["max_price"] for b in buckets if b["item_count"]]
+    return {
+        "overall": {
+            "count": count,
+            "min": min(mins) if mins else None,
+            "max": max(maxs) if maxs else None,
+            "avg": round(total / count, 2) if count else None,
+            "sum": round(total, 2),
+        },
+        "buckets": [
+            {
+                "lo": b["lo"],
+                "hi": b["hi"],
+                "count": b["item_count"],
+                "min": b["min_price"],
+                "max": b["max_price"],
+                "avg": round(b["sum_price"] / b["item_count"], 2) if b["item_count"] else None,
+            }
+            for b in buckets
+        ],
+    }
+
+
+def _float(value):
+    return float(value) if value is not None else None
@@ -1,8 +1,55 @@
 import pymysql
 import os
 import time
-import sys
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pymysql.constants import SERVER_STATUS
 from utils.logger import logger  # 导入日志模块
+from utils import metrics
+from utils.circuit_breaker import CircuitBreaker
+from utils.rate_limit import backoff_delays
+from database import catalog_changes, catalog_stats, migrations, snapshot_publish
+
+# ===============================
+# 快照写入配置
+# ===============================
+# 新快照先写入影子表，再用 RENAME TABLE 原子交换
+STAGING_TABLE = "products_staging"
+OLD_TABLE = "products_old"
+# 每批插入行数 (可通过环境变量调整)
+SAVE_CHUNK_SIZE = int(os.getenv('SAVE_CHUNK_SIZE', 1000))
+# 写入者互斥锁 (MySQL 命名锁)
+SNAPSHOT_LOCK = "saucemall_snapshot_write"
+SNAPSHOT_LOCK_TIMEOUT = 60
+
+# ===============================
+# 连接重试 (批处理任务用：爬虫 / 迁移 / 守护进程)
+# ===============================
+# 第 n 次重试等待 [0, min(cap, base * 2^n)] 秒的随机时间 (指数退避 + 全抖动)
+DB_CONNECT_RETRIES = int(os.getenv('DB_CONNECT_RETRIES', 5))
+DB_CONNECT_BACKOFF = float(os.getenv('DB_CONNECT_BACKOFF', 0.5))
+DB_CONNECT_BACKOFF_CAP = float(os.getenv('DB_CONNECT_BACKOFF_CAP', 10))
+
+# ===============================
+# 指标 (见 utils/metrics.py，由 /api/metrics 输出)
+# ===============================
+DB_CONNECT_SECONDS = metrics.histogram(
+    "saucemall_db_connect_seconds", "Time to open a new MySQL connection (TCP + auth)")
+DB_OPERATION_SECONDS = metrics.histogram(
+    "saucemall_db_operation_seconds", "Duration of DBManager operations", ["operation"])
+DB_POOL_WAIT_SECONDS = metrics.histogram(
+    "saucemall_db_pool_wait_seconds", "Time spent waiting to check out a pooled connection")
+SNAPSHOT_ROWS_WRITTEN = metrics.counter(
+    "saucemall_snapshot_rows_written_total", "Rows written into the staging table")
+SNAPSHOTS_PUBLISHED = metrics.counter(
+    "saucemall_snapshots_published_total", "Snapshots atomically swapped into products")
+
+
+class DatabaseUnavailableError(Exception):
+    """重试多次仍然连不上数据库 (代替原来的 sys.exit，由调用方决定是退出还是降级)"""
+
 
 class DBManager:
     """
@@ -19,104 +66,173 @@ class DBManager:
         self.db_name = os.getenv('DB_NAME', 'saucemall')
         self.conn = None
 
-    def connect(self):
+    def connect(self, retries=None):
         """
         建立数据库连接 (带重试机制)
         面试亮点：为什么需要重试？
         因为数据库容器启动往往比爬虫慢，或者网络会出现短暂抖动。
+        为什么是指数退避 + 随机抖动，而不是固定 sleep(2)？
+        固定间隔下，一起启动的多个进程会在同一时刻一起重试；退避让等待越来越长，
+        抖动把大家的重试时间错开，数据库刚恢复时不会被一波重连打挂。
+        全部失败时抛 DatabaseUnavailableError，不再 sys.exit()：
+        这个方法可能跑在 Web 进程里，退出整个进程的决定应该交给调用方。
         """
+        retries = DB_CONNECT_RETRIES if retries is None else retries
         logger.info(f"正在连接数据库 {self.host}:{self.port}...")
-        # 尝试连接 5 次
-        for i in range(5):
+        delays = backoff_delays(retries - 1, base=DB_CONNECT_BACKOFF, cap=DB_CONNECT_BACKOFF_CAP)
+        last_error = None
+        for attempt in range(1, retries + 1):
             try:
-                self.conn = pymysql.connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    db=self.db_name,
-                    charset='utf8mb4',
-                    # 返回字典类型的游标，方便通过列名访问数据 (e.g., row['price'])
-                    cursorclass=pymysql.cursors.DictCursor
-                )
+                self.conn = self.create_connection()
                 logger.info("数据库连接成功 established.")
-                # 连接成功后顺便初始化表
-                self.init_table()
+                # 注意：这里不再建表。表结构由 migrate() 在部署/启动时统一跑一次
                 return
             except pymysql.MySQLError as e:
-                # 连接失败，打印错误并等待 2 秒后重试
-                logger.warning(f"Connection attempt {i+1} failed: {e}. Retrying in 2s...")
-                time.sleep(2)
-        
-        # 5次都失败，程序退出
-        logger.critical("Failed to connect to the database after 5 attempts.")
-        sys.exit(1)
+                last_error = e
+                delay = next(delays, None)
+                if delay is None:
+                    break
+                logger.warning(f"Connection attempt {attempt} failed: {e}. Retrying in {delay:.2f}s...")
+                time.sleep(delay)
+
+        logger.critical(f"Failed to connect to the database after {retries} attempts.")
+        raise DatabaseUnavailableError(
+            f"Could not connect to {self.host}:{self.port} after {retries} attempts: {last_error}"
+        ) from last_error
     
-    def save_product(self, product_list):
+    def create_connection(self, **overrides):
         """
-        批量保存商品数据
-        面试亮点：事务 (Transaction) + 批量插入 (Batch Insert)
+        创建一条原始的 pymysql 连接 (不重试、不建表)
+        connect() 和连接池 (ConnectionPool) 共用这一份连接参数。
         """
-        if not self.conn:
-            self.connect()
-        
+        params = dict(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            db=self.db_name,
+            charset='utf8mb4',
+            # 返回字典类型的游标，方便通过列名访问数据 (e.g., row['price'])
+            cursorclass=pymysql.cursors.DictCursor
+        )
+        params.update(overrides)
+        with DB_CONNECT_SECONDS.time():
+            return pymysql.connect(**params)
+
+    @metrics.timed(DB_OPERATION_SECONDS, operation="save_product")
+    def save_product(self, product_list, chunk_size=None, run_id=None):
+        """
+        批量保存商品数据 (整份快照原子替换)
+        面试亮点：影子表 (Staging Table) + 批量插入 + RENAME TABLE 原子交换
+        为什么不用 TRUNCATE + INSERT？
+        MySQL 的 TRUNCATE 是 DDL，会隐式提交：写入过程中 API 会读到空表/半张表，
+        而且出错后 rollback 也恢复不了已经被清空的旧数据。
+        现在的做法：新数据先写进 products_staging，写完后一条 RENAME TABLE 原子地换上去，
+        读者要么看到完整的旧快照，要么看到完整的新快照。
+        返回新快照的版本号 (保存失败返回 None)。
+        """
+        # 写入流程拆成了 SnapshotWriter 的几个阶段，流式管道 (pipeline.py) 也复用它
+        writer = SnapshotWriter(self, run_id=run_id, chunk_size=chunk_size)
         try:
-            # 使用 Context Manager 自动关闭游标
-            with self.conn.cursor() as cursor:
-                # 1. 事务开始：先清空旧数据 (TRUNCATE)
-                # TRUNCATE 比 DELETE 速度快，且会重置自增 ID
-                logger.info("正在清空旧数据 (TRUNCATE)...")
-                cursor.execute("TRUNCATE TABLE products")
-                
-                # 2. 准备 SQL 语句
-                # 使用 %s 占位符防止 SQL 注入
-                sql = "INSERT INTO products (name, price) VALUES (%s, %s)"
-                
-                # 3. 准备数据格式
-                # 将字典列表转换为 tuple 列表: [('Bag', 29.99), ('Light', 9.99)]
-                data_to_insert = [
-                    (p['name'], float(p['price'])) 
-                    for p in product_list
-                ]
-                
-                # 4. 批量执行插入 (Batch Insert)
-                # 相比于在 for 循环里一条条 insert，executemany 性能高出 10 倍以上
-                logger.info(f"正在批量插入 {len(data_to_insert)} 条数据...")
-                cursor.executemany(sql, data_to_insert)
-            
-            # 5. 提交事务 (Commit)
-            # 只有 commit 了，数据才会真正写入硬盘
-            self.conn.commit()
-            logger.success("数据保存成功！(Committed)")
-            
+            writer.begin()
+            logger.info(f"正在批量写入影子表 {len(product_list)} 条数据 (chunk_size={writer.chunk_size})...")
+            writer.write(product_list)
+            return writer.commit()
         except pymysql.MySQLError as e:
-            # 6. 回滚事务 (Rollback)
-            # 如果中间任何一步出错，撤销所有操作，保证数据库不脏
-            self.conn.rollback()
-            logger.error(f"Error saving data: {e}. Transaction Rolled Back.")
+            # 交换之前出错，或者交换之后出错但旧快照已经换回来：线上 products 和已发布的版本号都没变
+            writer.abort()
+            if writer.swapped:
+                logger.error(f"Error saving data: {e}. New snapshot is live but unpublished (see critical log).")
+            else:
+                logger.error(f"Error saving data: {e}. Transaction Rolled Back.")
+
+    @metrics.timed(DB_OPERATION_SECONDS, operation="load_known_details")
+    def load_known_details(self):
+        """
+        读取当前快照里每个商品的列表数据 + 详情字段
+        详情抓取用它判断"列表数据没变、详情已经有了"的商品，可以跳过详情页。
+        """
+        if not self.conn:
+            self.connect()
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT name, price, item_id, description, image_url FROM products")
+            rows = cursor.fetchall()
+        self.conn.commit()
+        return {row['name']: row for row in rows}
 
-    def init_table(self):
+    def record_run(self, row):
         """
-        初始化数据表结构
+        写入一条抓取台账 (scrape_runs)，row 是 run_ledger.ScrapeRun.to_row() 的结果
+        同一个 run_id 重复写入时覆盖 (例如先记 crashed，后面又补记了结果)
         """
         if not self.conn:
-            return # Should be called inside connect usually, or check conn
-            
-        sql = """
-        CREATE TABLE IF NOT EXISTS products (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            price DECIMAL(10, 2) NOT NULL,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        ) 
+            self.connect()
+        columns = list(row)
+        updates = ", ".join(f"{c} = VALUES({c})" for c in columns if c != "run_id")
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO scrape_runs ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}",
+                tuple(row.values())
+            )
+        self.conn.commit()
+
+    def _record_history(self, cursor, run_id):
+        """
+        把本次快照追加到价格历史表
+        面试亮点：去重写入。用 price_latest 记住每个商品上一次的价格，
+        一次 LEFT JOIN 就能挑出"新商品 + 变价商品"，价格没变的不写，
+        历史表的增长只和真实的价格变动成正比，而不是和抓取次数成正比。
+        """
+        changed = """
+            FROM products p
+            LEFT JOIN price_latest l ON l.name = p.name
+            WHERE l.name IS NULL OR l.price <> p.price
         """
+        cursor.execute(
+            "INSERT IGNORE INTO price_history (run_id, name, price, scraped_at) "
+            "SELECT %s, p.name, p.price, NOW() " + changed,
+            (run_id,)
+        )
+        inserted = cursor.rowcount
+        # 套一层派生表，避免 ON DUPLICATE KEY UPDATE 里的列名和 JOIN 的列名冲突
+        cursor.execute(
+            "INSERT INTO price_latest (name, price, run_id) "
+            "SELECT c.name, c.price, %s FROM (SELECT p.name, p.price " + changed + ") AS c "
+            "ON DUPLICATE KEY UPDATE price = VALUES(price), run_id = VALUES(run_id)",
+            (run_id,)
+        )
+        logger.info(f"价格历史已追加 {inserted} 条变化记录 (run_id={run_id})")
+
+    def _bump_version(self, cursor, run_id, item_count, digest=None):
+        """
+        发布新的快照版本号 (单调递增)，连同快照的内容摘要一起记录
+        API 的响应缓存 / ETag 都以版本号为 key，版本号一变，旧缓存自然失效。
+        """
+        cursor.execute(
+            "INSERT INTO snapshot_versions (run_id, item_count, digest) VALUES (%s, %s, %s)",
+            (run_id, item_count, digest)
+        )
+        return cursor.lastrowid
+
+    def _drop_staging(self):
+        """清理写了一半的影子表"""
         try:
             with self.conn.cursor() as cursor:
-                cursor.execute(sql)
-            self.conn.commit()
-            logger.debug("Table 'products' initialized/verified.")
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
         except pymysql.MySQLError as e:
-            logger.error(f"Failed to initialize table: {e}")
+            logger.warning(f"Failed to drop staging table: {e}")
+
+    @metrics.timed(DB_OPERATION_SECONDS, operation="migrate")
+    def migrate(self):
+        """
+        执行版本化的表结构迁移 (只在部署 / 启动时调用一次)
+        具体的迁移列表见 database/migrations.py
+        """
+        if not self.conn:
+            self.connect()
+        return migrations.migrate(self.conn)
     
     def close(self):
         """关闭数据库连接，释放资源"""
@@ -124,8 +240,506 @@ class DBManager:
             self.conn.close()
             logger.info("Database connection closed.")
 
+
+class SnapshotWriter:
+    """
+    一次快照写入的完整生命周期：begin -> write (可多次) -> commit / abort
+    save_product() 一次性把整份列表写进去；流式管道则边抓边 write()，
+    两者最终都是同一次 RENAME TABLE 原子交换，读者不会看到写了一半的快照。
+    注意：begin() 到 commit() / abort() 之间独占 DBManager 的连接和快照写锁。
+    """
+    INSERT_SQL = (
+        f"INSERT INTO {STAGING_TABLE} (name, price, item_id, description, image_url) "
+        "VALUES (%s, %s, %s, %s, %s)"
+    )
+
+    def __init__(self, db, run_id=None, chunk_size=None):
+        self.db = db
+        # 本次抓取的批次号，价格历史按 (run_id, 商品) 记录
+        self.run_id = run_id or uuid.uuid4().hex
+        # 每批插入多少行，数据量大时分批写，避免单条 SQL 过大 (超过 max_allowed_packet)
+        self.chunk_size = chunk_size or SAVE_CHUNK_SIZE
+        self.count = 0
+        # True 表示影子表已经换上线 (还没发布成功时出错且没能换回)
+        self.swapped = False
+        self._locked = False
+
+    def begin(self):
+        """拿写锁，准备一张和 products 结构 (含索引) 完全一样的空影子表"""
+        if not self.db.conn:
+            self.db.connect()
+        with self.db.conn.cursor() as cursor:
+            # 同一时间只允许一个写入者 (两个爬虫同时跑会抢同一张影子表)
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (SNAPSHOT_LOCK, SNAPSHOT_LOCK_TIMEOUT))
+            if not cursor.fetchone()['locked']:
+                raise pymysql.OperationalError(f"Could not acquire snapshot lock '{SNAPSHOT_LOCK}'")
+            self._locked = True
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            cursor.execute(f"CREATE TABLE {STAGING_TABLE} LIKE products")
+        return self
+
+    def write(self, products):
+        """
+        把一批商品写进影子表 (Batch Insert)
+        pymysql 的 executemany 会把 INSERT ... VALUES 改写成一条多行 INSERT，一个 chunk 只需要一次网络往返。
+        影子表对读者不可见，所以每批写完就可以提交，事务不会随着快照变大而越拖越长。
+        """
+        # 将字典列表转换为 tuple 列表: [('Bag', 29.99, '4', '...', 'https://...'), ...]
+        # 详情字段 (item_id / description / image_url) 没抓到时存 NULL
+        rows = [
+            (p['name'], float(p['price']), p.get('item_id'), p.get('description'), p.get('image_url'))
+            for p in products
+        ]
+        with self.db.conn.cursor() as cursor:
+            for start in range(0, len(rows), self.chunk_size):
+                cursor.executemany(self.INSERT_SQL, rows[start:start + self.chunk_size])
+        self.db.conn.commit()
+        self.count += len(rows)
+        SNAPSHOT_ROWS_WRITTEN.inc(len(rows))
+
+    def commit(self):
+        """
+        原子交换影子表，追加价格历史、发布新版本号 (带内容摘要)、记录增量变更并预计算目录统计，返回版本号
+        注意 RENAME TABLE 是 DDL，会自己提交，没法和后面的写入放进同一个事务。所以：
+        交换之后的写入 (历史 / 版本号 / 增量 / 统计) 放在一个事务里，任何一步失败都整体回滚，
+        再把旧快照换回来 (_swap_back)，线上数据和已发布的版本号始终对得上。
+        换表到版本号提交 (或换回) 之间，发布标记是"发布中"，API 这段时间读到的数据不缓存 (见 snapshot_publish.py)。
+        """
+        conn = self.db.conn
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {OLD_TABLE}")
+                # 先提交"发布中"标记，再换表：读者只要看到新数据，就一定也能看到这个标记
+                snapshot_publish.begin(cursor)
+                conn.commit()
+                # 一条 RENAME TABLE 同时改两个表名，中间状态对读者不可见
+                cursor.execute(f"RENAME TABLE products TO {OLD_TABLE}, {STAGING_TABLE} TO products")
+            self.swapped = True
+
+            try:
+                with conn.cursor() as cursor:
+                    # 追加价格历史 (只记录新增 / 价格有变化的商品)，并发布新的快照版本号 (带内容摘要)
+                    self.db._record_history(cursor, self.run_id)
+                    _, digest = catalog_changes.snapshot_digest(cursor)
+                    version = self.db._bump_version(cursor, self.run_id, self.count, digest)
+                    # 增量变更 / 目录统计和版本号一起提交：API 看到新版本号时，对应的数据一定已经在了
+                    catalog_changes.record(cursor, version, OLD_TABLE)
+                    catalog_stats.record(cursor, version)
+                    # 发布完成：标记和版本号一起提交
+                    snapshot_publish.end(cursor)
+                conn.commit()
+            except Exception:
+                self._swap_back()
+                raise
+
+            # 旧快照要留到这里和新快照做对比，所以提交之后才删 (DDL 会隐式提交事务)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {OLD_TABLE}")
+            except pymysql.MySQLError as e:
+                # 新快照已经提交了，旧表删不掉也不影响读者，下次写快照前会再 DROP IF EXISTS
+                logger.warning(f"Failed to drop old snapshot table: {e}")
+        finally:
+            self._release_lock()
+        SNAPSHOTS_PUBLISHED.inc()
+        logger.success(f"数据保存成功！(Snapshot Swapped, version={version}, rows={self.count})")
+        return version
+
+    def _swap_back(self):
+        """
+        交换之后的发布步骤失败：回滚没提交的写入，再把旧快照换回 products (新数据回到影子表，由 abort 清理)
+        换回也失败时 (比如连接已经断了)，新快照留在线上但没有版本号，只能记 critical 日志等人处理；
+        这时发布标记一直停在"发布中"，API 不会缓存这份没有版本号的数据
+        """
+        conn = self.db.conn
+        try:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f"RENAME TABLE products TO {STAGING_TABLE}, {OLD_TABLE} TO products")
+        except pymysql.MySQLError as e:
+            logger.critical(
+                f"快照发布失败且无法换回旧快照: {e}。新数据已在线上但没有版本号 / 增量记录，"
+                f"旧快照保留在 {OLD_TABLE} 中，请人工处理"
+            )
+            return
+        self.swapped = False
+        try:
+            # 旧快照回到线上之后才结束"发布中"：换表窗口里读到的数据都没有进缓存
+            with conn.cursor() as cursor:
+                snapshot_publish.end(cursor)
+            conn.commit()
+        except pymysql.MySQLError as e:
+            # 标记停在"发布中"只会让 API 暂时不缓存，下一次发布会把它复位
+            logger.warning(f"Failed to reset snapshot publish marker: {e}")
+        logger.warning("快照发布失败，已回滚并换回旧快照")
+
+    def abort(self):
+        """放弃本次写入：回滚 + 清理影子表，线上 products 保持不变"""
+        if not self.db.conn:
+            return
+        if self.swapped:
+            # 新快照已经在线上 (换回失败)，影子表已不存在，旧快照还要留着人工处理，这里什么都不动
+            self._release_lock()
+            return
+        try:
+            self.db.conn.rollback()
+            self.db._drop_staging()
+        except pymysql.MySQLError as e:
+            logger.warning(f"Failed to abort snapshot write: {e}")
+        finally:
+            self._release_lock()
+
+    def _release_lock(self):
+        if not self._locked:
+            return
+        self._locked = False
+        try:
+            with self.db.conn.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (SNAPSHOT_LOCK,))
+        except pymysql.MySQLError as e:
+            # 连接断了的话 MySQL 会自动释放命名锁
+            logger.warning(f"Failed to release snapshot lock: {e}")
+
+
+class PoolTimeoutError(Exception):
+    """借连接超时：池子已满，且在 timeout 秒内没有连接被归还"""
+
+
+def is_connection_error(error):
+    """
+    是不是"连不上 / 连接断了"这一类错误 (只有这类才计入熔断器、才返回 503)
+    面试亮点：pymysql 把没有单独映射的服务端错误 (1054 字段不存在、1205 锁等待超时……) 也抛成 OperationalError，
+    只看异常类型会把写错的 SQL、锁冲突当成数据库挂了，错误地打开熔断器。
+    真正的连接级错误是 InterfaceError (连接已关闭) 和客户端错误码 CR 2000-2999 (2003 连不上、2013 连接中断)。
+    """
+    if isinstance(error, pymysql.InterfaceError):
+        return True
+    if isinstance(error, pymysql.OperationalError) and error.args:
+        code = error.args[0]
+        return isinstance(code, int) and 2000 <= code <= 2999
+    return False
+
+
+class ConnectionPool:
+    """
+    线程安全的有界数据库连接池
+    面试亮点：为什么需要连接池？
+    每次请求都 pymysql.connect() 要付出 TCP 握手 + MySQL 认证的代价，
+    高并发下这部分开销甚至比 SELECT 本身还大。连接池把连接"借出 -> 归还"复用起来，
+    同时用 max_size 限制住打到 MySQL 的最大连接数，避免把数据库打挂。
+    """
+    def __init__(self, factory, min_size=1, max_size=10, timeout=5.0,
+                 idle_timeout=300.0, max_lifetime=3600.0, breaker=None):
+        # factory: 无参函数，返回一条新的 pymysql 连接
+        self._factory = factory
+        # breaker: 可选的熔断器，数据库连续出错时借连接直接失败，不再排队等连接超时
+        self.breaker = breaker
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout              # 借连接最多等多少秒
+        self.idle_timeout = idle_timeout    # 空闲超过多少秒就回收
+        self.max_lifetime = max_lifetime    # 连接最长存活多少秒 (防止 MySQL wait_timeout 踢掉)
+
+        # 空闲连接栈：元素是 [conn, created_at, last_used_at]
+        # 用 LIFO (后进先出)，优先复用"最热"的连接，冷连接自然会因为空闲超时被回收
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # 统计信息 (供 /api/pool/stats 调优池大小)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._closed = 0
+        self._health_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        # 连接出生时间 (id(conn) -> created_at)，归还时用来判断是否超过 max_lifetime
+        self._born = {}
+
+    # ===============================
+    # 借出 / 归还
+    # ===============================
+    def acquire(self):
+        """
+        借出一条健康的连接，池满时最多等待 self.timeout 秒
+        熔断器打开时直接抛 CircuitOpenError (不等待、不建连接)
+        """
+        if self.breaker is not None:
+            self.breaker.before_call()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        stale = []
+        entry = None
+        with self._cond:
+            while True:
+                # 1. 优先复用空闲连接 (顺便把过期的挑出来关掉)
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if self._expired(candidate, time.monotonic()):
+                        stale.append(candidate[0])
+                        continue
+                    entry = candidate
+                    break
+                if entry is not None:
+                    self._in_use += 1
+                    break
+                # 2. 没有空闲连接，但还没到上限：先占个坑，出锁后再建连接
+                if self._in_use + len(self._idle) < self.max_size:
+                    self._in_use += 1
+                    break
+                # 3. 池满了，只能等别人归还
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._close_all(stale)
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a DB connection "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+            self._record_wait(time.monotonic() - start)
+        DB_POOL_WAIT_SECONDS.observe(time.monotonic() - start)
+
+        # 网络 I/O 一律放在锁外面做，避免一个慢连接卡住所有线程
+        self._close_all(stale)
+        try:
+            if entry is not None:
+                conn = entry[0]
+                # 健康检查：ping 不通说明连接已被服务端断开，换一条新的
+                if self._healthy(conn):
+                    self._record_success()
+                    return conn
+                with self._cond:
+                    self._health_failures += 1
+                self._close_all([conn])
+            conn = self._new_connection()
+            self._record_success()
+            return conn
+        except Exception as e:
+            # 只有连接级别的错误 (连不上、连接中断) 才计入熔断器
+            if is_connection_error(e):
+                self._record_failure()
+            # 建连接失败，把占的坑还回去
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """归还连接；discard=True 表示连接已损坏，直接关闭不再复用"""
+        now = time.monotonic()
+        born = self._born.get(id(conn), now)
+        if not discard:
+            try:
+                # 如果调用方开了事务却没提交，回滚掉，别把脏状态留给下一个借用者
+                if conn.open and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    conn.rollback()
+            except pymysql.MySQLError:
+                discard = True
+        if not conn.open or (now - born) > self.max_lifetime:
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append([conn, born, now])
+            self._cond.notify()
+        if discard:
+            self._close_all([conn])
+
+    @contextmanager
+    def connection(self):
+        """
+        用法:
+            with pool.connection() as conn:
+                with conn.cursor() as cursor: ...
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except pymysql.MySQLError as e:
+            # 连接级别的错误 (断线、超时)：这条连接不能再用了，也算熔断器的一次失败
+            # SQL 写错、锁等待超时之类的服务端错误原样抛出，连接照常归还
+            if is_connection_error(e):
+                discard = True
+                self._record_failure()
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ===============================
+    # 维护
+    # ===============================
+    def warmup(self):
+        """预先建好 min_size 条连接，避免第一批请求付建连成本"""
+        conns = []
+        try:
+            for _ in range(self.min_size):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def prune(self):
+        """回收空闲超时 / 超过最大寿命的连接，但至少保留 min_size 条"""
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            keep = deque()
+            while self._idle:
+                entry = self._idle.popleft()
+                total = self._in_use + len(self._idle) + len(keep) + 1
+                if self._expired(entry, now) and total > self.min_size:
+                    stale.append(entry[0])
+                else:
+                    keep.append(entry)
+            self._idle = keep
+        self._close_all(stale)
+        return len(stale)
+
+    def close(self):
+        """关闭所有空闲连接 (正在借出的连接归还时会被正常回收)"""
+        with self._cond:
+            conns = [entry[0] for entry in self._idle]
+            self._idle.clear()
+        self._close_all(conns)
+
+    def stats(self):
+        """连接池运行指标"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "size": self._in_use + len(self._idle),
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "closed": self._closed,
+                "health_check_failures": self._health_failures,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_avg": round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+                "circuit": self.breaker.stats() if self.breaker is not None else None,
+            }
+
+    # ===============================
+    # 内部方法
+    # ===============================
+    def _new_connection(self):
+        conn = self._factory()
+        with self._cond:
+            self._created += 1
+            self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _record_success(self):
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _record_failure(self):
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def _expired(self, entry, now):
+        _, born, last_used = entry
+        return (now - last_used) > self.idle_timeout or (now - born) > self.max_lifetime
+
+    def _healthy(self, conn):
+        try:
+            # reconnect=False：坏了就换新连接，而不是在旧对象上偷偷重连
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _record_wait(self, waited):
+        # 调用方已持有 self._cond
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _close_all(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if conns:
+            with self._cond:
+                self._closed += len(conns)
+                for conn in conns:
+                    self._born.pop(id(conn), None)
+
+
+# 进程级别的共享连接池 (懒加载，第一次使用时才创建)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    获取全局共享连接池
+    池大小等参数都可以通过环境变量配置，方便压测时调优:
+    DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT / DB_POOL_IDLE_TIMEOUT / DB_POOL_MAX_LIFETIME
+    连接 / 读超时和熔断器 (API 请求路径不重试，数据库故障时快速失败):
+    DB_POOL_CONNECT_TIMEOUT / DB_POOL_READ_TIMEOUT / DB_BREAKER_FAILURES / DB_BREAKER_RESET
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                db = DBManager()
+                _pool = ConnectionPool(
+                    # 池里的连接只给 API 读用，开 autocommit：
+                    # 否则 REPEATABLE READ 下一个没结束的事务会一直读到旧快照
+                    factory=lambda: db.create_connection(
+                        autocommit=True,
+                        # pymysql 默认连接超时 10 秒、读超时无限：数据库卡住时请求线程会一直挂着
+                        connect_timeout=float(os.getenv('DB_POOL_CONNECT_TIMEOUT', 2)),
+                        read_timeout=float(os.getenv('DB_POOL_READ_TIMEOUT', 10)),
+                    ),
+                    min_size=int(os.getenv('DB_POOL_MIN', 1)),
+                    max_size=int(os.getenv('DB_POOL_MAX', 10)),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+                    idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+                    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+                    breaker=CircuitBreaker(
+                        "mysql",
+                        failure_threshold=int(os.getenv('DB_BREAKER_FAILURES', 5)),
+                        reset_timeout=float(os.getenv('DB_BREAKER_RESET', 10)),
+                    ),
+                )
+                logger.info(f"数据库连接池已创建 (min={_pool.min_size}, max={_pool.max_size})")
+    return _pool
+
+
+def reset_pool_after_fork():
+    """
+    子进程 fork 出来后丢掉从父进程继承的连接池
+    面试亮点：为什么不能直接用父进程的连接？
+    fork 会把 socket 文件描述符原样复制一份，父子进程拿着同一条 TCP 连接收发 MySQL 协议包，
+    响应会串到别人的请求里。这里也不能 close()：close 会发 COM_QUIT，把父进程那边的连接也关掉。
+    所以只是把引用扔掉，子进程第一次 get_pool() 时重新建自己的池；锁也要换新的，
+    fork 时如果别的线程正拿着锁，子进程里这把锁永远不会被释放。
+    """
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+# 任何方式的 fork (gunicorn 的 pre-fork worker、multiprocessing) 都自动重置连接池
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_pool_after_fork)
+
+
 if __name__ == "__main__":
-    # 本地测试代码
+    # 部署 / CI 初始化数据库：执行表结构迁移
     db = DBManager()
     db.connect()
+    db.migrate()
     db.close()
\ No newline at end of file
@@ -0,0 +1,221 @@
+from utils.logger import logger
+
+# ===============================
+# 版本化的表结构迁移 (Schema Migrations)
+# ===============================
+# 面试亮点：为什么不在每次 connect() 时 CREATE TABLE IF NOT EXISTS？
+# 1. 每个连接都多一次 DDL 往返 + commit，高并发下白白浪费时间。
+# 2. IF NOT EXISTS 只能"建表"，没法演进表结构 (加索引、加字段)。
+# 这里改成类似 Flyway / Alembic 的做法：每个迁移有一个递增的版本号，
+# 执行过的版本记录在 schema_version 表里，部署/启动时只跑一次没执行过的迁移。
+#
+# 注意：已经发布的迁移不要修改，表结构有变化请在列表末尾追加新版本。
+
+MIGRATIONS = [
+    (1, "create products table", [
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # /api/products 的访问路径：价格区间筛选、按名称查找、按抓取时间排序
+    (2, "add secondary indexes on products(price, name, scraped_at)", [
+        """
+        ALTER TABLE products
+            ADD INDEX idx_products_price (price),
+            ADD INDEX idx_products_name (name),
+            ADD INDEX idx_products_scraped_at (scraped_at)
+        """,
+    ]),
+    # 价格历史：只追加 (append-only)，价格没变的商品不会重复写入
+    (3, "create price_history and price_latest tables", [
+        """
+        CREATE TABLE IF NOT EXISTS price_history (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            run_id CHAR(32) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            scraped_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_price_history_run_name (run_id, name),
+            KEY idx_price_history_name_time (name, scraped_at)
+        )
+        """,
+        # 每个商品最近一次记录的价格，用来 O(n) 判断"价格有没有变"
+        """
+        CREATE TABLE IF NOT EXISTS price_latest (
+            name VARCHAR(255) PRIMARY KEY,
+            price DECIMAL(10, 2) NOT NULL,
+            run_id CHAR(32) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # 快照版本号：每次 save_product 换上新快照后 +1，API 缓存以它作为失效依据
+    (4, "create snapshot_versions table", [
+        """
+        CREATE TABLE IF NOT EXISTS snapshot_versions (
+            version BIGINT AUTO_INCREMENT PRIMARY KEY,
+            run_id CHAR(32) NOT NULL,
+            item_count INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # 详情页字段 (由 detail_crawler.py 抓取)，影子表用 CREATE TABLE ... LIKE products 自动带上
+    (5, "add detail columns to products", [
+        """
+        ALTER TABLE products
+            ADD COLUMN item_id VARCHAR(32) NULL,
+            ADD COLUMN description TEXT NULL,
+            ADD COLUMN image_url VARCHAR(512) NULL
+        """,
+    ]),
+    # 抓取台账：每次抓取一行 (各阶段耗时、商品数、流量、结果、产出的快照版本)，用来看长期趋势
+    (6, "create scrape_runs table", [
+        """
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            run_id CHAR(32) PRIMARY KEY,
+            source VARCHAR(32) NOT NULL,
+            username VARCHAR(64) NULL,
+            status VARCHAR(16) NOT NULL,
+            error TEXT NULL,
+            started_at DATETIME(3) NOT NULL,
+            finished_at DATETIME(3) NOT NULL,
+            duration_ms INT NOT NULL,
+            phases JSON NOT NULL,
+            item_count INT NOT NULL DEFAULT 0,
+            request_count INT NOT NULL DEFAULT 0,
+            bytes_transferred BIGINT NOT NULL DEFAULT 0,
+            snapshot_version BIGINT NULL,
+            KEY idx_scrape_runs_started (started_at),
+            KEY idx_scrape_runs_status_started (status, started_at)
+        )
+        """,
+    ]),
+    # 目录统计：每个快照版本每个价格桶一行，写快照时预计算，/api/products/stats 直接读
+    (7, "create catalog_stats table", [
+        """
+        CREATE TABLE IF NOT EXISTS catalog_stats (
+            version BIGINT NOT NULL,
+            bucket INT NOT NULL,
+            lo DECIMAL(10, 2) NOT NULL,
+            hi DECIMAL(10, 2) NULL,
+            item_count INT NOT NULL,
+            min_price DECIMAL(10, 2) NULL,
+            max_price DECIMAL(10, 2) NULL,
+            sum_price DECIMAL(16, 2) NOT NULL,
+            edge_count INT NOT NULL,
+            PRIMARY KEY (version, bucket)
+        )
+        """,
+    ]),
+    # 商品名搜索 (/api/products?q=)：FULLTEXT 负责按词 / 词前缀匹配，短词走已有的 idx_products_name 前缀匹配
+    # 影子表用 CREATE TABLE ... LIKE products 创建，会自动带上这个索引
+    (8, "add fulltext index on products(name)", [
+        """
+        ALTER TABLE products ADD FULLTEXT INDEX ft_products_name (name)
+        """,
+    ]),
+    # 增量同步：每个快照版本的内容摘要 + 相对上一个版本的新增 / 删除 / 变化 (见 database/catalog_changes.py)
+    (9, "add snapshot digest and catalog_changes table", [
+        """
+        ALTER TABLE snapshot_versions ADD COLUMN digest CHAR(40) NULL
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            version BIGINT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            kind VARCHAR(8) NOT NULL,
+            old_price DECIMAL(10, 2) NULL,
+            new_price DECIMAL(10, 2) NULL,
+            PRIMARY KEY (version, name)
+        )
+        """,
+    ]),
+    # 快照发布标记：换表到版本号提交之间序号为奇数，API 据此判断读到的数据能不能缓存 (见 database/snapshot_publish.py)
+    (10, "create snapshot_publish table", [
+        """
+        CREATE TABLE IF NOT EXISTS snapshot_publish (
+            id TINYINT PRIMARY KEY,
+            seq BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT IGNORE INTO snapshot_publish (id, seq) VALUES (1, 0)
+        """,
+    ]),
+]
+
+# 多个进程 (API worker / 爬虫 / CI) 同时启动时，用 MySQL 的命名锁保证只有一个在跑迁移
+MIGRATION_LOCK = "saucemall_schema_migration"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def current_version(conn):
+    """查询当前数据库已经迁移到的版本号 (0 表示全新数据库)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+        row = cursor.fetchone()
+    conn.commit()
+    return row['version'] or 0
+
+
+def migrate(conn, target=None):
+    """
+    把数据库结构升级到 target 版本 (默认最新)
+    返回迁移完成后的版本号。
+    """
+    target = target if target is not None else MIGRATIONS[-1][0]
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()['locked']:
+            raise RuntimeError(f"Could not acquire migration lock '{MIGRATION_LOCK}'")
+
+    try:
+        # 拿到锁之后再查版本，别的进程可能刚刚已经迁移完了
+        version = current_version(conn)
+        pending = [m for m in MIGRATIONS if version < m[0] <= target]
+        if not pending:
+            logger.debug(f"Schema is up to date (version {version}).")
+            return version
+
+        for number, description, statements in pending:
+            logger.info(f"正在执行数据库迁移 v{number}: {description}")
+            with conn.cursor() as cursor:
+                # 注意：MySQL 的 DDL 会隐式提交，所以每个版本执行完立刻记录版本号
+                for sql in statements:
+                    cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (number, description)
+                )
+            conn.commit()
+            version = number
+
+        logger.success(f"数据库迁移完成，当前版本 v{version}")
+        return version
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+
+
+if __name__ == "__main__":
+    # 部署时单独执行: python -m database.migrations
+    from database.db_manager import DBManager
+
+    db = DBManager()
+    db.connect()
+    db.migrate()
+    db.close()
@@ -0,0 +1,40 @@
+# ===============================
+# 快照发布标记 (Seqlock)
+# ===============================
+# RENAME TABLE 是 DDL，会自己提交：新的 products 换上线，和 snapshot_versions 里的新版本号没法放进同一个事务。
+# 两者之间有一小段时间，读者查到的还是旧版本号，读到的却已经是新数据；
+# 如果后面的发布步骤失败、旧快照被换回来，这段时间读到的数据根本不属于任何版本。
+# 按旧版本号把它们写进缓存 / 发出 ETag / 发出翻页游标，旧版本的缓存就一直是错的 (直到 TTL 过期)。
+#
+# 面试亮点：用一个序号做"顺序锁" (seqlock)，和 Linux 内核里读多写少的数据结构是同一个思路：
+#   写者：换表之前把序号改成奇数并提交 (发布中)；发布成功时和版本号在同一个事务里改回偶数，
+#         换回旧快照之后也改回偶数。
+#   读者：查询前后各读一次 (序号, 版本号)，两次完全相同且序号是偶数，说明查询期间没有发生过换表，
+#         读到的数据确实属于这个版本，才可以缓存、发 ETag、发游标；否则这次结果只给当前请求用。
+# 只有缓存未命中的请求多两次单行查询，命中缓存的请求不受影响。
+
+
+def begin(cursor):
+    """写者：换表之前调用 (调用方随后提交)，序号变成奇数；上次发布中途崩溃留下的奇数直接跳到下一个奇数"""
+    cursor.execute("UPDATE snapshot_publish SET seq = seq + IF(seq % 2 = 0, 1, 2) WHERE id = 1")
+
+
+def end(cursor):
+    """写者：发布成功 (和版本号同一个事务) 或者旧快照换回来之后调用，序号回到偶数"""
+    cursor.execute("UPDATE snapshot_publish SET seq = seq + 1 WHERE id = 1")
+
+
+def state(cursor):
+    """读者：(发布序号, 当前版本号)；还没有发布标记时序号为 None"""
+    cursor.execute(
+        "SELECT (SELECT seq FROM snapshot_publish WHERE id = 1) AS seq, "
+        "(SELECT MAX(version) FROM snapshot_versions) AS version"
+    )
+    row = cursor.fetchone()
+    return row["seq"], row["version"]
+
+
+def is_stable(before, after):
+    """查询前后的 state() 相同且不在发布中：这次读到的数据属于 before 里的版本"""
+    seq = before[0]
+    return before == after and seq is not None and seq % 2 == 0
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+from pages.async_pages import AsyncProductDetailPage
+from pages.detail_page import ProductDetailPage
+from utils.logger import logger
+
+# ===============================
+# 商品详情并发抓取 (Detail Crawl)
+# ===============================
+# 列表页只有名称和价格，描述、大图地址等信息在每个商品的详情页里。
+# 这里在列表抓取之后再加一个阶段：用有上限的并发 (同一个 Context 里同时开 N 个标签页)
+# 去抓详情页，并且：
+# 1. 去重：同一轮里同一个商品只抓一次；
+# 2. 增量：列表数据 (名称 / 价格 / id) 和上一轮一样、且上一轮已经有详情的商品直接复用，不再打开详情页。
+
+# 详情字段 (会和商品行一起写入 products 表)
+DETAIL_FIELDS = ("item_id", "description", "image_url")
+
+
+class DetailCrawler:
+    """
+    用法:
+        crawler = DetailCrawler(known=db.load_known_details())
+        products = await crawler.crawl(context, products)
+    """
+    def __init__(self, concurrency=None, page_timeout=None, delay=None, known=None, policy=None):
+        # 同时打开的详情页数量上限
+        self.concurrency = concurrency or int(os.getenv('DETAIL_CONCURRENCY', 4))
+        # 单个详情页的超时 (秒)
+        self.page_timeout = page_timeout or float(os.getenv('DETAIL_PAGE_TIMEOUT', 15))
+        # 每个标签页两次请求之间的礼貌间隔 (秒)，避免把目标站点打得太狠
+        self.delay = delay if delay is not None else float(os.getenv('DETAIL_DELAY', 0))
+        # 上一轮的商品数据: name -> {price, item_id, description, image_url}
+        self.known = known or {}
+        self.policy = policy
+
+        self._seen = {}        # 本轮已抓过的 item_id -> 详情字段
+        self.latencies = []    # 每个详情页的耗时 (秒)
+        self.fetched = 0
+        self.reused = 0
+        self.deduped = 0
+        self.failed = 0
+
+    async def crawl(self, context, products, inventory_url=None):
+        """给 products 里的每个商品补上详情字段 (原地修改并返回)"""
+        url_template = ProductDetailPage.for_site(inventory_url) if inventory_url else None
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = {}  # item_id -> 需要这个详情的商品列表
+
+        for product in products:
+            item_id = product.get("item_id")
+            if not item_id:
+                # 逐个 Locator 的兜底路径拿不到 id，没法拼详情页地址
+                continue
+            if self._reuse_previous(product):
+                self.reused += 1
+                continue
+            if item_id in self._seen or item_id in pending:
+                self.deduped += 1
+            pending.setdefault(item_id, []).append(product)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self._fetch(context, semaphore, item_id, targets, url_template)
+            for item_id, targets in pending.items()
+        ))
+        elapsed = time.perf_counter() - start
+        logger.info(f"详情抓取完成 | {self.report()} | 总耗时 {elapsed:.2f}s")
+        return products
+
+    def report(self):
+        """抓取统计 (并发数、复用 / 去重 / 失败数量、单页耗时分布)"""
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            "concurrency": self.concurrency,
+            "fetched": self.fetched,
+            "reused": self.reused,
+            "deduped": self.deduped,
+            "failed": self.failed,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        }
+
+    def _reuse_previous(self, product):
+        """列表数据和上一轮一致、且上一轮已有详情 -> 直接复用上一轮的详情字段"""
+        previous = self.known.get(product["name"])
+        if not previous or not previous.get("description"):
+            return False
+        if previous.get("item_id") != product.get("item_id"):
+            return False
+        if float(previous["price"]) != float(product["price"]):
+            return False
+        for field in DETAIL_FIELDS:
+            product[field] = previous.get(field)
+        return True
+
+    async def _fetch(self, context, semaphore, item_id, targets, url_template):
+        if item_id in self._seen:
+            self._apply(targets, self._seen[item_id])
+            return
+
+        async with semaphore:
+            page = await context.new_page()
+            start = time.perf_counter()
+            try:
+                detail_page = AsyncProductDetailPage(page, self.policy)
+                if url_template:
+                    detail_page.url_template = url_template
+                details = await asyncio.wait_for(detail_page.get_details(item_id), timeout=self.page_timeout)
+                details["item_id"] = item_id
+                self._seen[item_id] = details
+                self._apply(targets, details)
+                self.fetched += 1
+            except Exception as e:
+                # 单个详情页失败不影响其它商品，列表数据照常入库
+                self.failed += 1
+                logger.warning(f"详情页抓取失败 (id={item_id}): {type(e).__name__}: {e}")
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+                await page.close()
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+    @staticmethod
+    def _apply(targets, details):
+        for product in targets:
+            for field in DETAIL_FIELDS:
+                if details.get(field):
+                    product[field] = details[field]
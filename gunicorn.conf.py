@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import tempfile
+
+# ===============================
+# Gunicorn 生产环境配置
+# ===============================
+# 启动: gunicorn -c gunicorn.conf.py wsgi:app
+# 面试亮点：为什么不用 app.run()？
+# Flask 自带的开发服务器只有一个进程，所有请求 (连同日志、JSON 序列化) 共用一把 GIL，
+# 吞吐量被一个 CPU 核卡死。Gunicorn 是 pre-fork 模型：master 进程只负责管理，
+# fork 出多个 worker 进程各自处理请求，每个进程有自己的 GIL，吞吐量随 CPU 核数近似线性增长；
+# 每个 worker 里再开几个线程 (gthread)，等数据库 I/O 时其它线程可以继续干活。
+#
+# 所有参数都可以用环境变量覆盖:
+# API_BIND / API_WORKERS / API_THREADS / API_KEEPALIVE / API_TIMEOUT / API_GRACEFUL_TIMEOUT
+# API_MAX_REQUESTS / API_MAX_REQUESTS_JITTER / API_BACKLOG
+
+bind = os.getenv("API_BIND", "0.0.0.0:5000")
+
+# 进程数默认等于 CPU 核数 (接口主要是查库 + 序列化，线程负责吃掉 I/O 等待)
+workers = int(os.getenv("API_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("API_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# 压测 / 前面有 Nginx 时，Keep-Alive 复用 TCP 连接，省掉每个请求的握手
+keepalive = int(os.getenv("API_KEEPALIVE", 5))
+backlog = int(os.getenv("API_BACKLOG", 2048))
+
+# worker 卡住超过 timeout 秒会被 master 杀掉重启；
+# 收到 SIGTERM 后给正在处理的请求 graceful_timeout 秒收尾 (平滑关闭)
+timeout = int(os.getenv("API_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("API_GRACEFUL_TIMEOUT", 30))
+
+# 每个 worker 处理这么多请求后自动重启 (防内存缓慢泄漏)，加随机抖动避免所有 worker 同时重启；0 表示不重启
+max_requests = int(os.getenv("API_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("API_MAX_REQUESTS_JITTER", 0))
+
+# 先在 master 里导入应用 (表结构迁移只跑一次，worker 共享只读内存页，fork 更快)，再 fork worker。
+# 注意 LOG_ENQUEUE 保持默认的 1：loguru 的后台写日志线程在 master 里，
+# 所有 worker 的日志通过队列交给它统一写文件，不会出现多个进程同时切割同一个日志文件。
+preload_app = True
+
+# 指标是进程内的：各 worker 把自己的指标写到这个目录，/api/metrics 读出来合并 (见 utils/metrics.py)，
+# 否则每次抓取只拿到随机一个 worker 的计数。多个实例跑在同一台机器上时要各配一个目录。
+_metrics_dir = os.environ.setdefault(
+    "METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "saucemall-metrics"))
+
+# 访问日志由应用自己按 LOG_ACCESS_SAMPLE 采样记录，这里不再重复写
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def on_starting(server):
+    # 清掉上一次运行留下的指标文件，计数从 0 开始
+    from utils import metrics
+    metrics.clear_multiproc_dir(_metrics_dir)
+
+
+def post_fork(server, worker):
+    # 连接池已经由 os.register_at_fork 在子进程里重置，这里为新 worker 建自己的连接池
+    from app import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    # 平滑关闭：正在处理的请求已经结束，关闭本进程的空闲连接
+    from app import shutdown_worker
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    # worker 退出 (重启 / 被杀) 后保留它的计数，不再输出它的 Gauge
+    from utils import metrics
+    metrics.mark_process_dead(_metrics_dir, worker.pid)
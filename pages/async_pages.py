@@ -0,0 +1,114 @@
+import os
+import time
+from playwright.async_api import Page
+from pages.login_page import LoginPage
+from pages.inventory_page import InventoryPage
+from pages.base_page import report_navigation, wait_baseline_sample
+from pages.detail_page import ProductDetailPage
+from utils.logger import logger
+
+# ===============================
+# 异步版 Page Object (playwright.async_api)
+# ===============================
+# 给并发抓取引擎 (scrape_engine.py) 使用。
+# 定位符、URL、批量提取脚本、价格清洗全部继承自同步版页面类，页面改版时只需要改一处；
+# 这里只把需要和浏览器交互的方法改写成 async。
+# 注意 MRO：AsyncBasePage 排在同步页面类前面，所以 open() 等方法用的是异步版本。
+
+
+class AsyncBasePage:
+    """
+    异步基础页面类，对应 BasePage
+    注意：这里不要定义 READY_SELECTOR 等类属性，否则会在 MRO 里盖住同步页面类里的定义
+    """
+
+    def __init__(self, page: Page, policy=None):
+        self.page = page
+        self.policy = policy
+
+    async def open(self, url, wait_for=None):
+        """打开 URL 并等待页面可用 (等待策略与 BasePage.open 一致)"""
+        wait_for = wait_for or self.READY_SELECTOR
+        use_selector = wait_for and os.getenv("SCRAPER_WAIT_STRATEGY", "selector") != "networkidle"
+        blocked_before = self.policy.blocked if self.policy else 0
+
+        start = time.perf_counter()
+        if use_selector:
+            await self.page.goto(url, wait_until="domcontentloaded")
+            await self.page.wait_for_selector(wait_for)
+        else:
+            await self.page.goto(url)
+            await self.page.wait_for_load_state("networkidle")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        baseline_ms = None
+        if use_selector and wait_baseline_sample():
+            await self.page.wait_for_load_state("networkidle")
+            baseline_ms = (time.perf_counter() - start) * 1000
+
+        blocked = (self.policy.blocked - blocked_before) if self.policy else 0
+        strategy = f"selector:{wait_for}" if use_selector else "networkidle"
+        report_navigation(url, elapsed_ms, strategy, blocked, baseline_ms)
+        return elapsed_ms
+
+    async def wait_until_ready(self):
+        await self.page.wait_for_selector(self.READY_SELECTOR)
+
+    async def get_text(self, selector):
+        return await self.page.text_content(selector)
+
+
+class AsyncLoginPage(AsyncBasePage, LoginPage):
+    """异步登录页，对应 LoginPage"""
+
+    async def login(self, username, password):
+        await self.open(self.url)
+        await self.page.fill(self.INPUT_USER, username)
+        await self.page.fill(self.INPUT_PASSWORD, password)
+        await self.page.click(self.BUTTON_LOGIN)
+
+
+class AsyncInventoryPage(AsyncBasePage, InventoryPage):
+    """异步商品列表页，对应 InventoryPage"""
+
+    async def open_with_session(self):
+        await self.page.goto(self.url, wait_until="domcontentloaded")
+        await self.page.wait_for_selector(f"{self.ITEM_CARD}, {self.SESSION_EXPIRED_MARKER}")
+        return await self.page.locator(self.ITEM_CARD).count() > 0
+
+    async def get_products(self, batched=True):
+        await self.page.wait_for_selector(self.ITEM_CARD)
+
+        products_list = None
+        if batched:
+            try:
+                products_list = await self._get_products_batched()
+            except Exception as e:
+                logger.warning(f"批量提取失败，改用逐个提取: {e}")
+
+        if products_list is None:
+            products_list = await self._get_products_by_locator()
+        return products_list
+
+    async def _get_products_batched(self):
+        rows = await self.page.locator(self.ITEM_CARD).evaluate_all(self.EXTRACT_SCRIPT, self._extract_selectors())
+        return self._clean_rows(rows)
+
+    async def _get_products_by_locator(self):
+        products_list = []
+        for item in await self.page.locator(self.ITEM_CARD).all():
+            name = await item.locator(self.ITEM_NAMES).inner_text()
+            price_text = await item.locator(self.ITEM_PRICES).inner_text()
+            products_list.append({
+                "name": name,
+                "price": self._parse_price(price_text)
+            })
+        return products_list
+
+
+class AsyncProductDetailPage(AsyncBasePage, ProductDetailPage):
+    """异步商品详情页，对应 ProductDetailPage"""
+
+    async def get_details(self, item_id):
+        await self.open(self.url_for(item_id))
+        return await self.page.evaluate(self.EXTRACT_SCRIPT, self._extract_selectors())
@@ -1,4 +1,129 @@
+import os
+import time
+from fnmatch import fnmatch
+from urllib.parse import urljoin, urlparse
 from playwright.sync_api import Page
+from utils.logger import Sampler, logger
+
+
+def site_url(path, default):
+    """
+    页面地址：设置了 SAUCEDEMO_BASE_URL (例如 benchmarks/standin_site.py 起的本地替身站点) 时
+    拼在它后面，否则用线上 SauceDemo 的地址
+    """
+    base = os.getenv("SAUCEDEMO_BASE_URL")
+    return urljoin(base.rstrip("/") + "/", path) if base else default
+
+
+# 等待策略省了多少时间：抽样一部分导航，在页面可用之后再接着等到 networkidle，
+# 两者之差就是这次导航省下的时间 (只有被抽中的导航多付这一段等待，默认 5%，设为 0 关闭)
+wait_baseline_sample = Sampler(float(os.getenv("SCRAPER_WAIT_BASELINE_SAMPLE", 0.05)))
+
+
+def report_navigation(url, elapsed_ms, strategy, blocked, baseline_ms=None):
+    """每次导航的日志：耗时 / 等待策略 / 拦截数量，抽样测到基线时再加上省下的时间"""
+    saved = f" | 比 networkidle 省 {baseline_ms - elapsed_ms:.0f} ms" if baseline_ms is not None else ""
+    logger.info("页面加载完成 {} | 耗时 {:.0f} ms | 等待策略 {} | 拦截请求 {} 个{}",
+                url, elapsed_ms, strategy, blocked, saved)
+
+
+class RequestPolicy:
+    """
+    请求拦截策略 (Request Interception)
+    职责：在浏览器发请求之前决定放行还是拦截。
+    爬虫只读 DOM 里的文字，图片 / 视频 / 字体 / 第三方统计脚本全是白白下载，
+    拦掉之后页面更快加载完，也省带宽。
+    可以挂在 Page 上，也可以挂在 BrowserContext 上 (对该上下文里所有页面生效)。
+    """
+    # 默认拦截的资源类型 (Playwright 的 request.resource_type)
+    DEFAULT_BLOCKED_TYPES = ("image", "media", "font")
+    # 默认拦截的第三方统计 / 埋点域名
+    DEFAULT_BLOCKED_DOMAINS = (
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "facebook.net",
+        "hotjar.com",
+        "segment.io",
+        "backtrace.io",
+    )
+
+    def __init__(self, blocked_types=DEFAULT_BLOCKED_TYPES, blocked_domains=DEFAULT_BLOCKED_DOMAINS,
+                 allow_patterns=()):
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = tuple(blocked_domains)
+        # 白名单 (URL 通配符，例如 "*/static/js/*")，优先级高于黑名单
+        self.allow_patterns = tuple(allow_patterns)
+        self.blocked = 0
+        self.allowed = 0
+        # 放行的请求收到的响应字节数 (按 Content-Length 估算，抓取台账里记录带宽开销)
+        self.bytes_received = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        从环境变量读取配置 (逗号分隔):
+        SCRAPER_BLOCK_TYPES / SCRAPER_BLOCK_DOMAINS / SCRAPER_ALLOW_URLS
+        SCRAPER_BLOCK_TYPES 设为空字符串即可关闭按类型拦截
+        """
+        def _split(name, default):
+            value = os.getenv(name)
+            if value is None:
+                return default
+            return tuple(item.strip() for item in value.split(",") if item.strip())
+
+        return cls(
+            blocked_types=_split("SCRAPER_BLOCK_TYPES", cls.DEFAULT_BLOCKED_TYPES),
+            blocked_domains=_split("SCRAPER_BLOCK_DOMAINS", cls.DEFAULT_BLOCKED_DOMAINS),
+            allow_patterns=_split("SCRAPER_ALLOW_URLS", ()),
+        )
+
+    def should_block(self, url, resource_type):
+        """判断一个请求要不要拦截 (纯函数，同步 / 异步两套 API 共用)"""
+        if any(fnmatch(url, pattern) for pattern in self.allow_patterns):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    def apply(self, target):
+        """把拦截策略挂到 Page 或 BrowserContext 上"""
+        target.route("**/*", self._handle)
+        target.on("response", self._count_bytes)
+        return self
+
+    async def apply_async(self, target):
+        """异步 API 版本的 apply() (playwright.async_api 的 Page / BrowserContext)"""
+        await target.route("**/*", self._handle_async)
+        target.on("response", self._count_bytes)
+        return self
+
+    def _count_bytes(self, response):
+        # 只读已经到手的响应头，不再和浏览器多一次往返；分块传输 (没有 Content-Length) 的响应记 0
+        try:
+            self.bytes_received += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def _handle(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked += 1
+            route.abort()
+        else:
+            self.allowed += 1
+            route.continue_()
+
+    async def _handle_async(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked += 1
+            await route.abort()
+        else:
+            self.allowed += 1
+            await route.continue_()
+
 
 class BasePage:
     """
@@ -6,19 +131,55 @@ class BasePage:
     职责：存放所有页面共用的方法和属性。
     所有具体的 Page Object (如 LoginPage) 都继承自这个类。
     """
-    def __init__(self, page: Page):
+    # 子类声明"页面可用"的标志元素，open() 只等它出现，不再等整个网络空闲
+    READY_SELECTOR = None
+
+    def __init__(self, page: Page, policy=None):
         # 接收一个 playwright helper对象，供所有子类使用
         self.page = page
+        # 请求拦截策略 (可选)，只用来统计每次导航拦掉了多少请求
+        self.policy = policy
 
-    def open(self, url):
+    def open(self, url, wait_for=None):
         """
-        通用方法：打开指定 URL 并等待网络空闲。
-        这比单纯的 page.goto(url) 更稳健，因为它会等待页面上的网络请求（如 AJAX）稍微消停一会。
+        通用方法：打开指定 URL 并等待页面可用。
+        默认等待策略：先等 DOMContentLoaded，再等页面对象需要的元素 (READY_SELECTOR) 出现。
+        "networkidle" 要求至少 500ms 内没有新的网络连接，哪怕需要的元素早就渲染好了也要干等；
+        等具体元素则是"元素一出现就继续"。
+        没有声明 READY_SELECTOR，或者设置了 SCRAPER_WAIT_STRATEGY=networkidle 时，仍然等网络空闲。
+        按 SCRAPER_WAIT_BASELINE_SAMPLE 抽样的导航会再等到网络空闲，日志里报告这次省下的毫秒数。
+        返回值是页面可用的耗时 (不含抽样基线那段等待)。
         """
-        self.page.goto(url)
-        # "networkidle": 至少 500ms 内没有新的网络连接
-        self.page.wait_for_load_state("networkidle")
+        wait_for = wait_for or self.READY_SELECTOR
+        use_selector = wait_for and os.getenv("SCRAPER_WAIT_STRATEGY", "selector") != "networkidle"
+        blocked_before = self.policy.blocked if self.policy else 0
+
+        start = time.perf_counter()
+        if use_selector:
+            self.page.goto(url, wait_until="domcontentloaded")
+            self.page.wait_for_selector(wait_for)
+        else:
+            self.page.goto(url)
+            # "networkidle": 至少 500ms 内没有新的网络连接
+            self.page.wait_for_load_state("networkidle")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # 抽样测基线：页面已经可用，再等到 networkidle，看 selector 策略实际省了多少
+        baseline_ms = None
+        if use_selector and wait_baseline_sample():
+            self.page.wait_for_load_state("networkidle")
+            baseline_ms = (time.perf_counter() - start) * 1000
+
+        # 每次导航都报告耗时和拦截数量，方便对比两种等待策略省了多少时间
+        blocked = (self.policy.blocked - blocked_before) if self.policy else 0
+        strategy = f"selector:{wait_for}" if use_selector else "networkidle"
+        report_navigation(url, elapsed_ms, strategy, blocked, baseline_ms)
+        return elapsed_ms
+
+    def wait_until_ready(self):
+        """等待页面对象的标志元素出现 (例如点击登录后等商品列表渲染出来)"""
+        self.page.wait_for_selector(self.READY_SELECTOR)
 
     def get_text(self, selector):
         """通用方法：获取元素的文本"""
-        return self.page.text_content(selector)
\ No newline at end of file
+        return self.page.text_content(selector)
@@ -0,0 +1,58 @@
+from urllib.parse import urljoin
+from pages.base_page import BasePage, site_url
+
+class ProductDetailPage(BasePage):
+    """
+    商品详情页模型 (Page Object)
+    职责：封装详情页 (inventory-item.html?id=N) 的定位符和字段提取。
+    """
+    # 详情页地址模板，id 来自列表页卡片链接 (item_4_title_link -> 4)
+    url_template = site_url("inventory-item.html?id={item_id}",
+                            "https://www.saucedemo.com/inventory-item.html?id={item_id}")
+
+    # ===============================
+    # 1. 元素定位符 (UI Map)
+    # ===============================
+    DETAIL_NAME = ".inventory_details_name"
+    DETAIL_DESC = ".inventory_details_desc"
+    DETAIL_PRICE = ".inventory_details_price"
+    DETAIL_IMAGE = "img.inventory_details_img"
+    READY_SELECTOR = DETAIL_NAME
+
+    # 一次 evaluate 读出详情页的全部字段 (和列表页一样，避免多次 IPC 往返)
+    EXTRACT_SCRIPT = """
+    (sel) => {
+        const text = (s) => {
+            const el = document.querySelector(s);
+            return el ? el.innerText.trim() : null;
+        };
+        const img = document.querySelector(sel.image);
+        return {
+            name: text(sel.name),
+            description: text(sel.description),
+            price: text(sel.price),
+            image_url: img ? img.src : null,
+        };
+    }
+    """
+
+    def url_for(self, item_id):
+        return self.url_template.format(item_id=item_id)
+
+    def get_details(self, item_id):
+        """打开某个商品的详情页并提取字段"""
+        self.open(self.url_for(item_id))
+        return self.page.evaluate(self.EXTRACT_SCRIPT, self._extract_selectors())
+
+    def _extract_selectors(self):
+        return {
+            "name": self.DETAIL_NAME,
+            "description": self.DETAIL_DESC,
+            "price": self.DETAIL_PRICE,
+            "image": self.DETAIL_IMAGE,
+        }
+
+    @staticmethod
+    def for_site(inventory_url):
+        """同一站点下详情页的地址模板 (多站点监控时，详情页跟着列表页的域名走)"""
+        return urljoin(inventory_url, "inventory-item.html?id={item_id}")
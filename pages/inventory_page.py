@@ -1,6 +1,10 @@
-from pages.base_page import BasePage
+import os
+from pages.base_page import BasePage, site_url
 
 class InventoryPage(BasePage):
+    # 商品列表页地址 (带着有效的登录会话可以直接打开)
+    url = site_url("inventory.html", "https://www.saucedemo.com/inventory.html")
+
     # ===============================
     # 1. 页面元素定位符 (Locators)
     # ===============================
@@ -10,17 +14,71 @@ class InventoryPage(BasePage):
     ITEM_NAMES = ".inventory_item_name"
     # CSS 选择器：在卡片内部找到商品价格
     ITEM_PRICES = ".inventory_item_price"
+    # CSS 选择器：卡片内的描述、图片、标题链接 (链接 id 形如 item_4_title_link，带商品 id)
+    ITEM_DESCS = ".inventory_item_desc"
+    ITEM_IMAGES = ".inventory_item_img img"
+    ITEM_LINKS = "a[id$='_title_link']"
+    # 商品卡片出现，列表页就可以抓取了
+    READY_SELECTOR = ITEM_CARD
+    # 未登录访问列表页时 SauceDemo 会跳回登录页，看到登录按钮就说明会话失效了
+    SESSION_EXPIRED_MARKER = "#login-button"
+    # 流式抓取时每段提取多少张卡片 (一段 = 一次浏览器往返)
+    STREAM_CHUNK_SIZE = int(os.getenv('SCRAPER_STREAM_CHUNK', 200))
+
+    # ===============================
+    # 批量提取脚本 (在浏览器里执行)
+    # ===============================
+    # 一次 evaluate 把所有卡片的字段都读出来，返回结构化的数组
+    # sel.start / sel.end 可选：只提取这一段卡片 (流式抓取时按段提取)
+    EXTRACT_SCRIPT = """
+    (cards, sel) => cards.slice(sel.start || 0, sel.end == null ? cards.length : sel.end).map(card => {
+        const text = (s) => {
+            const el = card.querySelector(s);
+            return el ? el.innerText.trim() : null;
+        };
+        const link = card.querySelector(sel.link);
+        const match = link && link.id ? link.id.match(/^item_(\\d+)_/) : null;
+        const img = card.querySelector(sel.image);
+        return {
+            name: text(sel.name),
+            price: text(sel.price),
+            description: text(sel.description),
+            item_id: match ? match[1] : null,
+            image_url: img ? img.src : null,
+        };
+    })
+    """
+
+    def open_with_session(self):
+        """
+        带着缓存的登录会话直接打开商品列表页
+        返回 True 表示会话有效；被重定向回登录页 (会话过期) 返回 False
+        """
+        self.page.goto(self.url, wait_until="domcontentloaded")
+        # 商品卡片和登录按钮谁先出现，就说明落在了哪个页面
+        self.page.wait_for_selector(f"{self.ITEM_CARD}, {self.SESSION_EXPIRED_MARKER}")
+        return self.page.locator(self.ITEM_CARD).count() > 0
 
-    def get_products(self):
+    def get_products(self, batched=True):
         """
-        核心抓取方法：
+        核心抓取方法 (一次性返回完整列表)：
         1. 等待元素加载
         2. 找到所有商品
-        3. 循环提取数据
+        3. 提取数据 (默认批量模式，一次往返拿到全部字段)
         4. 数据清洗
         """
         print("抓取商品数据...")
+        products_list = list(self.iter_products(batched=batched, chunk_size=0))
+        print(f"共抓取到 {len(products_list)} 个商品")
+        return products_list
 
+    def iter_products(self, batched=True, chunk_size=None):
+        """
+        流式抓取：逐个 yield 商品 (生成器)
+        面试亮点：生成器让调用方可以"边抓边写库"，抓取和数据库 I/O 重叠起来，
+        内存里也不用攒着整份商品列表。批量模式下按段提取，每段一次浏览器往返；
+        chunk_size=0 表示不分段 (一次提取全部)。
+        """
         # ===============================
         # 2. 智能等待 (Auto-waiting)
         # ===============================
@@ -28,6 +86,69 @@ class InventoryPage(BasePage):
         # Playwright 会自动等待，但显式调用 wait_for_selector 更稳健。
         self.page.wait_for_selector(self.ITEM_CARD)
 
+        yielded = 0
+        if batched:
+            chunk_size = self.STREAM_CHUNK_SIZE if chunk_size is None else chunk_size
+            try:
+                for product in self._iter_products_batched(chunk_size):
+                    yield product
+                    yielded += 1
+                return
+            except Exception as e:
+                # 页面结构变了 (字段缺失 / 价格格式变化) 时，退回到逐个 Locator 的慢路径
+                # 已经 yield 出去的商品不再重复产出，从下一张卡片接着抓
+                print(f"批量提取失败，改用逐个提取: {e}")
+
+        yield from self._get_products_by_locator(start=yielded)
+
+    def _iter_products_batched(self, chunk_size):
+        """按段批量提取，每段校验清洗后再 yield"""
+        if not chunk_size:
+            yield from self._get_products_batched()
+            return
+        cards = self.page.locator(self.ITEM_CARD)
+        total = cards.count()
+        for start in range(0, total, chunk_size):
+            selectors = dict(self._extract_selectors(), start=start, end=start + chunk_size)
+            yield from self._clean_rows(cards.evaluate_all(self.EXTRACT_SCRIPT, selectors))
+
+    def _get_products_batched(self):
+        """
+        批量提取 (快路径)
+        面试亮点：为什么快？
+        逐个 inner_text() 时，每调用一次就是一次 Python <-> 浏览器的 IPC 往返 (还带自动等待)，
+        N 个商品 = 2N 次往返；批量模式把遍历放到浏览器里做，不管多少商品都只有 1 次往返。
+        """
+        rows = self.page.locator(self.ITEM_CARD).evaluate_all(self.EXTRACT_SCRIPT, self._extract_selectors())
+        return self._clean_rows(rows)
+
+    def _extract_selectors(self):
+        """传给批量提取脚本的选择器参数"""
+        return {
+            "name": self.ITEM_NAMES,
+            "price": self.ITEM_PRICES,
+            "description": self.ITEM_DESCS,
+            "image": self.ITEM_IMAGES,
+            "link": self.ITEM_LINKS,
+        }
+
+    def _clean_rows(self, rows):
+        """校验并清洗批量提取脚本返回的原始行"""
+        products_list = []
+        for row in rows:
+            if not row["name"] or not row["price"]:
+                raise ValueError(f"商品卡片缺少名称或价格: {row}")
+            products_list.append({
+                "name": row["name"],
+                "price": self._parse_price(row["price"]),
+                "description": row["description"],
+                "item_id": row["item_id"],
+                "image_url": row["image_url"],
+            })
+        return products_list
+
+    def _get_products_by_locator(self, start=0):
+        """逐个 Locator 提取 (慢路径，作为批量模式的兜底)；start 表示跳过前面已经提取过的卡片"""
         # ===============================
         # 3. 获取元素列表
         # ===============================
@@ -39,24 +160,24 @@ class InventoryPage(BasePage):
         # ===============================
         # 4. 遍历与数据提取
         # ===============================
-        for item in items:
+        for item in items[start:]:
             # 在当前卡片(item)的范围内查找名称和价格
             # inner_text() 会获取元素内的可见文本
             name = item.locator(self.ITEM_NAMES).inner_text()
             price_text = item.locator(self.ITEM_PRICES).inner_text()
-            
-            # ===============================
-            # 5. 数据清洗 (Data Cleaning)
-            # ===============================
-            # 原始价格可能是 "$29.99"，数据库存的是数字。
-            # 需要去掉 "$" 符号并转为浮点数。
-            price = float(price_text.replace("$", ""))
 
             # 组装成字典
             products_list.append({
                 "name": name,
-                "price": price
+                "price": self._parse_price(price_text)
             })
+        return products_list
 
-        print(f"共抓取到 {len(products_list)} 个商品")
-        return products_list
\ No newline at end of file
+    @staticmethod
+    def _parse_price(price_text):
+        # ===============================
+        # 5. 数据清洗 (Data Cleaning)
+        # ===============================
+        # 原始价格可能是 "$29.99"，数据库存的是数字。
+        # 需要去掉 "$" 符号并转为浮点数。
+        return float(price_text.replace("$", "").strip())
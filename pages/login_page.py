@@ -1,11 +1,11 @@
-from pages.base_page import BasePage
+from pages.base_page import BasePage, site_url
 
 class LoginPage(BasePage):
     """
     登录页面模型 (Page Object)
     职责：封装所有与登录页相关的定位符和操作。
     """
-    url = "https://saucedemo.com/"
+    url = site_url("", "https://saucedemo.com/")
 
     # ===============================
     # 1. 元素定位符 (UI Map)
@@ -14,6 +14,8 @@ class LoginPage(BasePage):
     INPUT_USER = "#user-name"
     INPUT_PASSWORD = "#password"
     BUTTON_LOGIN = "#login-button"
+    # 用户名输入框出现，登录页就可以操作了
+    READY_SELECTOR = INPUT_USER
 
     def login(self, username, password):
         """
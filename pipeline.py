@@ -0,0 +1,201 @@
+import os
+import queue
+import threading
+import time
+from database.db_manager import DBManager, SnapshotWriter
+from utils.logger import logger
+
+# ===============================
+# 流式入库管道 (Scrape -> DB Pipeline)
+# ===============================
+# 之前的流程是"先抓完 -> 关浏览器 -> 再连数据库 -> 一次性写入"：抓取和数据库 I/O 完全串行，
+# 内存里还要攒着整份商品列表。
+# 这里改成经典的生产者 / 消费者模型：
+#   生产者 (抓取线程)：页面对象的生成器每产出一个商品就 put() 进有界队列；
+#   消费者 (写库线程)：攒够 batch_size 条或者距上次写入超过 flush_interval 秒就写一批到影子表。
+# 队列是有界的：数据库慢的时候队列会被塞满，put() 阻塞，抓取自动放慢 (背压 Backpressure)，
+# 内存占用有上限。最终仍然是一次 RENAME TABLE 原子交换，读者不会看到半份快照。
+
+# 队列里的控制信号
+_FINISH = object()
+_ABORT = object()
+
+
+class PipelineError(Exception):
+    """写库线程出错 (抓取线程 put() / finish() 时抛出)"""
+
+
+class SnapshotPipeline:
+    """
+    用法:
+        with SnapshotPipeline(run_id=run_id) as pipeline:
+            for product in inventory_page.iter_products():
+                pipeline.put(product)
+        version = pipeline.version
+    with 块正常结束 -> 提交快照；块内抛异常 -> 放弃本次写入 (线上数据不变)。
+    """
+    def __init__(self, db=None, run_id=None, batch_size=None, flush_interval=None, queue_size=None):
+        # 传入 db 时复用调用方的连接 (关闭由调用方负责)，否则管道自己建一个，用完关闭
+        self._owns_db = db is None
+        self.db = db or DBManager()
+        self.run_id = run_id
+        # 每攒多少条写一批
+        self.batch_size = batch_size or int(os.getenv('PIPELINE_BATCH_SIZE', 500))
+        # 最多攒多少秒就写一批 (抓取很慢时也能及时把数据推进影子表)
+        self.flush_interval = flush_interval or float(os.getenv('PIPELINE_FLUSH_INTERVAL', 1.0))
+        # 队列容量：写库跟不上时，抓取最多领先这么多条
+        self._queue = queue.Queue(maxsize=queue_size or int(os.getenv('PIPELINE_QUEUE_SIZE', 2000)))
+        self._thread = None
+        self._error = None
+        self._closed = False
+        self.version = None
+
+        # 运行统计
+        self.produced = 0
+        self.written = 0
+        self.batches = 0
+        self.backpressure_waits = 0    # put() 因为队列满而等待的次数
+        self.backpressure_seconds = 0.0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.abort()
+        return False
+
+    def start(self):
+        """启动写库线程 (连接数据库、建影子表和浏览器启动 / 登录并行进行)"""
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, product):
+        """生产者：放入一个商品；队列满时阻塞 (背压)，写库线程已出错时抛 PipelineError"""
+        self._check()
+        try:
+            self._queue.put_nowait(product)
+        except queue.Full:
+            self.backpressure_waits += 1
+            start = time.perf_counter()
+            # 分段等待，写库线程中途挂掉时不会永远卡住
+            while True:
+                try:
+                    self._queue.put(product, timeout=0.5)
+                    break
+                except queue.Full:
+                    self._check()
+            self.backpressure_seconds += time.perf_counter() - start
+        self.produced += 1
+
+    def feed(self, products):
+        """把一个可迭代对象 (生成器) 里的商品全部放进管道，返回放入条数"""
+        count = 0
+        for product in products:
+            self.put(product)
+            count += 1
+        return count
+
+    def finish(self):
+        """抓取结束：写完剩余数据并原子交换快照，返回新版本号 (没有数据时返回 None)"""
+        self._close(_FINISH)
+        if self._error is not None:
+            raise PipelineError(f"快照写入失败: {self._error}") from self._error
+        return self.version
+
+    def abort(self):
+        """抓取失败：放弃本次写入，线上数据保持不变"""
+        self._close(_ABORT)
+
+    def stats(self):
+        return {
+            "produced": self.produced,
+            "written": self.written,
+            "batches": self.batches,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_ms": round(self.backpressure_seconds * 1000, 1),
+        }
+
+    def _check(self):
+        if self._error is not None:
+            raise PipelineError(f"快照写入失败: {self._error}") from self._error
+        if self._closed:
+            raise PipelineError("管道已关闭")
+
+    def _close(self, signal):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        # 写库线程已经退出的话队列可能是满的，不再投递信号
+        while self._thread.is_alive():
+            try:
+                self._queue.put(signal, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self._owns_db:
+            self.db.close()
+        logger.info(f"流式入库管道已关闭 | {self.stats()}")
+
+    # ===============================
+    # 消费者 (写库线程)
+    # ===============================
+    def _run(self):
+        writer = SnapshotWriter(self.db, run_id=self.run_id, chunk_size=self.batch_size)
+        batch = []
+        try:
+            if self._owns_db:
+                # 确保表结构是最新版本 (已是最新时只有一次查询)
+                self.db.migrate()
+            writer.begin()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is _ABORT:
+                    writer.abort()
+                    logger.warning(f"抓取失败，放弃本次快照写入 (已写入影子表 {self.written} 条)")
+                    return
+                if item is _FINISH:
+                    self._flush(writer, batch)
+                    if writer.count == 0:
+                        writer.abort()
+                        logger.warning("未抓取到任何商品数据，跳过快照交换。")
+                    else:
+                        self.version = writer.commit()
+                    return
+                if item is not None:
+                    batch.append(item)
+
+                # 攒够一批，或者到了刷新时间，就写一批
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self._flush(writer, batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+        except BaseException as e:
+            # connect() 重试失败会抛 DatabaseUnavailableError，连同其它异常一起交给抓取线程处理
+            self._error = e
+            writer.abort()
+            logger.error(f"写库线程出错: {type(e).__name__}: {e}")
+            # 把队列里剩下的数据清掉，让阻塞中的 put() 尽快醒来看到错误
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _flush(self, writer, batch):
+        if not batch:
+            return
+        writer.write(batch)
+        self.written += len(batch)
+        self.batches += 1
@@ -0,0 +1,174 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from database.db_manager import DBManager
+from utils.logger import logger
+from utils import metrics
+
+# ===============================
+# 抓取台账 (Scrape Run Ledger)
+# ===============================
+# /api/metrics 只能看"现在"，日志文件 10 天就轮转掉了，而且是自由文本不好统计。
+# 这里每次抓取落一行 scrape_runs：开始 / 结束时间、各阶段耗时、商品数、请求数、流量、
+# 成功还是失败 (附错误信息)、产出的快照版本号。
+# 面试亮点：有了这张表就能回答"SauceDemo 最近是不是变慢了""上周那次改动有没有让登录变慢"，
+# /api/runs 直接给出最近 N 次的 p50 / p90 / p95 / p99。
+
+# 抓取结果
+SUCCESS = "success"
+SCRAPE_FAILED = "scrape_failed"
+SAVE_FAILED = "save_failed"
+CRASHED = "crashed"
+
+# 抓取相关的指标只在这里声明一次，scraper.py / scrape_daemon.py / scrape_engine.py 都从这里导入
+# 台账和 /api/metrics 用的是同一个阶段耗时指标
+SCRAPE_PHASE_SECONDS = metrics.histogram(
+    "saucemall_scrape_phase_seconds", "Duration of scrape phases", ["phase"])
+# 抓取运行结果 (按 status 计数) 和最近一次成功发布快照的时间
+SCRAPE_RUNS = metrics.counter("saucemall_scrape_runs_total", "Scrape runs by outcome", ["status"])
+LAST_SUCCESSFUL_SCRAPE = metrics.gauge(
+    "saucemall_last_successful_scrape_timestamp_seconds", "Unix time of the last published snapshot")
+
+# 汇总时计算的分位数
+PERCENTILES = (50, 90, 95, 99)
+
+
+class ScrapeRun:
+    """
+    一次抓取的台账记录
+    用法:
+        run = ScrapeRun(run_id, source="scraper", username="standard_user")
+        with run.phase("login"):
+            ...
+        run.finish(SUCCESS, item_count=6, snapshot_version=42)
+        record_run(run)
+    """
+    def __init__(self, run_id, source, username=None):
+        self.run_id = run_id
+        self.source = source
+        self.username = username
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self._start = time.perf_counter()
+        self.duration = None
+        # 阶段名 -> 秒 (同名阶段进入多次时累加)
+        self.phases = {}
+        self.status = None
+        self.error = None
+        self.item_count = 0
+        self.request_count = 0
+        self.bytes_transferred = 0
+        self.snapshot_version = None
+
+    @contextmanager
+    def phase(self, name):
+        """给一个阶段计时：同时记进台账和 saucemall_scrape_phase_seconds 直方图"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            SCRAPE_PHASE_SECONDS.observe(elapsed, phase=name)
+
+    def finish(self, status, error=None, **fields):
+        """标记结束；fields 可以顺便填 item_count / request_count / bytes_transferred / snapshot_version"""
+        for key, value in fields.items():
+            if not hasattr(self, key):
+                raise AttributeError(f"ScrapeRun has no field {key!r}")
+            setattr(self, key, value)
+        self.status = status
+        self.error = str(error)[:2000] if error else None
+        self.finished_at = datetime.now()
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def timings(self):
+        return {name: round(seconds, 3) for name, seconds in self.phases.items()}
+
+    def to_row(self):
+        """scrape_runs 表的一行 (列名 -> 值)"""
+        if self.finished_at is None:
+            raise RuntimeError("ScrapeRun.finish() must be called before to_row()")
+        return {
+            "run_id": self.run_id,
+            "source": self.source,
+            "username": self.username,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_ms": int(self.duration * 1000),
+            "phases": json.dumps(self.timings()),
+            "item_count": self.item_count,
+            "request_count": self.request_count,
+            "bytes_transferred": self.bytes_transferred,
+            "snapshot_version": self.snapshot_version,
+        }
+
+
+def record_run(run, db=None):
+    """
+    把台账写进数据库
+    台账只是旁路记录：写失败只打日志，绝不影响抓取本身的结果。
+    传入 db 时复用调用方的连接，否则临时建一条连接 (不走 connect() 的 5 次重试，连不上就算了)。
+    """
+    owns_db = db is None
+    try:
+        if owns_db:
+            db = DBManager()
+            db.conn = db.create_connection()
+        db.record_run(run.to_row())
+        logger.info(
+            f"抓取台账已记录 (run_id={run.run_id}, status={run.status}, "
+            f"{run.duration:.2f}s, {run.item_count} 件, {run.bytes_transferred} bytes)"
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"抓取台账写入失败 (run_id={run.run_id}): {e}")
+        return False
+    finally:
+        if owns_db and db is not None and db.conn:
+            db.close()
+
+
+def percentile(sorted_values, pct):
+    """最近秩 (nearest-rank) 分位数，sorted_values 必须已经升序排好"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))  # ceil(pct / 100 * n)
+    return sorted_values[int(rank) - 1]
+
+
+def _distribution(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    summary = {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+    summary["max"] = values[-1]
+    summary["mean"] = round(sum(values) / len(values), 3)
+    summary["count"] = len(values)
+    return summary
+
+
+def summarize(runs):
+    """
+    对一批台账 (scrape_runs 的行，phases 已经解析成字典) 算分位数汇总
+    MySQL 5.7 没有窗口函数 / PERCENTILE_CONT，而且一次最多汇总几百行，在 Python 里排序就够了
+    """
+    total = len(runs)
+    succeeded = [r for r in runs if r["status"] == SUCCESS]
+    phase_names = sorted({name for r in runs for name in r["phases"]})
+    return {
+        "runs": total,
+        "success_rate": round(len(succeeded) / total, 4) if total else None,
+        "status_counts": {s: sum(1 for r in runs if r["status"] == s) for s in sorted({r["status"] for r in runs})},
+        # 耗时 / 商品数 / 流量只看成功的抓取，失败的抓取往往提前退出，会把分位数拉低
+        "duration_seconds": _distribution([r["duration_ms"] / 1000 for r in succeeded]),
+        "phases_seconds": {
+            name: _distribution([r["phases"].get(name) for r in succeeded]) for name in phase_names
+        },
+        "item_count": _distribution([r["item_count"] for r in succeeded]),
+        "bytes_transferred": _distribution([r["bytes_transferred"] for r in succeeded]),
+    }
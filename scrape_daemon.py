@@ -0,0 +1,282 @@
+import asyncio
+import os
+import random
+import signal
+import uuid
+from scrape_engine import ScrapeEngine, jobs_from_env, persist_results
+from database.db_manager import DBManager
+from change_detector import diff_snapshots, load_previous_snapshot
+from utils.notification import NotificationDispatcher
+from run_ledger import ScrapeRun, record_run, SUCCESS, SCRAPE_FAILED, SAVE_FAILED, CRASHED
+from run_ledger import SCRAPE_RUNS, LAST_SUCCESSFUL_SCRAPE
+from utils.logger import logger
+from utils import metrics
+
+try:
+    # 可选依赖：有 psutil 时用它统计浏览器进程内存，没有就读 /proc
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+# ===============================
+# 常驻抓取守护进程 (Scrape Daemon)
+# ===============================
+# 之前每次抓取都是一个新的 Python 进程 (python scraper.py / CI 定时任务)：
+# 启动 Playwright + 启动 Chromium + 登录 + 建数据库连接，每次都要付一遍。
+# 守护进程模式下这些都只做一次：浏览器、已登录的 Context、数据库连接一直保持"热"的，
+# 每个周期只剩下"刷新商品页 -> 提取 -> 入库"，高频监控时单周期可以做到亚秒级。
+#
+# 启动: python scrape_daemon.py
+# 停止: kill -TERM <pid> (会等当前周期跑完再退出)
+# 指标: 设置 DAEMON_METRICS_PORT 后，http://<host>:<port>/ 输出 Prometheus 文本格式的指标
+# 每个周期另外记一笔抓取台账 (scrape_runs，source="daemon")
+
+
+def _process_tree_rss_mb():
+    """当前进程所有子孙进程 (Playwright driver + Chromium) 的常驻内存总和 (MB)，统计不了返回 None"""
+    if psutil is not None:
+        children = psutil.Process().children(recursive=True)
+        total = 0
+        for child in children:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 1024 / 1024
+
+    # 没装 psutil：Linux 下直接读 /proc
+    try:
+        parents = {}
+        rss = {}
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("PPid:"):
+                            parents[int(pid)] = int(line.split()[1])
+                        elif line.startswith("VmRSS:"):
+                            rss[int(pid)] = int(line.split()[1])  # kB
+            except OSError:
+                continue
+    except OSError:
+        return None
+
+    me = os.getpid()
+    total = 0
+    for pid in rss:
+        ancestor = parents.get(pid)
+        while ancestor and ancestor != me:
+            ancestor = parents.get(ancestor)
+        if ancestor == me:
+            total += rss[pid]
+    return total / 1024
+
+
+class ScrapeDaemon:
+    """
+    按固定间隔 (带随机抖动) 循环执行抓取周期
+    - 上一个周期还没跑完时，本次触发直接跳过，不会叠加执行；
+    - 跑满 N 个周期或浏览器内存超过阈值时，重启浏览器 (防止 Chromium 长时间运行内存泄漏)；
+    - 收到 SIGTERM / SIGINT 后不再触发新周期，等当前周期跑完再优雅退出。
+    """
+    def __init__(self, interval=None, jitter=None, recycle_cycles=None, recycle_rss_mb=None):
+        # 两次抓取之间的间隔 (秒)
+        self.interval = interval or float(os.getenv('DAEMON_INTERVAL', 60))
+        # 抖动比例：实际间隔在 interval * (1 ± jitter) 之间，避免多个实例总在同一时刻打目标站点
+        self.jitter = jitter if jitter is not None else float(os.getenv('DAEMON_JITTER', 0.1))
+        # 每跑多少个周期重启一次浏览器
+        self.recycle_cycles = recycle_cycles or int(os.getenv('DAEMON_RECYCLE_CYCLES', 200))
+        # 浏览器进程树内存超过多少 MB 时重启
+        self.recycle_rss_mb = recycle_rss_mb or float(os.getenv('DAEMON_RECYCLE_RSS_MB', 1024))
+
+        self.engine = None
+        self.db = None
+        # 上一轮快照的商品数据 (详情增量抓取用)，跨浏览器重启保留
+        self.known_details = {}
+        # 变动通知只入队不等待发送，webhook 再慢也不会拖住抓取周期
+        self.dispatcher = NotificationDispatcher()
+        self._stop = None
+        self._current = None
+        self._engine_cycles = 0
+
+        # 运行统计
+        self.cycles = 0
+        self.failures = 0
+        self.skipped = 0
+        self.recycles = 0
+
+    async def run(self):
+        """守护进程主循环"""
+        self._stop = asyncio.Event()
+        self._install_signal_handlers()
+        metrics_port = os.getenv('DAEMON_METRICS_PORT')
+        if metrics_port:
+            metrics.start_http_server(int(metrics_port))
+            logger.info(f"指标端口已开启: :{metrics_port}")
+
+        # 数据库连接也只建一次，整个守护进程生命周期内复用
+        self.db = DBManager()
+        self.db.migrate()
+        self.known_details = await asyncio.get_running_loop().run_in_executor(None, load_previous_snapshot) or {}
+        await self._start_engine()
+
+        logger.info(f"抓取守护进程已启动：间隔 {self.interval}s (抖动 ±{self.jitter:.0%})，"
+                    f"每 {self.recycle_cycles} 个周期或超过 {self.recycle_rss_mb:.0f}MB 重启浏览器")
+        try:
+            while not self._stop.is_set():
+                if self._current is not None and not self._current.done():
+                    # 上一个周期还在跑 (目标站点变慢了)，跳过这次触发
+                    self.skipped += 1
+                    logger.warning(f"上一个抓取周期仍在运行，跳过本次触发 (累计跳过 {self.skipped} 次)")
+                else:
+                    self._current = asyncio.create_task(self._cycle())
+                await self._sleep(self._next_delay())
+        finally:
+            # 优雅退出：等当前周期跑完 (数据要么完整入库，要么完全没写)，再关浏览器和数据库
+            if self._current is not None and not self._current.done():
+                logger.info("正在等待当前抓取周期结束...")
+                await asyncio.gather(self._current, return_exceptions=True)
+            await self._stop_engine()
+            self.db.close()
+            logger.info(f"抓取守护进程已退出 | {self.stats()}")
+
+    def stop(self):
+        if self._stop is not None and not self._stop.is_set():
+            logger.info("收到退出信号，完成当前周期后退出...")
+            self._stop.set()
+
+    def stats(self):
+        return {
+            "cycles": self.cycles,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "browser_recycles": self.recycles,
+        }
+
+    # ===============================
+    # 单个抓取周期
+    # ===============================
+    async def _cycle(self):
+        run_id = uuid.uuid4().hex
+        run = ScrapeRun(run_id, source="daemon")
+        loop = asyncio.get_running_loop()
+        # 成功 / 失败的周期都算：一直失败的浏览器同样在涨内存，也要按周期数重启
+        self._engine_cycles += 1
+        try:
+            if self.engine is None:
+                # 上次重启浏览器失败了，这个周期先把浏览器拉起来
+                await self._start_engine()
+            # 引擎的请求策略跨周期累计，台账记的是本周期的增量
+            policy = self.engine.policy
+            requests_before, bytes_before = policy.allowed, policy.bytes_received
+            jobs = jobs_from_env()
+            with run.phase("scrape"):
+                results = await self.engine.run_batch(jobs)
+            run.request_count = policy.allowed - requests_before
+            run.bytes_transferred = policy.bytes_received - bytes_before
+
+            # pymysql 是阻塞 I/O，放到线程池里执行，不卡住事件循环
+            with run.phase("save"):
+                outcome = await loop.run_in_executor(None, self._persist, results, run.run_id)
+            run.finish(**outcome)
+
+            self.cycles += 1
+            logger.info(f"抓取周期完成 (run_id={run_id})，耗时 {run.duration:.2f}s")
+        except Exception as e:
+            self.failures += 1
+            SCRAPE_RUNS.inc(status=CRASHED)
+            run.finish(CRASHED, error=f"{type(e).__name__}: {e}")
+            logger.error(f"抓取周期失败 (run_id={run_id}): {type(e).__name__}: {e}")
+
+        if self.db is not None:
+            await loop.run_in_executor(None, record_run, run, self.db)
+        await self._maybe_recycle()
+
+    def _persist(self, results, run_id):
+        """入库 + 变动通知，返回本周期的台账结果 (ScrapeRun.finish() 的参数)"""
+        # 复用常驻连接；连接被 MySQL 因 wait_timeout 断开时 ping 会自动重连
+        self.db.conn.ping(reconnect=True)
+        products = [p for r in results if r.ok and r.job.persist for p in r.products]
+        errors = "; ".join(f"{r.job.name}: {r.error}" for r in results if not r.ok) or None
+        version = persist_results(results, run_id=run_id, db=self.db)
+        if not version:
+            status = SAVE_FAILED if products else SCRAPE_FAILED
+            SCRAPE_RUNS.inc(status=status)
+            return dict(status=status, error=errors, item_count=len(products))
+        SCRAPE_RUNS.inc(status=SUCCESS)
+        LAST_SUCCESSFUL_SCRAPE.set_to_current_time()
+        # 和内存里的上一份快照比对，本周期的所有变动合成一张卡片发出去
+        if self.known_details:
+            self.dispatcher.extend(diff_snapshots(self.known_details, products).events)
+            self.dispatcher.flush()
+        # 本轮入库的数据就是下一轮的"上一份快照"，不用再回数据库查
+        self.known_details = {p["name"]: p for p in products}
+        if self.engine is not None:
+            self.engine.known_details = self.known_details
+        # 部分账号失败但入库任务成功，仍然算成功，失败的账号记在 error 里
+        return dict(status=SUCCESS, error=errors, item_count=len(products), snapshot_version=version)
+
+    # ===============================
+    # 浏览器生命周期
+    # ===============================
+    async def _start_engine(self):
+        engine = ScrapeEngine(known_details=self.known_details)
+        await engine.start()
+        self.engine = engine
+
+    async def _stop_engine(self):
+        # 周期计数跟着浏览器走：换新浏览器 (包括周期开头补启动的) 从 0 开始算
+        self._engine_cycles = 0
+        if self.engine is not None:
+            engine, self.engine = self.engine, None
+            try:
+                await engine.close()
+            except Exception as e:
+                logger.warning(f"关闭浏览器出错 (忽略): {type(e).__name__}: {e}")
+
+    async def _maybe_recycle(self):
+        reason = None
+        if self._engine_cycles >= self.recycle_cycles:
+            reason = f"已运行 {self._engine_cycles} 个周期"
+        else:
+            rss = _process_tree_rss_mb()
+            if rss is not None and rss > self.recycle_rss_mb:
+                reason = f"浏览器内存 {rss:.0f}MB 超过阈值"
+        if reason and not self._stop.is_set():
+            logger.info(f"重启浏览器：{reason}")
+            await self._stop_engine()
+            self.recycles += 1
+            try:
+                await self._start_engine()
+            except Exception as e:
+                # 启动失败不退出守护进程，下个周期开头会再试
+                logger.error(f"浏览器重启失败: {type(e).__name__}: {e}")
+
+    # ===============================
+    # 调度
+    # ===============================
+    def _next_delay(self):
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+    async def _sleep(self, seconds):
+        """可被退出信号打断的 sleep"""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows 的事件循环不支持 add_signal_handler
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(self.stop))
+
+
+if __name__ == "__main__":
+    asyncio.run(ScrapeDaemon().run())
@@ -0,0 +1,331 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+from pages.async_pages import AsyncLoginPage, AsyncInventoryPage
+from pages.base_page import RequestPolicy
+from pages.login_page import LoginPage
+from pages.inventory_page import InventoryPage
+from change_detector import load_previous_snapshot
+from detail_crawler import DetailCrawler
+from database.db_manager import DBManager
+from run_ledger import SCRAPE_PHASE_SECONDS
+from utils.session_cache import SessionCache
+from utils.logger import logger
+from utils import metrics
+
+# ===============================
+# 异步并发抓取引擎 (Async Scrape Engine)
+# ===============================
+# run_scraper() 一次只跑一个账号：启动浏览器 -> 登录 -> 抓取 -> 关浏览器。
+# 要监控多个账号 (standard_user / problem_user / performance_glitch_user ...) 和多个站点时，
+# 串行跑的总耗时 = 每个任务耗时之和。
+# 这里改成：一个浏览器 + 一个有上限的 Context 池，多个任务用 asyncio 并发执行，
+# 总耗时约等于最慢的那个任务。每个任务独立超时、独立报错，一个失败不影响其它任务。
+
+# SauceDemo 提供的测试账号 (密码都是 secret_sauce)
+DEFAULT_ACCOUNTS = ("standard_user", "problem_user", "performance_glitch_user")
+DEFAULT_PASSWORD = "secret_sauce"
+
+SCRAPE_JOBS = metrics.counter("saucemall_scrape_jobs_total", "Engine jobs by outcome", ["status"])
+
+
+class ScrapeJob:
+    """一个抓取任务：某个账号在某个站点上抓一遍商品列表"""
+    def __init__(self, username, password=DEFAULT_PASSWORD, login_url=LoginPage.url,
+                 inventory_url=InventoryPage.url, timeout=60.0, persist=False, crawl_details=False,
+                 detail_timeout=300.0):
+        self.username = username
+        self.password = password
+        self.login_url = login_url
+        self.inventory_url = inventory_url
+        # timeout 只管登录 + 列表抓取；详情抓取另有预算 detail_timeout，超时也不影响列表结果
+        self.timeout = timeout
+        self.detail_timeout = detail_timeout
+        # persist=True 的任务结果会作为商品快照写入数据库，其它任务只做监控
+        self.persist = persist
+        # crawl_details=True：列表抓完后再并发抓每个商品的详情页
+        self.crawl_details = crawl_details
+
+    @property
+    def name(self):
+        return f"{self.username}@{urlparse(self.inventory_url).hostname}"
+
+    @property
+    def session_key(self):
+        # 不同站点的同名账号是两份登录态
+        return f"{urlparse(self.inventory_url).hostname}_{self.username}"
+
+
+class JobResult:
+    """单个任务的执行结果"""
+    def __init__(self, job, products=None, error=None, duration=0.0, reused_session=False):
+        self.job = job
+        self.products = products or []
+        self.error = error
+        self.duration = duration
+        self.reused_session = reused_session
+        self.detail_stats = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def summary(self):
+        return {
+            "job": self.job.name,
+            "ok": self.ok,
+            "items": len(self.products),
+            "duration_ms": round(self.duration * 1000, 1),
+            "reused_session": self.reused_session,
+            "details": self.detail_stats,
+            "error": self.error,
+        }
+
+
+class ContextPool:
+    """
+    有上限的 BrowserContext 池
+    每个 Context 是一个隔离的会话 (Cookie 不共享)，按 session_key 归还到空闲列表，
+    同一个账号下次再借时直接复用已经登录好的 Context；
+    总数达到上限时，先关掉最久没用的空闲 Context 再新建。
+    """
+    def __init__(self, browser, size, policy=None, sessions=None):
+        self.browser = browser
+        self.size = size
+        self.policy = policy
+        self.sessions = sessions
+        self._slots = asyncio.Semaphore(size)
+        self._idle = deque()  # (session_key, context)，左边最旧
+        self._in_use = 0
+        self.created = 0
+        self.reused = 0
+
+    async def acquire(self, session_key):
+        """借一个 Context，返回 (context, warm)；warm=True 表示这个 Context 之前登录过"""
+        await self._slots.acquire()
+        self._in_use += 1
+        try:
+            for entry in self._idle:
+                if entry[0] == session_key:
+                    self._idle.remove(entry)
+                    self.reused += 1
+                    return entry[1], True
+
+            # 没有现成的：Context 总数 (借出 + 空闲) 到上限了，就淘汰最旧的空闲 Context
+            if self._in_use + len(self._idle) > self.size:
+                _, stale = self._idle.popleft()
+                await stale.close()
+
+            state = self.sessions.load(session_key) if self.sessions else None
+            context = await self.browser.new_context(storage_state=state)
+            if self.policy:
+                await self.policy.apply_async(context)
+            self.created += 1
+            return context, False
+        except BaseException:
+            self._in_use -= 1
+            self._slots.release()
+            raise
+
+    async def release(self, session_key, context, discard=False):
+        """归还 Context；任务出错 / 超时的 Context 状态不可信，直接关闭"""
+        try:
+            if discard:
+                await context.close()
+            else:
+                self._idle.append((session_key, context))
+        finally:
+            self._in_use -= 1
+            self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            _, context = self._idle.popleft()
+            await context.close()
+
+
+class ScrapeEngine:
+    """
+    异步抓取引擎
+    用法:
+        async with ScrapeEngine(concurrency=4) as engine:
+            results = await engine.run_batch(jobs)
+    """
+    def __init__(self, concurrency=None, headless=True, reuse_sessions=True, known_details=None):
+        self.concurrency = concurrency or int(os.getenv('SCRAPER_CONCURRENCY', 4))
+        # 上一轮快照的商品数据，详情抓取时用来跳过没变化的商品
+        self.known_details = known_details or {}
+        self.headless = headless
+        self.sessions = SessionCache() if reuse_sessions else None
+        self.policy = RequestPolicy.from_env()
+        self._playwright = None
+        self.browser = None
+        self.pool = None
+
+    async def start(self):
+        logger.info(f"正在启动浏览器 (Chrome Headless)，并发上限 {self.concurrency}...")
+        with SCRAPE_PHASE_SECONDS.time(phase="browser_launch"):
+            self._playwright = await async_playwright().start()
+            self.browser = await self._playwright.chromium.launch(headless=self.headless)
+        self.pool = ContextPool(self.browser, self.concurrency, self.policy, self.sessions)
+        return self
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+        if self.browser:
+            await self.browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+        self.pool = self.browser = self._playwright = None
+        logger.info("浏览器已关闭。")
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run_batch(self, jobs):
+        """并发执行一批任务，返回与 jobs 顺序一致的 JobResult 列表 (单个任务失败不会抛异常)"""
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.run_job(job) for job in jobs))
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r.ok)
+        logger.info(f"本批 {len(jobs)} 个任务完成：成功 {ok}，失败 {len(jobs) - ok}，总耗时 {elapsed:.2f}s")
+        return results
+
+    async def run_job(self, job):
+        """执行单个任务，超时和异常都收进 JobResult"""
+        start = time.perf_counter()
+        result = JobResult(job)
+        context = None
+        discard = False
+        try:
+            # Context 池本身就是并发闸门：借不到就排队
+            context, warm = await self.pool.acquire(job.session_key)
+            await asyncio.wait_for(self._scrape(job, context, warm, result), timeout=job.timeout)
+            # (可选) 详情页并发抓取：单独计时，失败 / 超时只影响详情字段，列表结果照常返回
+            if job.crawl_details:
+                discard = not await self._crawl_details(job, context, result)
+        except asyncio.TimeoutError:
+            discard = True
+            result.error = f"timeout after {job.timeout}s"
+        except Exception as e:
+            discard = True
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            if context is not None:
+                await self.pool.release(job.session_key, context, discard=discard)
+            result.duration = time.perf_counter() - start
+
+        SCRAPE_JOBS.inc(status="success" if result.ok else "failed")
+        if result.ok:
+            logger.info(f"[{job.name}] 抓取完成，{len(result.products)} 个商品，耗时 {result.duration:.2f}s")
+        else:
+            logger.error(f"[{job.name}] 抓取失败: {result.error}")
+        return result
+
+    async def _scrape(self, job, context, warm, result):
+        page = await context.new_page()
+        try:
+            login_page = AsyncLoginPage(page, self.policy)
+            inventory_page = AsyncInventoryPage(page, self.policy)
+            login_page.url = job.login_url
+            inventory_page.url = job.inventory_url
+
+            # 1. 已登录的 Context (池里复用的，或者带着磁盘会话新建的) 直接打开商品页
+            with SCRAPE_PHASE_SECONDS.time(phase="login"):
+                logged_in = False
+                if warm or (self.sessions and self.sessions.load(job.session_key)):
+                    logged_in = await inventory_page.open_with_session()
+                    result.reused_session = logged_in
+
+                # 2. 否则正常登录，并把登录态存下来
+                if not logged_in:
+                    await login_page.login(job.username, job.password)
+                    await inventory_page.wait_until_ready()
+                    if self.sessions:
+                        await self.sessions.save_async(context, job.session_key)
+
+            # 3. 抓取
+            with SCRAPE_PHASE_SECONDS.time(phase="extraction"):
+                result.products = await inventory_page.get_products()
+        finally:
+            await page.close()
+
+    async def _crawl_details(self, job, context, result):
+        """
+        给已经抓到的列表补详情字段，最多 job.detail_timeout 秒
+        超时 / 出错时保留已经补上的部分 (DetailCrawler 原地修改商品)，统计里标记 timed_out / error；
+        返回 False 表示 Context 里可能还有没关掉的详情页，归还时应该丢弃
+        """
+        crawler = DetailCrawler(known=self.known_details, policy=self.policy)
+        try:
+            with SCRAPE_PHASE_SECONDS.time(phase="details"):
+                await asyncio.wait_for(
+                    crawler.crawl(context, result.products, job.inventory_url), timeout=job.detail_timeout)
+            result.detail_stats = crawler.report()
+            return True
+        except asyncio.TimeoutError:
+            result.detail_stats = dict(crawler.report(), timed_out=True)
+            logger.warning(f"[{job.name}] 详情抓取超过 {job.detail_timeout}s，保留列表结果和已抓到的详情: "
+                           f"{result.detail_stats}")
+        except Exception as e:
+            result.detail_stats = dict(crawler.report(), error=f"{type(e).__name__}: {e}")
+            logger.warning(f"[{job.name}] 详情抓取失败，保留列表结果: {result.detail_stats['error']}")
+        return False
+
+
+def jobs_from_env():
+    """
+    从环境变量 SCRAPER_ACCOUNTS (逗号分隔) 生成任务列表，第一个账号的结果写入数据库
+    SCRAPER_CRAWL_DETAILS=1 时，入库的那个任务会额外抓取详情页
+    """
+    accounts = os.getenv('SCRAPER_ACCOUNTS')
+    usernames = [a.strip() for a in accounts.split(",") if a.strip()] if accounts else list(DEFAULT_ACCOUNTS)
+    timeout = float(os.getenv('SCRAPER_JOB_TIMEOUT', 60))
+    detail_timeout = float(os.getenv('SCRAPER_DETAIL_TIMEOUT', 300))
+    crawl_details = os.getenv('SCRAPER_CRAWL_DETAILS', '0') == '1'
+    return [
+        ScrapeJob(name, timeout=timeout, persist=(i == 0), crawl_details=(crawl_details and i == 0),
+                  detail_timeout=detail_timeout)
+        for i, name in enumerate(usernames)
+    ]
+
+
+def persist_results(results, run_id=None, db=None):
+    """
+    把 persist=True 且成功的任务结果作为新快照写入数据库
+    传入 db 时复用调用方的连接 (常驻守护进程)，否则临时建一个连接，用完关闭
+    """
+    products = [p for r in results if r.ok and r.job.persist for p in r.products]
+    if not products:
+        logger.warning("没有需要入库的成功结果，跳过数据库保存步骤。")
+        return None
+    if db is not None:
+        return db.save_product(products, run_id=run_id or uuid.uuid4().hex)
+    db = DBManager()
+    db.migrate()
+    version = db.save_product(products, run_id=run_id or uuid.uuid4().hex)
+    db.close()
+    return version
+
+
+async def main():
+    jobs = jobs_from_env()
+    known = (load_previous_snapshot() or {}) if any(job.crawl_details for job in jobs) else {}
+    async with ScrapeEngine(known_details=known) as engine:
+        results = await engine.run_batch(jobs)
+    for result in results:
+        logger.info(f"任务结果: {result.summary()}")
+    persist_results(results)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
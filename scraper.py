@@ -1,72 +1,155 @@
+import uuid                                      # 生成每次抓取的批次号 (run_id)
 from playwright.sync_api import sync_playwright  # 导入 Playwright 同步 API，用于控制浏览器
 from pages.login_page import LoginPage           # 导入登录页面的 Page Object 模型
 from pages.inventory_page import InventoryPage   # 导入商品库存页面的 Page Object 模型
-from database.db_manager import DBManager        # 导入数据库管理类，用于后续存储数据
+from pages.base_page import RequestPolicy        # 导入请求拦截策略 (屏蔽图片/字体/统计脚本)
+from pipeline import SnapshotPipeline, PipelineError  # 导入流式入库管道 (边抓边写库)
+from change_detector import SnapshotDiffer, load_previous_snapshot  # 导入价格变动检测
+from utils.notification import NotificationDispatcher  # 导入变动通知分发器 (合并 + 限流 + 重试)
+from run_ledger import ScrapeRun, record_run, SUCCESS, SCRAPE_FAILED, SAVE_FAILED, CRASHED  # 导入抓取台账
+from run_ledger import SCRAPE_RUNS, LAST_SUCCESSFUL_SCRAPE  # 导入抓取结果指标 (各阶段耗时由 ScrapeRun.phase() 记录)
+from utils.session_cache import SessionCache     # 导入登录会话缓存 (热启动时跳过登录)
 from utils.logger import logger                  # 导入我们封装的日志工具 🚀
 
-def run_scraper():
+def run_scraper(username="standard_user", password="secret_sauce", reuse_session=True, collect=True):
     """
     爬虫主入口函数。
-    负责编排整个抓取流程：启动浏览器 -> 登录 -> 抓取 -> 存库。
+    负责编排整个抓取流程：启动浏览器 -> 登录 (或复用已缓存的会话) -> 边抓取边存库。
+    collect=True 时返回抓到的商品列表 (测试用来和 API 比对)；
+    collect=False 时不在内存里保留商品，只返回写入条数 (商品量很大时用)。
     """
     scraped_products = []  # 初始化一个空列表，用来存放抓取到的商品数据
+    run_id = uuid.uuid4().hex  # 本次抓取的批次号，价格历史按批次记录
+    logger.info(f"本次抓取批次号 run_id={run_id}")
 
-    # 使用 context manager (with 语句) 启动 Playwright
-    # 这样可以确保代码执行完毕后，自动释放 Playwright 相关的资源，防止内存泄漏
-    with sync_playwright() as p:
-        # 1. 启动浏览器
-        # headless=True 表示无头模式（不显示浏览器界面），适合生产环境或自动化运行
-        # 如果需要调试看效果，可以改为 headless=False
-        logger.info("正在启动浏览器 (Chrome Headless)...")
-        browser = p.chromium.launch(headless=True)
+    # 0. 读取上一份快照作为价格比对的基线 (首次抓取没有基线，不做比对)
+    previous = load_previous_snapshot()
+    differ = SnapshotDiffer(previous) if previous else None
+
+    # 0.1 启动写库线程：连接数据库、准备影子表，和下面的浏览器启动 / 登录同时进行
+    pipeline = SnapshotPipeline(run_id=run_id).start()
+    scrape_ok = False
+    # 抓取台账：各阶段耗时 (browser_launch / login / extraction / save)、流量、结果，结束时写入 scrape_runs
+    run = ScrapeRun(run_id, source="scraper", username=username)
+    error = None
+
+    try:
+        # 使用 context manager (with 语句) 启动 Playwright
+        # 这样可以确保代码执行完毕后，自动释放 Playwright 相关的资源，防止内存泄漏
+        with sync_playwright() as p:
+            # 1. 启动浏览器
+            # headless=True 表示无头模式（不显示浏览器界面），适合生产环境或自动化运行
+            # 如果需要调试看效果，可以改为 headless=False
+            logger.info("正在启动浏览器 (Chrome Headless)...")
+            with run.phase("browser_launch"):
+                browser = p.chromium.launch(headless=True)
         
-        # 2. 创建浏览器上下文 (Context)
-        # Context 相当于一个独立的浏览器会话（类似隐身窗口），不同 Context 之间 Cookie 不共享
-        context = browser.new_context()
+            # 2. 创建浏览器上下文 (Context)
+            # Context 相当于一个独立的浏览器会话（类似隐身窗口），不同 Context 之间 Cookie 不共享
+            # 如果磁盘上有这个用户还没过期的登录态，直接带上它 (Cookie + localStorage)
+            sessions = SessionCache()
+            session_state = sessions.load(username) if reuse_session else None
+            context = browser.new_context(storage_state=session_state)
+
+            # 2.1 挂上请求拦截策略：爬虫用不到的图片、字体、第三方统计脚本直接拦掉
+            policy = RequestPolicy.from_env().apply(context)
         
-        # 3. 在上下文中打开一个新页面 (Page)
-        # Page 相当于浏览器中的一个标签页
-        page = context.new_page()
+            # 3. 在上下文中打开一个新页面 (Page)
+            # Page 相当于浏览器中的一个标签页
+            page = context.new_page()
 
-        # 4. 实例化 POM (Page Object Model) 对象
-        # 将 page 传递给页面对象，让它们能操作这个页面
-        login_page = LoginPage(page)          # 登录页操作对象
-        inventory_page = InventoryPage(page)  # 商品列表页操作对象
+            # 4. 实例化 POM (Page Object Model) 对象
+            # 将 page 传递给页面对象，让它们能操作这个页面
+            login_page = LoginPage(page, policy)          # 登录页操作对象
+            inventory_page = InventoryPage(page, policy)  # 商品列表页操作对象
 
-        # 5. 执行业务流程
-        try:
-            # 5.1 执行登录
-            logger.info("正在尝试登录 SauceDemo...")
-            login_page.login("standard_user", "secret_sauce")
-            logger.info("登录成功！")
+            # 5. 执行业务流程
+            try:
+                with run.phase("login"):
+                    # 5.1 热启动：带着缓存的会话直接打开商品页，省掉整个登录流程
+                    logged_in = False
+                    if session_state:
+                        logged_in = inventory_page.open_with_session()
+                        if logged_in:
+                            logger.info(f"复用已缓存的登录会话 ({username})，跳过登录。")
+                        else:
+                            # 会话已被服务端判定失效 (被重定向回登录页)，删掉缓存，走正常登录
+                            logger.warning(f"缓存的登录会话已失效 ({username})，重新登录...")
+                            sessions.invalidate(username)
+
+                    # 5.2 冷启动：执行登录，并把登录态存下来给下次用
+                    if not logged_in:
+                        logger.info("正在尝试登录 SauceDemo...")
+                        login_page.login(username, password)
+                        inventory_page.wait_until_ready()
+                        logger.info("登录成功！")
+                        if reuse_session:
+                            sessions.save(context, username)
             
-            # 5.2 登录成功后，抓取商品数据
-            logger.info("开始抓取商品列表...")
-            scraped_products = inventory_page.get_products()
-            logger.info(f"抓取完成，共获取 {len(scraped_products)} 条商品信息。")
+                # 5.3 登录成功后，边抓取边交给写库线程 (生产者 / 消费者)
+                # 数据库写得慢时 put() 会阻塞，抓取自动放慢 (背压)
+                with run.phase("extraction"):
+                    logger.info("开始抓取商品列表...")
+                    for product in inventory_page.iter_products():
+                        pipeline.put(product)
+                        if differ:
+                            differ.feed(product)
+                        if collect:
+                            scraped_products.append(product)
+                scrape_ok = True
+                logger.info(f"抓取完成，共获取 {pipeline.produced} 条商品信息。")
             
-        except Exception as e:
-            # 捕获所有异常，防止因为页面加载失败等原因导致程序直接崩溃
-            # 在面试中可以强调这点：保证程序的健壮性
-            logger.error(f"抓取过程中发生错误: {e}")
+            except Exception as e:
+                # 捕获所有异常，防止因为页面加载失败等原因导致程序直接崩溃
+                # 在面试中可以强调这点：保证程序的健壮性
+                logger.error(f"抓取过程中发生错误: {e}")
+                error = e
             
-        finally:
-            # 6. 关闭浏览器
-            # 放在 finally 块中，确保无论是否出错，浏览器都能被正确关闭
-            logger.info("正在关闭浏览器...")
-            browser.close()
+            finally:
+                # 6. 关闭浏览器
+                # 放在 finally 块中，确保无论是否出错，浏览器都能被正确关闭
+                logger.info(f"本次共拦截 {policy.blocked} 个请求，放行 {policy.allowed} 个请求")
+                run.request_count = policy.allowed
+                run.bytes_transferred = policy.bytes_received
+                logger.info("正在关闭浏览器...")
+                browser.close()
+    except BaseException as e:
+        # 浏览器都没启动起来 (或者被 Ctrl+C 打断)：放弃写入，释放快照写锁
+        pipeline.abort()
+        run.finish(CRASHED, error=f"{type(e).__name__}: {e}", item_count=pipeline.produced)
+        record_run(run)
+        raise
 
-    # 7. 数据持久化 (存入数据库)
-    if scraped_products:
-        logger.info("准备将数据存入数据库...")
-        db = DBManager()                 # 实例化数据库管理器
-        db.save_product(scraped_products) # 调用保存方法
-        db.close()                       # 关闭数据库连接
-        logger.success("所有流程执行完毕，数据已入库！")
+    # 7. 数据持久化：抓取成功就原子交换快照；中途失败就整份放弃，线上数据保持上一轮
+    status = SCRAPE_FAILED
+    version = None
+    if scrape_ok and pipeline.produced:
+        try:
+            with run.phase("save"):
+                version = pipeline.finish()
+            logger.success(f"所有流程执行完毕，数据已入库！(version={version})")
+            # 8. 价格变动通知：本轮所有变动合成一张卡片发送
+            if differ and version:
+                dispatcher = NotificationDispatcher()
+                dispatcher.extend(differ.finish().events)
+                dispatcher.flush()
+            status = SUCCESS
+            LAST_SUCCESSFUL_SCRAPE.set_to_current_time()
+        except PipelineError as e:
+            status = SAVE_FAILED
+            error = e
+            logger.error(f"数据入库失败: {e}")
     else:
-        logger.warning("未抓取到任何商品数据，跳过数据库保存步骤。")
+        pipeline.abort()
+        logger.warning("未抓取到完整的商品数据，跳过数据库保存步骤。")
+    SCRAPE_RUNS.inc(status=status)
+
+    # 9. 记一笔抓取台账 (写失败不影响返回值)
+    run.finish(status, error=error, item_count=pipeline.produced, snapshot_version=version)
+    logger.info(f"各阶段耗时 (秒): {run.timings()}")
+    record_run(run)
     
-    return scraped_products
+    return scraped_products if collect else pipeline.produced
 
 if __name__ == "__main__":
     # 当直接运行此文件时执行
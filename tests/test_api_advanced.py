@@ -62,4 +62,194 @@ class TestProductFilter:
         
         assert response.status_code == 200
         # 应该返回空列表，而不是报错
-        assert len(response.json()['data']) == 0
\ No newline at end of file
+        assert len(response.json()['data']) == 0
+
+@allure.feature("API 高级测试")
+@allure.story("价格历史接口测试")
+class TestProductHistory:
+
+    HISTORY_URL = "http://127.0.0.1:5000/api/products/{name}/history"
+
+    @allure.title("测试按天降采样的价格历史")
+    def test_history_daily_buckets(self):
+        response = requests.get(self.HISTORY_URL.format(name="Sauce Labs Backpack"), params={"bucket": "day"})
+
+        assert response.status_code == 200
+        data = response.json()['data']
+        assert data['bucket'] == "day"
+        # 每个桶都应该满足 min <= last <= max
+        for point in data['series']:
+            assert float(point['min']) <= float(point['last']) <= float(point['max'])
+
+    @allure.title("测试非法的降采样粒度 (400错误)")
+    @pytest.mark.parametrize("params", [
+        {"bucket": "week"},
+        {"start": "not-a-date"},
+    ])
+    def test_history_invalid_params(self, params):
+        response = requests.get(self.HISTORY_URL.format(name="Sauce Labs Backpack"), params=params)
+
+        assert response.status_code == 400
+        assert "error" in response.json()
+
+
+@allure.feature("API 高级测试")
+@allure.story("商品名搜索测试")
+class TestProductSearch:
+
+    @allure.title("测试按商品名搜索 (整词 / 词前缀 / 短词前缀)")
+    @pytest.mark.parametrize("q, keyword", [
+        ("backpack", "backpack"),   # 整词
+        ("BACK", "back"),           # 词前缀，大小写不敏感
+        ("sa", "sa"),               # 短词 (低于 FULLTEXT 最短词长)，按商品名前缀匹配
+    ])
+    def test_search_matches_name(self, q, keyword):
+        response = requests.get(API_URL, params={"q": q})
+
+        assert response.status_code == 200
+        for item in response.json()['data']:
+            assert keyword in item['name'].lower()
+
+    @allure.title("测试搜索和价格筛选、分页组合使用")
+    def test_search_with_filters(self):
+        params = {"q": "sauce labs", "max_price": 20, "limit": 1}
+        body = requests.get(API_URL, params=params).json()
+
+        assert len(body['data']) <= 1
+        for item in body['data']:
+            assert float(item['price']) <= 20
+            assert "sauce" in item['name'].lower()
+
+    @allure.title("测试过长的搜索词 (400错误)")
+    def test_search_too_long(self):
+        response = requests.get(API_URL, params={"q": "x" * 101})
+
+        assert response.status_code == 400
+
+
+@allure.feature("API 高级测试")
+@allure.story("快照摘要 & 增量同步测试")
+class TestProductChanges:
+
+    @staticmethod
+    def _digest():
+        """当前快照的摘要响应；空库 (CI 里还没跑过爬虫) 时跳过"""
+        response = requests.get(f"{API_URL}/digest")
+        if response.status_code == 404:
+            pytest.skip("数据库中还没有快照版本")
+        return response
+
+    @allure.title("测试摘要接口返回当前版本号和内容摘要")
+    def test_digest(self):
+        response = self._digest()
+
+        assert response.status_code == 200
+        data = response.json()['data']
+        assert data['version'] >= 1
+        assert data['item_count'] == len(requests.get(API_URL).json()['data'])
+
+        # 快照没变时带 ETag 回来拿 304
+        again = requests.get(f"{API_URL}/digest", headers={"If-None-Match": response.headers['ETag']})
+        assert again.status_code == 304
+
+    @allure.title("测试客户端已经是最新版本时增量为空")
+    def test_changes_up_to_date(self):
+        version = self._digest().json()['data']['version']
+        body = requests.get(f"{API_URL}/changes", params={"since": version}).json()
+
+        assert body['total'] == 0
+        assert body['data']['version'] == version
+        assert body['data']['added'] == body['data']['changed'] == body['data']['removed'] == []
+
+    @allure.title("测试比当前版本还新的 since 要求全量重新同步 (410)")
+    def test_changes_future_version(self):
+        version = self._digest().json()['data']['version']
+        response = requests.get(f"{API_URL}/changes", params={"since": version + 1000})
+
+        assert response.status_code == 410
+        assert response.json()['data']['full_resync'] is True
+
+    @allure.title("测试非法 since 参数 (400错误)")
+    @pytest.mark.parametrize("params", [{}, {"since": "abc"}, {"since": -1}])
+    def test_changes_invalid_since(self, params):
+        response = requests.get(f"{API_URL}/changes", params=params)
+
+        assert response.status_code == 400
+
+
+@allure.feature("API 高级测试")
+@allure.story("游标分页 & 流式输出测试")
+class TestProductPagination:
+
+    @allure.title("测试游标分页能不重不漏地遍历全部商品")
+    def test_keyset_pagination_covers_all(self):
+        full = requests.get(API_URL).json()['data']
+
+        pages, after = [], None
+        while True:
+            params = {"limit": 2}
+            if after:
+                params["after"] = after
+            body = requests.get(API_URL, params=params).json()
+            pages.extend(body['data'])
+            after = body['next_after']
+            if not after:
+                break
+
+        assert [item['name'] for item in pages] == [item['name'] for item in full]
+
+    @allure.title("测试旧快照版本的翻页游标 (410错误)")
+    def test_stale_cursor_rejected(self):
+        response = requests.get(API_URL, params={"limit": 2, "after": "999999999:1"})
+
+        assert response.status_code == 410
+
+    @allure.title("测试格式错误的翻页游标 (400错误)")
+    @pytest.mark.parametrize("after", ["abc", "12", "1:2:3"])
+    def test_malformed_cursor(self, after):
+        response = requests.get(API_URL, params={"limit": 2, "after": after})
+
+        assert response.status_code == 400
+
+    @allure.title("测试 NDJSON 流式输出与普通接口结果一致")
+    def test_ndjson_stream_matches(self):
+        full = requests.get(API_URL).json()['data']
+
+        with requests.get(API_URL, params={"stream": "ndjson"}, stream=True) as response:
+            assert response.status_code == 200
+            lines = [line for line in response.iter_lines() if line]
+
+        assert len(lines) == len(full)
+
+
+@allure.feature("API 高级测试")
+@allure.story("条件请求 & 压缩测试")
+class TestConditionalGet:
+
+    @allure.title("测试 If-None-Match 命中时返回 304")
+    def test_if_none_match_returns_304(self):
+        first = requests.get(API_URL)
+        etag = first.headers.get("ETag")
+        if not etag:
+            pytest.skip("数据库中还没有快照版本，接口不返回 ETag")
+
+        second = requests.get(API_URL, headers={"If-None-Match": etag})
+
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+
+    @allure.title("测试不同查询参数的 ETag 不同")
+    def test_etag_depends_on_query(self):
+        all_items = requests.get(API_URL)
+        cheap_items = requests.get(API_URL, params={"max_price": 10})
+
+        if all_items.headers.get("ETag"):
+            assert all_items.headers["ETag"] != cheap_items.headers["ETag"]
+
+    @allure.title("测试 Accept-Encoding: gzip;q=0 时不压缩")
+    def test_gzip_refused_by_q_zero(self):
+        response = requests.get(API_URL, headers={"Accept-Encoding": "gzip;q=0, identity"})
+
+        assert response.status_code == 200
+        assert "Content-Encoding" not in response.headers
@@ -0,0 +1,57 @@
+import allure
+import pytest
+from pages import base_page
+from pages.base_page import BasePage
+from utils.logger import Sampler, logger
+
+
+class FakePage:
+    """记录 open() 依次做了哪些等待"""
+
+    def __init__(self):
+        self.calls = []
+
+    def goto(self, url, wait_until="load"):
+        self.calls.append(("goto", wait_until))
+
+    def wait_for_selector(self, selector):
+        self.calls.append(("selector", selector))
+
+    def wait_for_load_state(self, state):
+        self.calls.append(("load_state", state))
+
+
+class ReadyPage(BasePage):
+    READY_SELECTOR = ".inventory_list"
+
+
+@pytest.fixture
+def messages():
+    lines = []
+    sink = logger.add(lines.append, format="{message}", level="INFO")
+    yield lines
+    logger.remove(sink)
+
+
+@allure.feature("页面对象")
+class TestBasePageOpen:
+
+    @allure.title("测试默认只等标志元素，不等 networkidle")
+    def test_selector_wait_without_baseline(self, monkeypatch, messages):
+        monkeypatch.setattr(base_page, "wait_baseline_sample", Sampler(0))
+        page = FakePage()
+        ReadyPage(page).open("http://example.invalid/inventory.html")
+
+        assert page.calls == [("goto", "domcontentloaded"), ("selector", ".inventory_list")]
+        assert "比 networkidle 省" not in messages[-1]
+
+    @allure.title("测试抽中的导航再等到 networkidle，日志里报告省下的时间")
+    def test_sampled_baseline_reports_saving(self, monkeypatch, messages):
+        monkeypatch.setattr(base_page, "wait_baseline_sample", Sampler(1))
+        page = FakePage()
+        elapsed_ms = ReadyPage(page).open("http://example.invalid/inventory.html")
+
+        assert page.calls[-1] == ("load_state", "networkidle")
+        assert elapsed_ms >= 0
+        assert "等待策略 selector:.inventory_list" in messages[-1]
+        assert "比 networkidle 省" in messages[-1]
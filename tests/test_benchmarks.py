@@ -0,0 +1,37 @@
+import allure
+from urllib.request import Request, urlopen
+from benchmarks.report import compare, summarize
+from benchmarks.standin_site import SESSION_COOKIE, StandinSite, build_catalog
+
+
+@allure.feature("基准测试工具")
+class TestBenchmarks:
+
+    @allure.title("测试替身站点：商品数由 URL 前缀决定，未登录看到登录页")
+    def test_standin_site(self):
+        with StandinSite() as site:
+            inventory_url = site.base_url(50) + "inventory.html"
+            anonymous = urlopen(inventory_url).read()
+            logged_in = urlopen(Request(inventory_url, headers={"Cookie": f"{SESSION_COOKIE}=standard_user"})).read()
+
+        assert b'id="login-button"' in anonymous
+        assert logged_in.count(b'class="inventory_item"') == 50
+        assert b'id="item_4_title_link"' in logged_in
+
+    @allure.title("测试生成的商品目录可复现，前 6 件和 SauceDemo 一致")
+    def test_catalog_deterministic(self):
+        catalog = build_catalog(1000)
+        assert catalog == build_catalog(1000)
+        assert catalog[0][1] == "Sauce Labs Backpack"
+        assert len({name for _, name, _, _ in catalog}) == 1000
+
+    @allure.title("测试结果汇总和退化检测")
+    def test_summarize_and_compare(self):
+        stats = summarize([float(ms) for ms in range(1, 101)], items=6)
+        assert (stats["n"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]) == (100, 50.0, 95.0, 99.0)
+        assert stats["items"] == 6
+
+        baseline = {"results": {"a": {"p50_ms": 10.0}, "b": {"p50_ms": 10.0}, "old": {"p50_ms": 1.0}}}
+        current = {"results": {"a": {"p50_ms": 10.5}, "b": {"p50_ms": 12.0}, "new": {"p50_ms": 1.0}}}
+        rows = compare(baseline, current, threshold=0.10, metrics=("p50_ms",))
+        assert [(case, regressed) for case, _, _, _, _, regressed in rows] == [("a", False), ("b", True)]
@@ -0,0 +1,44 @@
+import allure
+from utils.cache import ResponseCache, VersionTracker
+
+
+@allure.feature("响应缓存")
+class TestResponseCache:
+
+    @allure.title("测试 LRU 淘汰：超过条数上限时淘汰最久未使用的 key")
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")          # a 变成最近使用
+        cache.set("c", b"3")    # 淘汰 b
+
+        assert cache.get("a") == b"1"
+        assert cache.get("b") is None
+        assert cache.stats()["evictions"] == 1
+
+    @allure.title("测试内存上限：总字节数不超过 max_bytes")
+    def test_memory_cap(self):
+        cache = ResponseCache(max_bytes=80)
+        for i in range(10):
+            cache.set(i, b"x" * 10)
+
+        assert cache.stats()["bytes"] <= 80
+
+    @allure.title("测试 TTL 过期")
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=0)
+        cache.set("a", b"1")
+
+        assert cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    @allure.title("测试版本号跟踪器在间隔内只查询一次")
+    def test_version_tracker_interval(self):
+        calls = []
+        tracker = VersionTracker(lambda: calls.append(1) or len(calls), interval=60)
+
+        assert tracker.current() == 1
+        assert tracker.current() == 1
+        tracker.invalidate()
+        assert tracker.current() == 2
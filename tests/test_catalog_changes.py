@@ -0,0 +1,53 @@
+import allure
+from database.catalog_changes import ADDED, CHANGED, REMOVED, collapse, content_digest
+
+
+def _event(version, name, kind, old_price=None, new_price=None):
+    return {"version": version, "name": name, "kind": kind, "old_price": old_price, "new_price": new_price}
+
+
+PRODUCTS = [
+    {"name": "Sauce Labs Backpack", "price": 29.99, "item_id": "4", "description": "carry.allTheThings()"},
+    {"name": "Sauce Labs Bike Light", "price": "9.99"},
+]
+
+
+@allure.feature("增量同步")
+class TestCatalogChanges:
+
+    @allure.title("测试内容摘要和商品顺序无关、和内容有关")
+    def test_digest_order_independent(self):
+        digest = content_digest(PRODUCTS)
+        assert digest == content_digest(list(reversed(PRODUCTS)))
+        assert len(digest) == 40
+
+        repriced = [dict(PRODUCTS[0], price=19.99), PRODUCTS[1]]
+        assert content_digest(repriced) != digest
+        assert content_digest(PRODUCTS + [PRODUCTS[1]]) != digest
+
+    @allure.title("测试价格格式化和 DECIMAL(10, 2) 一致，缺失字段等价于 None")
+    def test_digest_normalization(self):
+        assert content_digest([{"name": "A", "price": 10}]) == content_digest([{"name": "A", "price": "10.00", "item_id": None}])
+
+    @allure.title("测试多个版本的变更合并成净变化")
+    def test_collapse(self):
+        events = [
+            _event(3, "Backpack", CHANGED, 29.99, 24.99),
+            _event(3, "Onesie", ADDED, None, 7.99),
+            _event(3, "Fleece", ADDED, None, 49.99),
+            _event(4, "Bike Light", REMOVED, 9.99, None),
+            _event(4, "Backpack", CHANGED, 24.99, 19.99),
+            _event(4, "Fleece", REMOVED, 49.99, None),
+            _event(5, "Bike Light", ADDED, None, 11.99),
+        ]
+        net = collapse(events)
+
+        assert net["Backpack"] == {"kind": CHANGED, "old_price": 29.99, "new_price": 19.99}
+        assert net["Onesie"] == {"kind": ADDED, "old_price": None, "new_price": 7.99}
+        # 删了又加回来 = 变化；加了又删掉 = 没变化
+        assert net["Bike Light"] == {"kind": CHANGED, "old_price": 9.99, "new_price": 11.99}
+        assert "Fleece" not in net
+
+    @allure.title("测试没有变更事件时返回空")
+    def test_collapse_empty(self):
+        assert collapse([]) == {}
@@ -0,0 +1,48 @@
+import allure
+from database.catalog_stats import parse_edges, summarize
+
+
+def _bucket(i, lo, hi, prices, edge_count=0):
+    return {
+        "bucket": i, "lo": lo, "hi": hi, "item_count": len(prices),
+        "min_price": min(prices) if prices else None, "max_price": max(prices) if prices else None,
+        "sum_price": sum(prices), "edge_count": edge_count,
+    }
+
+
+# 价格: 7.99 / 9.99 / 15.99 / 20.00 / 29.99 / 49.99，桶边界 0,10,20,30
+BUCKETS = [
+    _bucket(0, 0.0, 10.0, [7.99, 9.99]),
+    _bucket(1, 10.0, 20.0, [15.99]),
+    _bucket(2, 20.0, 30.0, [20.00, 29.99], edge_count=1),
+    _bucket(3, 30.0, None, [49.99]),
+]
+
+
+@allure.feature("目录统计")
+class TestCatalogStats:
+
+    @allure.title("测试桶边界配置解析")
+    def test_parse_edges(self):
+        assert parse_edges("30, 10,20,10") == (0.0, 10.0, 20.0, 30.0)
+        assert parse_edges("0,5") == (0.0, 5.0)
+
+    @allure.title("测试不带筛选时合并全部桶")
+    def test_overall(self):
+        overall = summarize(BUCKETS)["overall"]
+        assert overall["count"] == 6
+        assert overall["min"] == 7.99
+        assert overall["max"] == 49.99
+        assert overall["avg"] == round((7.99 + 9.99 + 15.99 + 20.00 + 29.99 + 49.99) / 6, 2)
+
+    @allure.title("测试筛选条件落在桶边界上：上界闭区间要带上正好等于边界的商品")
+    def test_aligned_filter(self):
+        result = summarize(BUCKETS, min_price=10.0, max_price=20.0)
+        assert result["overall"]["count"] == 2
+        assert result["overall"]["max"] == 20.0
+        assert [b["count"] for b in result["buckets"]] == [1, 1]
+
+    @allure.title("测试筛选条件不在桶边界上时交给回表计算")
+    def test_unaligned_filter(self):
+        assert summarize(BUCKETS, min_price=12.5) is None
+        assert summarize(BUCKETS, max_price=25) is None
@@ -0,0 +1,56 @@
+import allure
+import pymysql
+import change_detector
+from change_detector import diff_snapshots, load_previous_snapshot, ADDED, REMOVED, CHANGED
+
+
+PREVIOUS = {
+    "Bag": {"name": "Bag", "price": 29.99, "item_id": "4"},
+    "Bike Light": {"name": "Bike Light", "price": 9.99, "item_id": "0"},
+    "Onesie": {"name": "Onesie", "price": 7.99, "item_id": "2"},
+}
+
+
+@allure.feature("价格变动检测")
+class TestChangeDetector:
+
+    @allure.title("测试上架 / 下架 / 调价三类事件")
+    def test_diff_events(self):
+        current = [
+            {"name": "Bag", "price": 19.99, "item_id": "4"},
+            {"name": "Bike Light", "price": 9.99, "item_id": "0"},
+            {"name": "Jacket", "price": 49.99, "item_id": "5"},
+        ]
+        report = diff_snapshots(PREVIOUS, current)
+
+        assert [e.name for e in report.of(CHANGED)] == ["Bag"]
+        assert report.of(CHANGED)[0].delta == -10.0
+        assert [e.name for e in report.of(ADDED)] == ["Jacket"]
+        assert [e.name for e in report.of(REMOVED)] == ["Onesie"]
+        assert report.unchanged == 1
+
+    @allure.title("测试阈值：变化幅度不够的调价不报警")
+    def test_threshold(self):
+        current = [dict(p, price=p["price"] + 0.01) for p in PREVIOUS.values()]
+        report = diff_snapshots(PREVIOUS, current, min_pct=1)
+
+        assert not report
+        assert report.below_threshold == 3
+
+    @allure.title("测试读取上一份快照失败时返回 None，并且关闭连接")
+    def test_load_previous_snapshot_closes_on_error(self, monkeypatch):
+        closed = []
+
+        class FailingDB:
+            def connect(self):
+                pass
+
+            def load_known_details(self):
+                raise pymysql.err.OperationalError(1054, "Unknown column 'image_url' in 'field list'")
+
+            def close(self):
+                closed.append(True)
+
+        monkeypatch.setattr(change_detector, "DBManager", FailingDB)
+        assert load_previous_snapshot() is None
+        assert closed == [True]
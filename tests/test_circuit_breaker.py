@@ -0,0 +1,107 @@
+import time
+import allure
+import pymysql
+import pytest
+from database.db_manager import ConnectionPool, is_connection_error
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+def _refused():
+    raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+
+
+class _FakeConnection:
+    open = True
+    server_status = 0
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+@allure.feature("数据库熔断")
+class TestCircuitBreaker:
+
+    @allure.title("测试连续失败后熔断，半开探测成功后恢复")
+    def test_open_half_open_close(self):
+        breaker = CircuitBreaker("db", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        assert breaker.state == HALF_OPEN
+        breaker.before_call()  # 只放行一个探测请求
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+    @allure.title("测试半开探测失败后重新熔断")
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.opened == 2
+
+    @allure.title("测试连接池熔断后直接失败，不再尝试建连接")
+    def test_pool_fails_fast(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            _refused()
+
+        pool = ConnectionPool(factory, max_size=2,
+                              breaker=CircuitBreaker("db", failure_threshold=3, reset_timeout=60))
+        for _ in range(3):
+            with pytest.raises(pymysql.err.OperationalError):
+                pool.acquire()
+        with pytest.raises(CircuitOpenError):
+            pool.acquire()
+        assert len(attempts) == 3
+        assert pool.stats()["in_use"] == 0
+
+    @allure.title("测试只有连接级别的错误才算数据库不可用")
+    @pytest.mark.parametrize("error, expected", [
+        (pymysql.err.OperationalError(2003, "Can't connect to MySQL server"), True),
+        (pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query"), True),
+        (pymysql.err.InterfaceError(0, ""), True),
+        (pymysql.err.OperationalError(1054, "Unknown column 'x' in 'field list'"), False),
+        (pymysql.err.OperationalError(1205, "Lock wait timeout exceeded"), False),
+        (pymysql.err.OperationalError("Could not acquire snapshot lock"), False),
+        (pymysql.err.ProgrammingError(1064, "You have an error in your SQL syntax"), False),
+    ])
+    def test_is_connection_error(self, error, expected):
+        assert is_connection_error(error) is expected
+
+    @allure.title("测试 SQL / 锁等待错误不会打开熔断器，连接照常复用")
+    def test_query_errors_do_not_trip_breaker(self):
+        conns = []
+
+        def factory():
+            conns.append(_FakeConnection())
+            return conns[-1]
+
+        breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=60)
+        pool = ConnectionPool(factory, max_size=1, breaker=breaker)
+        for code in (1054, 1205):
+            with pytest.raises(pymysql.err.OperationalError):
+                with pool.connection():
+                    raise pymysql.err.OperationalError(code, "server error")
+        assert breaker.state == CLOSED
+        assert len(conns) == 1
+
+        with pytest.raises(pymysql.err.OperationalError):
+            with pool.connection():
+                raise pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+        assert breaker.state == OPEN
+        assert not conns[0].open
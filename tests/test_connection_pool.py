@@ -0,0 +1,156 @@
+import allure
+import pymysql
+import pytest
+from pymysql.constants import SERVER_STATUS
+from database import db_manager
+from database.db_manager import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """假连接：记录 ping / rollback / close，ping_ok=False 模拟被服务端断开的连接"""
+
+    def __init__(self):
+        self.open = True
+        self.server_status = 0
+        self.ping_ok = True
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.ping_ok:
+            raise pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status &= ~SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+    def close(self):
+        self.open = False
+
+
+class FakeClock:
+    """替换连接池里的 time.monotonic，让空闲超时 / 最大寿命不用真的等"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def created():
+    return []
+
+
+@pytest.fixture
+def make_pool(created):
+    def factory():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    def make(**options):
+        return ConnectionPool(factory, **options)
+    return make
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(db_manager, "time", fake)
+    return fake
+
+
+@allure.feature("数据库连接池")
+class TestConnectionPool:
+
+    @allure.title("测试池满时借连接等待超时")
+    def test_checkout_timeout_when_exhausted(self, make_pool):
+        pool = make_pool(max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        assert pool.stats()["timeouts"] == 1
+
+        # 归还之后又能借到同一条连接
+        pool.release(conn)
+        assert pool.acquire() is conn
+
+    @allure.title("测试 ping 不通的空闲连接被关掉换新的")
+    def test_replaces_connection_that_fails_ping(self, make_pool, created):
+        pool = make_pool()
+        with pool.connection() as conn:
+            pass
+        conn.ping_ok = False
+
+        with pool.connection() as replacement:
+            assert replacement is not conn
+        assert not conn.open
+        assert len(created) == 2
+        stats = pool.stats()
+        assert stats["health_check_failures"] == 1
+        assert stats["closed"] == 1
+
+    @allure.title("测试空闲超时 / 超过最大寿命的连接被回收")
+    def test_idle_and_lifetime_recycling(self, make_pool, created, clock):
+        pool = make_pool(min_size=0, idle_timeout=10, max_lifetime=100)
+        with pool.connection() as first:
+            pass
+
+        # 空闲超过 idle_timeout：借的时候丢掉，建一条新的
+        clock.now += 11
+        with pool.connection() as second:
+            assert second is not first
+        assert not first.open
+
+        # 超过 max_lifetime：归还时直接关闭，不回到空闲栈
+        with pool.connection() as conn:
+            clock.now += 101
+        assert conn is second and not conn.open
+        assert pool.stats()["idle"] == 0
+
+        # prune() 回收空闲超时的连接
+        with pool.connection() as third:
+            pass
+        clock.now += 11
+        assert pool.prune() == 1
+        assert not third.open
+        assert len(created) == 3
+
+    @allure.title("测试 prune() 至少保留 min_size 条连接")
+    def test_prune_keeps_min_size(self, make_pool, clock):
+        pool = make_pool(min_size=1, idle_timeout=10)
+        pool.warmup()
+        clock.now += 11
+        assert pool.prune() == 0
+        assert pool.stats()["idle"] == 1
+
+    @allure.title("测试归还时回滚没提交的事务")
+    def test_rollback_on_release_in_transaction(self, make_pool):
+        pool = make_pool()
+        with pool.connection() as conn:
+            conn.server_status |= SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        assert conn.rollbacks == 1
+        assert conn.open
+
+        # 没有事务时不回滚
+        with pool.connection() as conn:
+            pass
+        assert conn.rollbacks == 1
+
+    @allure.title("测试 close() 关闭所有空闲连接，借出的连接归还后照常回收")
+    def test_close(self, make_pool):
+        pool = make_pool(max_size=3)
+        idle = [pool.acquire(), pool.acquire()]
+        borrowed = pool.acquire()
+        for conn in idle:
+            pool.release(conn)
+
+        pool.close()
+        assert not any(conn.open for conn in idle)
+        assert borrowed.open
+        stats = pool.stats()
+        assert (stats["idle"], stats["in_use"], stats["closed"]) == (0, 1, 2)
+
+        pool.release(borrowed)
+        assert pool.stats()["in_use"] == 0
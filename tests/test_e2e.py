@@ -2,6 +2,7 @@ import pytest
 import requests
 import allure  
 from scraper import run_scraper
+from database.catalog_changes import content_digest
 
 @allure.feature("SauceMall 全链路测试")
 class TestSauceMallE2E:
@@ -44,4 +45,12 @@ class TestSauceMallE2E:
                     assert name in api_dict
                     assert price == api_dict[name]
 
+        with allure.step("Step 4: 校验快照摘要 (不用下载全量数据)"):
+            print("🚀 Step 4: 校验快照摘要...")
+            # 之后再做一致性校验时，只要比对这一个摘要；不一致再用 /api/products/changes 拉增量定位
+            digest = requests.get("http://127.0.0.1:5000/api/products/digest").json()['data']
+            allure.attach(str(digest), name="快照摘要", attachment_type=allure.attachment_type.TEXT)
+            assert digest['item_count'] == len(scraped_data)
+            assert digest['digest'] == content_digest(scraped_data)
+
         print("🎉🎉🎉 全链路测试通过！")
\ No newline at end of file
@@ -0,0 +1,43 @@
+import allure
+from utils.logger import Sampler, _level_filter, _min_level, logger
+
+
+def _emit(module, level, message):
+    """以指定模块的名义打一条日志 (过滤器按 record["name"] 的模块前缀匹配)"""
+    logger.patch(lambda record: record.update(name=module)).log(level, message)
+
+
+@allure.feature("日志")
+class TestLogger:
+
+    @allure.title("测试采样器：按比例放行，rate>=1 全放行，rate<=0 全拦截")
+    def test_sampler(self):
+        sample = Sampler(0.25)
+        assert [sample() for _ in range(8)] == [True, False, False, False] * 2
+        assert all(Sampler(1)() for _ in range(5))
+        assert not any(Sampler(0)() for _ in range(5))
+
+    @allure.title("测试 LOG_LEVELS：按模块覆盖日志级别")
+    def test_module_levels(self, monkeypatch):
+        monkeypatch.setenv("LOG_LEVELS", "app=WARNING, database.db_manager=debug,,broken")
+        levels = _level_filter("INFO")
+        assert levels == {"": "INFO", "app": "WARNING", "database.db_manager": "DEBUG"}
+        # sink 级别取所有模块里最低的，DEBUG 日志才能到达 database 的过滤器
+        assert _min_level("INFO") == logger.level("DEBUG").no
+
+        lines = []
+        sink = logger.add(lines.append, format="{name}:{level}:{message}",
+                          level=_min_level("INFO"), filter=levels)
+        try:
+            _emit("app", "INFO", "dropped")
+            _emit("app", "WARNING", "kept")
+            _emit("database.db_manager", "DEBUG", "kept")
+            _emit("database.migrations", "DEBUG", "dropped")
+            _emit("scraper", "INFO", "kept")
+        finally:
+            logger.remove(sink)
+        assert [line.strip() for line in lines] == [
+            "app:WARNING:kept",
+            "database.db_manager:DEBUG:kept",
+            "scraper:INFO:kept",
+        ]
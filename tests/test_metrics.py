@@ -0,0 +1,74 @@
+import allure
+from utils.metrics import MultiprocessExporter, Registry, collect, mark_process_dead, timed
+
+
+@allure.feature("监控指标")
+class TestMetrics:
+
+    @allure.title("测试 Counter / Gauge 的文本输出格式")
+    def test_render_counter_and_gauge(self):
+        registry = Registry()
+        requests = registry.counter("demo_requests_total", "Requests", ["route"])
+        requests.inc(route="/api/products")
+        requests.inc(2, route="/api/products")
+        registry.gauge("demo_pool_in_use", "Connections in use", fn=lambda: 3)
+
+        text = registry.render()
+        assert "# TYPE demo_requests_total counter" in text
+        assert 'demo_requests_total{route="/api/products"} 3' in text
+        assert "demo_pool_in_use 3" in text
+
+    @allure.title("测试 Histogram 的累积桶")
+    def test_histogram_buckets(self):
+        registry = Registry()
+        latency = registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            latency.observe(value)
+
+        text = registry.render()
+        assert 'demo_seconds_bucket{le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{le="1"} 2' in text
+        assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+        assert "demo_seconds_count 3" in text
+
+    @allure.title("测试 timed 装饰器和同名指标只注册一次")
+    def test_timed_and_get_or_create(self):
+        registry = Registry()
+        hist = registry.histogram("demo_op_seconds", "Op", ["op"])
+        assert registry.histogram("demo_op_seconds", "Op", ["op"]) is hist
+
+        @timed(hist, op="work")
+        def work():
+            return 42
+
+        assert work() == 42
+        assert work() == 42
+        assert hist.count(op="work") == 2
+
+    @allure.title("测试多 worker 指标汇总：计数累加、退出的 worker 计数保留、Gauge 按 worker 输出")
+    def test_multiprocess_aggregation(self, tmp_path):
+        exporters = {}
+        for worker, hits in (("101", 1), ("102", 2)):
+            registry = Registry()
+            registry.counter("demo_requests_total", "Requests", ["route"]).inc(hits, route="/api/products")
+            registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1)).observe(0.05 * hits)
+            registry.gauge("demo_circuit_state", "Circuit", fn=lambda hits=hits: hits - 1)
+            exporters[worker] = MultiprocessExporter(str(tmp_path), registry=registry, worker=worker).start()
+
+        # 不管请求落到哪个 worker，看到的都是汇总后的同一份数字
+        for exporter in exporters.values():
+            text = exporter.render()
+            assert 'demo_requests_total{route="/api/products"} 3' in text
+            assert 'demo_seconds_bucket{le="0.1"} 2' in text
+            assert "demo_seconds_count 2" in text
+            assert 'demo_circuit_state{worker="101"} 0' in text
+            assert 'demo_circuit_state{worker="102"} 1' in text
+
+        # worker 102 退出：它的计数保留 (总数不倒退)，Gauge 不再输出
+        exporters["102"].stop()
+        mark_process_dead(str(tmp_path), "102")
+        text = exporters["101"].render()
+        assert 'demo_requests_total{route="/api/products"} 3' in text
+        assert 'worker="102"' not in text
+        exporters["101"].stop()
+        assert collect(str(tmp_path)) == text
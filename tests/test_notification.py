@@ -0,0 +1,99 @@
+import json
+import time
+import allure
+from change_detector import diff_snapshots
+from utils.notification import NOTIFICATION_DELIVERY_SECONDS, NOTIFICATIONS, NotificationDispatcher, NotificationQueue
+
+
+@allure.feature("通知队列")
+class TestNotificationQueue:
+
+    @allure.title("测试通知合并：一个周期的大量变动只发一张卡片")
+    def test_dispatcher_coalesces(self, tmp_path):
+        sent = []
+        notifier = NotificationQueue(
+            webhook_url="http://example.invalid/hook", spool_dir=str(tmp_path),
+            sender=lambda *args, **kwargs: sent.append(args) or True,
+        ).start()
+        dispatcher = NotificationDispatcher(notifier=notifier, max_lines=5)
+        previous = {f"p{i}": {"name": f"p{i}", "price": 10.0} for i in range(1000)}
+        current = [{"name": f"p{i}", "price": 11.0} for i in range(1000)]
+        dispatcher.extend(diff_snapshots(previous, current).events)
+
+        assert dispatcher.flush() is True
+        notifier.close(timeout=5)
+        assert len(sent) == 1
+        assert "其余 995 条省略" in sent[0][2]
+
+    @allure.title("测试通知队列：发送失败的消息写入磁盘，重启后补发")
+    def test_queue_spools_undelivered(self, tmp_path):
+        failing = NotificationQueue(
+            webhook_url="http://example.invalid/hook", spool_dir=str(tmp_path), max_retries=0,
+            sender=lambda *args, **kwargs: False,
+        ).start()
+        assert failing.enqueue("title", "body") is True
+        failing.close(timeout=5)
+        assert failing.stats()["failed"] == 1
+        assert len(list(tmp_path.glob("*.json"))) == 1
+
+        sent = []
+        restarted = NotificationQueue(
+            webhook_url="http://example.invalid/hook", spool_dir=str(tmp_path),
+            sender=lambda *args, **kwargs: sent.append(args) or True,
+        ).start()
+        restarted.close(timeout=5)
+        assert [args[1] for args in sent] == ["title"]
+        assert not list(tmp_path.glob("*.json"))
+
+    @allure.title("测试通知队列：超过尝试次数 / 存活时间的消息移入死信文件，不再补发")
+    def test_queue_dead_letters_undeliverable(self, tmp_path):
+        sent = []
+
+        def start_queue(**overrides):
+            return NotificationQueue(
+                webhook_url="http://example.invalid/hook", spool_dir=str(tmp_path), max_retries=0,
+                sender=lambda *args, **kwargs: sent.append(args) and False, **overrides,
+            ).start()
+
+        first = start_queue(max_attempts=2)
+        first.enqueue("title", "body")
+        first.close(timeout=5)
+        assert len(list(tmp_path.glob("*.json"))) == 1
+
+        # 第二次启动补发仍然失败：累计 2 次，进死信文件
+        second = start_queue(max_attempts=2)
+        second.close(timeout=5)
+        assert len(sent) == 2
+        assert second.stats()["dead_lettered"] == 1
+        assert not list(tmp_path.glob("*.json"))
+        dead = [json.loads(line) for line in (tmp_path / "dead_letter.jsonl").read_text(encoding="utf-8").splitlines()]
+        assert [(m["title"], m["attempts"]) for m in dead] == [("title", 2)]
+
+        # 磁盘里放太久的消息启动时直接进死信文件，不再发送
+        (tmp_path / "1_old.json").write_text(json.dumps({
+            "title": "old", "text": "body", "options": {}, "enqueued_at": time.time() - 7200, "attempts": 1,
+        }), encoding="utf-8")
+        third = start_queue(max_age=3600)
+        third.close(timeout=5)
+        assert len(sent) == 2
+        assert third.stats()["dead_lettered"] == 1
+        assert len((tmp_path / "dead_letter.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+
+    @allure.title("测试通知队列指标：每次投递结果都计数，送达耗时进直方图")
+    def test_queue_metrics(self, tmp_path):
+        outcomes = ("enqueued", "delivered", "failed", "retried", "spooled")
+        before = {outcome: NOTIFICATIONS.value(outcome=outcome) for outcome in outcomes}
+        latencies = NOTIFICATION_DELIVERY_SECONDS.count()
+        results = iter([False, True, False, False])
+
+        notifier = NotificationQueue(
+            webhook_url="http://example.invalid/hook", spool_dir=str(tmp_path), max_retries=1,
+            sender=lambda *args, **kwargs: next(results),
+        ).start()
+        notifier.enqueue("ok after retry", "body")
+        notifier.enqueue("never delivered", "body")
+        notifier.close(timeout=10)
+
+        delta = {outcome: NOTIFICATIONS.value(outcome=outcome) - before[outcome] for outcome in outcomes}
+        assert delta == {"enqueued": 2, "delivered": 1, "failed": 1, "retried": 2, "spooled": 1}
+        assert NOTIFICATION_DELIVERY_SECONDS.count() == latencies + 1
@@ -0,0 +1,138 @@
+import threading
+import time
+import allure
+import pytest
+import pipeline
+from pipeline import PipelineError, SnapshotPipeline
+
+
+class FakeWriter:
+    """假的 SnapshotWriter：write() 可以被 gate 卡住 (模拟慢数据库) 或者直接抛错"""
+
+    def __init__(self, gate=None, fail=None):
+        self.gate = gate
+        self.fail = fail
+        self.writing = threading.Event()
+        self.rows = []
+        self.committed = False
+        self.aborted = False
+
+    def __call__(self, db, run_id=None, chunk_size=None):
+        return self
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def begin(self):
+        pass
+
+    def write(self, products):
+        self.writing.set()
+        if self.fail is not None:
+            raise self.fail
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.rows.extend(products)
+
+    def commit(self):
+        self.committed = True
+        return 7
+
+    def abort(self):
+        self.aborted = True
+
+
+def _start(monkeypatch, writer, queue_size=1):
+    monkeypatch.setattr(pipeline, "SnapshotWriter", writer)
+    return SnapshotPipeline(db=object(), batch_size=1, flush_interval=0.05, queue_size=queue_size).start()
+
+
+def _produce(pipe, items):
+    """后台生产者线程，返回 (线程, 它抛出的异常列表)"""
+    errors = []
+
+    def run():
+        try:
+            for item in items:
+                pipe.put(item)
+        except PipelineError as e:
+            errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+
+@allure.feature("流式入库管道")
+class TestSnapshotPipeline:
+
+    @allure.title("测试背压：写库跟不上时队列被塞满，put() 阻塞")
+    def test_put_blocks_when_queue_full(self, monkeypatch):
+        gate = threading.Event()
+        writer = FakeWriter(gate=gate)
+        pipe = _start(monkeypatch, writer)
+
+        # 写库线程卡在第 1 条，队列里放着第 2 条，第 3 条只能等
+        producer, errors = _produce(pipe, [{"name": "a"}, {"name": "b"}, {"name": "c"}])
+        assert writer.writing.wait(2)
+        time.sleep(0.2)
+        assert producer.is_alive()
+        assert pipe.produced == 2
+        assert pipe.backpressure_waits >= 1
+
+        gate.set()
+        producer.join(2)
+        assert not producer.is_alive() and not errors
+        assert pipe.finish() == 7
+        assert writer.committed
+        assert [row["name"] for row in writer.rows] == ["a", "b", "c"]
+
+    @allure.title("测试写库线程出错：put() / finish() 抛 PipelineError，影子表被丢弃")
+    def test_writer_error_surfaces(self, monkeypatch):
+        writer = FakeWriter(fail=RuntimeError("disk full"))
+        pipe = _start(monkeypatch, writer)
+
+        pipe.put({"name": "a"})
+        pipe._thread.join(2)
+        assert writer.aborted
+        with pytest.raises(PipelineError, match="disk full"):
+            pipe.put({"name": "b"})
+        with pytest.raises(PipelineError, match="disk full"):
+            pipe.finish()
+        assert not writer.committed
+
+    @allure.title("测试写库线程出错时，阻塞在 put() 里的生产者被唤醒")
+    def test_writer_error_unblocks_producer(self, monkeypatch):
+        gate = threading.Event()
+        writer = FakeWriter(gate=gate)
+        pipe = _start(monkeypatch, writer)
+
+        producer, errors = _produce(pipe, [{"name": str(i)} for i in range(10)])
+        assert writer.writing.wait(2)
+        writer.fail = RuntimeError("connection lost")
+        gate.set()
+
+        producer.join(3)
+        assert not producer.is_alive()
+        assert len(errors) == 1 and "connection lost" in str(errors[0])
+        assert writer.aborted and not writer.committed
+
+    @allure.title("测试 abort()：放弃影子表，阻塞中的生产者退出，不交换快照")
+    def test_abort_drops_staging_and_unblocks_producer(self, monkeypatch):
+        gate = threading.Event()
+        writer = FakeWriter(gate=gate)
+        pipe = _start(monkeypatch, writer)
+
+        producer, errors = _produce(pipe, [{"name": str(i)} for i in range(10)])
+        assert writer.writing.wait(2)
+        aborting = threading.Thread(target=pipe.abort, daemon=True)
+        aborting.start()
+        time.sleep(0.1)
+        gate.set()
+
+        aborting.join(3)
+        producer.join(3)
+        assert not aborting.is_alive() and not producer.is_alive()
+        assert [str(e) for e in errors] == ["管道已关闭"]
+        assert writer.aborted and not writer.committed
+        assert pipe.version is None
@@ -0,0 +1,15 @@
+import allure
+from utils.rate_limit import TokenBucket
+
+
+@allure.feature("限流")
+class TestRateLimit:
+
+    @allure.title("测试令牌桶：突发额度用完后拿不到令牌")
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=0.001, capacity=2)
+
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert not bucket.acquire(timeout=0.01)
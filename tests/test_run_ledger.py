@@ -0,0 +1,41 @@
+import json
+import allure
+from run_ledger import ScrapeRun, summarize, percentile, SUCCESS, SCRAPE_FAILED
+
+
+@allure.feature("抓取台账")
+class TestRunLedger:
+
+    @allure.title("测试阶段计时和台账行格式")
+    def test_run_to_row(self):
+        run = ScrapeRun("a" * 32, source="scraper", username="standard_user")
+        with run.phase("login"):
+            pass
+        with run.phase("extraction"):
+            pass
+        row = run.finish(SUCCESS, item_count=6, bytes_transferred=1024, snapshot_version=7).to_row()
+
+        assert row["status"] == SUCCESS
+        assert row["item_count"] == 6
+        assert row["snapshot_version"] == 7
+        assert set(json.loads(row["phases"])) == {"login", "extraction"}
+        assert row["finished_at"] >= row["started_at"]
+
+    @allure.title("测试分位数汇总只统计成功的抓取")
+    def test_summarize_percentiles(self):
+        runs = [
+            {"status": SUCCESS, "duration_ms": ms, "phases": {"login": ms / 2000},
+             "item_count": 6, "bytes_transferred": 100}
+            for ms in range(1000, 11000, 1000)
+        ]
+        runs.append({"status": SCRAPE_FAILED, "duration_ms": 1, "phases": {},
+                     "item_count": 0, "bytes_transferred": 0})
+        summary = summarize(runs)
+
+        assert summary["runs"] == 11
+        assert summary["status_counts"] == {SCRAPE_FAILED: 1, SUCCESS: 10}
+        assert summary["duration_seconds"]["p50"] == 5.0
+        assert summary["duration_seconds"]["p90"] == 9.0
+        assert summary["duration_seconds"]["max"] == 10.0
+        assert summary["phases_seconds"]["login"]["p50"] == 2.5
+        assert percentile([], 50) is None
@@ -0,0 +1,132 @@
+import asyncio
+import allure
+import pytest
+import scrape_daemon
+from run_ledger import SUCCESS
+from scrape_daemon import ScrapeDaemon
+
+
+class StubPolicy:
+    allowed = 0
+    bytes_received = 0
+
+
+class StubEngine:
+    """替代 ScrapeEngine：不启动浏览器，run_batch 可以变慢或者抛错；fail_starts 控制第几次 start() 失败"""
+    started = []
+    fail_starts = ()
+    batch_delay = 0.0
+    batch_error = None
+
+    def __init__(self, known_details=None):
+        self.known_details = known_details
+        self.policy = StubPolicy()
+        self.closed = False
+
+    async def start(self):
+        StubEngine.started.append(self)
+        if len(StubEngine.started) in StubEngine.fail_starts:
+            raise RuntimeError("chromium failed to launch")
+
+    async def close(self):
+        self.closed = True
+
+    async def run_batch(self, jobs):
+        await asyncio.sleep(StubEngine.batch_delay)
+        if StubEngine.batch_error is not None:
+            raise StubEngine.batch_error
+        return []
+
+
+class StubDB:
+    def migrate(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    monkeypatch.setattr(StubEngine, "started", [])
+    monkeypatch.setattr(scrape_daemon, "ScrapeEngine", StubEngine)
+    monkeypatch.setattr(scrape_daemon, "DBManager", StubDB)
+    monkeypatch.setattr(scrape_daemon, "load_previous_snapshot", lambda: {})
+    monkeypatch.setattr(scrape_daemon, "jobs_from_env", lambda: [])
+    monkeypatch.setattr(scrape_daemon, "record_run", lambda run, db: None)
+    monkeypatch.setattr(scrape_daemon, "_process_tree_rss_mb", lambda: 100.0)
+    monkeypatch.delenv("DAEMON_METRICS_PORT", raising=False)
+
+    daemon = ScrapeDaemon(interval=0.05, jitter=0, recycle_cycles=3, recycle_rss_mb=1024)
+    daemon._persist = lambda results, run_id: dict(status=SUCCESS, item_count=0)
+    return daemon
+
+
+def _cycles(daemon, count, start=True):
+    """不走主循环，直接连着跑 count 个周期"""
+    async def run():
+        daemon._stop = asyncio.Event()
+        if start:
+            await daemon._start_engine()
+        for _ in range(count):
+            await daemon._cycle()
+    asyncio.run(run())
+
+
+@allure.feature("抓取守护进程")
+class TestScrapeDaemon:
+
+    @allure.title("测试上一个周期没跑完时跳过本次触发，不叠加执行")
+    def test_skip_on_overlap(self, daemon, monkeypatch):
+        monkeypatch.setattr(StubEngine, "batch_delay", 0.3)
+
+        async def run():
+            asyncio.get_running_loop().call_later(0.45, daemon.stop)
+            await daemon.run()
+        asyncio.run(run())
+
+        assert daemon.skipped >= 3
+        # 退出时等当前周期跑完：两个周期都完整结束，没有并发执行
+        assert daemon.cycles == 2
+        assert len(StubEngine.started) == 1 and StubEngine.started[0].closed
+
+    @allure.title("测试跑满 N 个周期后重启浏览器")
+    def test_recycle_after_cycles(self, daemon):
+        _cycles(daemon, 7)
+
+        assert daemon.recycles == 2
+        assert len(StubEngine.started) == 3
+        assert [engine.closed for engine in StubEngine.started] == [True, True, False]
+        assert daemon._engine_cycles == 1
+
+    @allure.title("测试失败的周期也计入重启周期数")
+    def test_failed_cycles_count_towards_recycle(self, daemon, monkeypatch):
+        monkeypatch.setattr(StubEngine, "batch_error", RuntimeError("target site down"))
+        _cycles(daemon, 3)
+
+        assert daemon.failures == 3
+        assert daemon.recycles == 1
+
+    @allure.title("测试浏览器内存超过阈值时重启")
+    def test_recycle_on_rss(self, daemon, monkeypatch):
+        monkeypatch.setattr(scrape_daemon, "_process_tree_rss_mb", lambda: 2048.0)
+        _cycles(daemon, 1)
+
+        assert daemon.recycles == 1
+        assert len(StubEngine.started) == 2
+        assert StubEngine.started[0].closed
+
+    @allure.title("测试重启浏览器失败：守护进程不退出，下个周期开头重新拉起浏览器")
+    def test_failed_restart(self, daemon, monkeypatch):
+        monkeypatch.setattr(StubEngine, "fail_starts", (2,))
+        daemon.recycle_cycles = 1
+        _cycles(daemon, 1)
+
+        assert daemon.recycles == 1
+        assert daemon.engine is None
+
+        daemon.recycle_cycles = 100
+        _cycles(daemon, 1, start=False)
+        assert daemon.engine is StubEngine.started[2]
+        assert daemon.cycles == 2 and daemon.failures == 0
+
@@ -0,0 +1,28 @@
+import asyncio
+import allure
+from detail_crawler import DetailCrawler
+from scrape_engine import JobResult, ScrapeEngine, ScrapeJob
+
+
+@allure.feature("异步抓取引擎")
+class TestDetailBudget:
+
+    @allure.title("测试详情抓取超时：保留列表结果和已补上的详情，统计标记 timed_out")
+    def test_detail_timeout_keeps_listing(self, monkeypatch):
+        async def slow_crawl(self, context, products, inventory_url=None):
+            products[0]["description"] = "carry.allTheThings()"
+            self.fetched += 1
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(DetailCrawler, "crawl", slow_crawl)
+        engine = ScrapeEngine(reuse_sessions=False)
+        job = ScrapeJob("standard_user", crawl_details=True, detail_timeout=0.05)
+        result = JobResult(job, products=[{"name": "Sauce Labs Backpack", "price": 29.99, "item_id": "4"}])
+
+        keep_context = asyncio.run(engine._crawl_details(job, context=None, result=result))
+
+        assert keep_context is False
+        assert result.ok
+        assert result.products[0]["description"] == "carry.allTheThings()"
+        assert result.detail_stats["timed_out"] is True
+        assert result.detail_stats["fetched"] == 1
@@ -0,0 +1,113 @@
+import contextlib
+
+import allure
+import pytest
+
+import app as api
+from database import snapshot_publish
+from utils.cache import ResponseCache, VersionTracker
+
+ROWS = [
+    {"id": 1, "name": "Sauce Labs Bike Light", "price": 9.99},
+    {"id": 2, "name": "Sauce Labs Backpack", "price": 29.99},
+]
+
+
+class FakeCursor:
+    """按顺序返回预设的发布标记 (序号, 版本号)，其余查询返回 ROWS"""
+
+    def __init__(self, states):
+        self.states = list(states)
+        self.last = None
+
+    def execute(self, sql, params=None):
+        self.last = sql
+
+    def fetchone(self):
+        seq, version = self.states.pop(0)
+        return {"seq": seq, "version": version}
+
+    def fetchall(self):
+        return [dict(row) for row in ROWS]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, *args):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+
+class FakePool:
+    breaker = None
+
+    def __init__(self, states):
+        self.cursor = FakeCursor(states)
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield FakeConnection(self.cursor)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "response_cache", ResponseCache())
+    monkeypatch.setattr(api, "snapshot_version", VersionTracker(lambda: 3, interval=60))
+
+    def serve(states, path):
+        monkeypatch.setattr(api, "get_pool", lambda: FakePool(states))
+        return api.app.test_client().get(path)
+    return serve
+
+
+@allure.feature("快照发布")
+class TestSnapshotReads:
+
+    @allure.title("测试发布标记：前后一致且序号为偶数才算稳定")
+    def test_is_stable(self):
+        assert snapshot_publish.is_stable((4, 3), (4, 3))
+        assert not snapshot_publish.is_stable((5, 3), (5, 3))
+        assert not snapshot_publish.is_stable((4, 3), (6, 3))
+        assert not snapshot_publish.is_stable((None, 3), (None, 3))
+
+    @allure.title("测试读的过程中快照被换上又换回：结果不缓存、不发 ETag")
+    def test_swap_back_during_read_is_not_cached(self, client):
+        # 读之前序号 4，读的过程中 begin (5) 换表，发布失败换回旧快照 end (6)，版本号一直是 3
+        response = client([(4, 3), (6, 3)], "/api/products")
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "BYPASS"
+        assert "ETag" not in response.headers
+        assert api.response_cache.stats()["entries"] == 0
+
+        # 之后的读取是稳定的，才按版本 3 缓存
+        response = client([(6, 3), (6, 3)], "/api/products")
+        assert response.headers["X-Cache"] == "MISS"
+        assert "ETag" in response.headers
+        assert api.response_cache.stats()["entries"] == 1
+
+    @allure.title("测试翻页请求遇到发布中的快照：503 + Retry-After")
+    def test_paginated_read_during_publish(self, client):
+        response = client([(5, 3), (5, 3)], "/api/products?limit=1")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert api.response_cache.stats()["entries"] == 0
+
+    @allure.title("测试版本号跟踪器还没跟上新版本：按实际读到的版本发游标、校验旧游标")
+    def test_cursor_uses_live_version(self, client):
+        response = client([(6, 4), (6, 4)], "/api/products?limit=1")
+        assert response.get_json()["next_after"] == "4:1"
+
+        response = client([(6, 4), (6, 4)], "/api/products?limit=1&after=3:1")
+        assert response.status_code == 410
+        assert response.get_json()["version"] == 4
@@ -0,0 +1,102 @@
+import allure
+import pymysql
+from database.db_manager import DBManager
+
+SWAP = "RENAME TABLE products TO products_old, products_staging TO products"
+SWAP_BACK = "RENAME TABLE products TO products_staging, products_old TO products"
+PUBLISH_BEGIN = "UPDATE snapshot_publish SET seq = seq + IF(seq % 2 = 0, 1, 2) WHERE id = 1"
+PUBLISH_END = "UPDATE snapshot_publish SET seq = seq + 1 WHERE id = 1"
+
+
+class FakeConnection:
+    """记录执行过的 SQL；执行到包含 fail_on / fail_also 的语句时抛出 OperationalError"""
+    def __init__(self, fail_on=None, fail_also=None):
+        self.fail_on = [s for s in (fail_on, fail_also) if s]
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+class FakeCursor:
+    rowcount = 0
+    lastrowid = 7
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if any(s in sql for s in self.conn.fail_on):
+            raise pymysql.OperationalError(1205, "Lock wait timeout exceeded")
+        self.conn.log.append(sql)
+        self._row = {"locked": 1, "item_count": 1, "xor_hash": 0}
+
+    def executemany(self, sql, rows):
+        self.conn.log.append(" ".join(sql.split()))
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        return []
+
+
+def _save(fail_on=None, fail_also=None):
+    db = DBManager()
+    db.conn = FakeConnection(fail_on, fail_also)
+    version = db.save_product([{"name": "Sauce Labs Backpack", "price": 29.99}])
+    return version, db.conn.log
+
+
+@allure.feature("快照写入")
+class TestSnapshotWriter:
+
+    @allure.title("测试正常发布：交换后的写入一起提交，提交之后才删除旧快照")
+    def test_publish(self):
+        version, log = _save()
+
+        assert version == 7
+        swapped = log.index(SWAP)
+        assert log.index("COMMIT", swapped) < log.index("DROP TABLE products_old")
+        assert SWAP_BACK not in log
+        # "发布中"标记在换表之前提交，和版本号在同一个事务里结束
+        assert log.index(PUBLISH_BEGIN) < log.index("COMMIT", log.index(PUBLISH_BEGIN)) < swapped
+        bumped = next(i for i, sql in enumerate(log) if sql.startswith("INSERT INTO snapshot_versions"))
+        assert swapped < bumped < log.index(PUBLISH_END) < log.index("COMMIT", swapped)
+
+    @allure.title("测试交换之后的发布步骤失败：回滚并把旧快照换回来")
+    def test_publish_failure_swaps_back(self):
+        version, log = _save(fail_on="INSERT IGNORE INTO catalog_changes")
+
+        assert version is None
+        swapped = log.index(SWAP)
+        swapped_back = log.index(SWAP_BACK)
+        assert log.index("ROLLBACK", swapped) < swapped_back
+        # 没有提交版本号，旧快照也没有被删
+        assert "COMMIT" not in log[swapped:swapped_back]
+        assert "DROP TABLE products_old" not in log
+        # 旧快照换回来之后才结束"发布中"：换表窗口里 API 读到的数据都没有进缓存
+        assert PUBLISH_END not in log[:swapped_back]
+        assert log[swapped_back + 1:swapped_back + 3] == [PUBLISH_END, "COMMIT"]
+
+    @allure.title("测试换回旧快照失败：发布标记停在发布中，API 不会缓存没有版本号的数据")
+    def test_swap_back_failure_keeps_marker(self):
+        version, log = _save(fail_on="INSERT IGNORE INTO catalog_changes", fail_also="products_staging, products_old")
+
+        assert version is None
+        assert PUBLISH_BEGIN in log
+        assert PUBLISH_END not in log
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.logger import logger
+
+try:
+    # 可选依赖：配置了 CACHE_REDIS_URL 时，多个 API worker 共享一份缓存
+    import redis
+except ImportError:  # pragma: no cover - 没装 redis 时只用进程内缓存
+    redis = None
+
+
+class ResponseCache:
+    """
+    进程内响应缓存 (LRU + TTL + 内存上限)
+    面试亮点：商品数据一天只变几次 (每次爬虫入库)，但 /api/products 每秒被请求很多次。
+    缓存 key 里带上"快照版本号"：爬虫写入新快照 -> 版本号 +1 -> 旧 key 自然不再命中，
+    不需要主动删除缓存，也就不存在"删缓存和写数据库谁先谁后"的一致性问题。
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300.0, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # 单条缓存最大占总容量的 1/8，防止一个超大结果把其它热点全挤出去
+        self.max_entry_bytes = max_bytes // 8
+        self.shared = shared
+
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 命中率统计
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """读缓存，未命中返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    # LRU：被访问的 key 挪到队尾 (最近使用)
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        # 本地没有，再看共享缓存 (其它 worker 可能已经查过了)
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_stale(self, key):
+        """
+        读缓存，过期了也返回 (只看本进程)
+        数据库不可用时的降级：宁可返回上一份快照，也比直接报错强；
+        过期的 key 只有在被 get() 访问到或者被 LRU 挤出去时才会删除，所以通常还在。
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """写缓存，value 必须是 bytes (序列化好的响应体)"""
+        if len(value) > self.max_entry_bytes:
+            return
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_hits": self.stale_hits,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+                "shared": self.shared is not None,
+            }
+
+    def _store(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._bytes += len(value)
+            # 超过条数或内存上限，从最久没用的开始淘汰
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        # 调用方已持有 self._lock
+        value, _ = self._data.pop(key)
+        self._bytes -= len(value)
+
+
+class SharedCache:
+    """
+    基于 Redis 的共享缓存层 (可选)
+    Redis 出问题时只记日志、当作未命中，绝不影响接口本身。
+    """
+    def __init__(self, url, prefix="saucemall:cache:"):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            return self.client.get(self.prefix + repr(key))
+        except redis.RedisError as e:
+            logger.warning(f"Shared cache get failed: {e}")
+            return None
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.set(self.prefix + repr(key), value, ex=max(int(ttl), 1))
+        except redis.RedisError as e:
+            logger.warning(f"Shared cache set failed: {e}")
+
+
+class VersionTracker:
+    """
+    快照版本号跟踪器
+    每个请求都去数据库查版本号也是一次往返，这里最多每 interval 秒查一次，
+    代价是新快照最多延迟 interval 秒才被 API 看到。
+    """
+    def __init__(self, loader, interval=1.0):
+        # loader: 无参函数，返回当前快照版本号 (查不到返回 None)
+        self._loader = loader
+        self.interval = interval
+        self._version = None
+        # 最近一次查到的版本号 (数据库不可用时 current() 返回 None，降级逻辑用它找旧缓存)
+        self.last_known = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return self._version
+        with self._lock:
+            # 双重检查：并发请求只让一个去查数据库
+            if now - self._checked_at >= self.interval:
+                self._version = self._loader()
+                self._checked_at = time.monotonic()
+                if self._version is not None:
+                    self.last_known = self._version
+        return self._version
+
+    def invalidate(self):
+        """同进程里刚写完新快照时调用，下一次 current() 立刻重新查询"""
+        with self._lock:
+            self._checked_at = 0.0
+
+
+def build_response_cache():
+    """根据环境变量创建响应缓存 (CACHE_MAX_ENTRIES / CACHE_MAX_MB / CACHE_TTL / CACHE_REDIS_URL)"""
+    shared = None
+    redis_url = os.getenv('CACHE_REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning("CACHE_REDIS_URL 已配置但未安装 redis 包，只使用进程内缓存。")
+        else:
+            shared = SharedCache(redis_url)
+    return ResponseCache(
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1024)),
+        max_bytes=int(float(os.getenv('CACHE_MAX_MB', 64)) * 1024 * 1024),
+        ttl=float(os.getenv('CACHE_TTL', 300)),
+        shared=shared,
+    )
@@ -0,0 +1,129 @@
+import threading
+import time
+
+# ===============================
+# 熔断器 (Circuit Breaker)
+# ===============================
+# 数据库挂了的时候，每个 API 请求都去连一次、等到连接超时再报错：
+# 请求线程全被卡住，p99 变成"连接超时时间"，恢复的瞬间还会有一大波重连同时打过去。
+# 熔断器的三个状态：
+#   closed     正常放行，连续失败 failure_threshold 次后进入 open；
+#   open       直接拒绝 (抛 CircuitOpenError，几乎零耗时)，过了 reset_timeout 秒进入 half_open；
+#   half_open  只放一个探测请求过去：成功 -> closed，失败 -> 重新 open 再等 reset_timeout 秒。
+# 面试亮点：熔断 = "快速失败 + 自动恢复"，数据库故障期间 API 的延迟上限由熔断器决定，
+# 而不是由 TCP 连接超时决定；同时只有一个探测请求，不会在数据库刚恢复时把它再打挂。
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    线程安全的熔断器
+    用法:
+        breaker = CircuitBreaker("mysql", failure_threshold=5, reset_timeout=10)
+        breaker.before_call()          # open 状态时抛 CircuitOpenError
+        try:
+            do_io()
+        except ConnectionError:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # half_open 时正在进行的探测请求的开始时间 (None 表示没有)
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        # 调用方已持有 self._lock；open 满 reset_timeout 秒后自动变成 half_open
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    def before_call(self):
+        """
+        调用前检查：放行直接返回，拒绝时抛 CircuitOpenError
+        half_open 状态只放行一个探测请求；探测请求迟迟不回报结果 (比如调用方忘了记录)，
+        超过 reset_timeout 秒后允许下一个探测，避免熔断器永远卡在 half_open。
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and (self._probe_started is None
+                                       or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return
+            self.rejected += 1
+            if state == OPEN:
+                retry_after = self.reset_timeout - (now - self._opened_at)
+            else:
+                retry_after = self.reset_timeout - (now - self._probe_started)
+            raise CircuitOpenError(self.name, max(retry_after, 0.0))
+
+    def record_success(self):
+        # 热路径：正常状态下没有失败记录就不用抢锁
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = now
+                self._probe_started = None
+
+    def retry_after(self):
+        """距离下一次允许探测还有多少秒 (closed 时为 0)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) != OPEN:
+                return 0.0
+            return max(self.reset_timeout - (now - self._opened_at), 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._current_state(time.monotonic()),
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -1,10 +1,60 @@
 from loguru import logger
+import itertools
 import os
 import sys
 
-# 创建 logs 目录
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
+# ===============================
+# 日志配置 (全部可通过环境变量调整)
+# ===============================
+# LOG_LEVEL        控制台级别 (默认 INFO)
+# LOG_FILE_LEVEL   文件级别 (默认 INFO，排查问题时临时调成 DEBUG)
+# LOG_FILE         日志文件路径 (默认 logs/runtime.log，设为空字符串不写文件)
+# LOG_FORMAT       text / json (json 时每行一个 JSON 对象，方便 ELK / Loki 采集)
+# LOG_ENQUEUE      1 / 0：是否异步写日志 (默认 1)
+# LOG_LEVELS       按模块覆盖级别，例如 "app=WARNING,database.db_manager=DEBUG"
+# LOG_ACCESS_SAMPLE 访问日志采样率 (0~1，默认 1 即全部记录)
+#
+# 面试亮点：日志为什么会拖慢接口？
+# 1. 同步 sink：每条日志都在请求线程里做格式化 + write() 系统调用，磁盘一抖请求就跟着抖。
+#    enqueue=True 后请求线程只把消息放进队列，由 loguru 的后台线程负责写出去；
+# 2. f-string 在调用 logger.debug() 之前就已经拼好了，哪怕 DEBUG 级别最终被过滤掉，
+#    拼 SQL / 参数的开销一分不少。改成 logger.debug("SQL: {}", sql) 这种参数形式，
+#    loguru 先判断级别，没有 sink 需要这一级时直接返回，根本不会格式化；
+# 3. 高频的访问日志按比例采样，不需要每个请求都写一行。
+
+LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "runtime.log"))
+SERIALIZE = os.getenv("LOG_FORMAT", "text").lower() == "json"
+ENQUEUE = os.getenv("LOG_ENQUEUE", "1") == "1"
+
+
+def _module_levels():
+    """解析 LOG_LEVELS="app=WARNING,database=DEBUG" -> {"app": "WARNING", "database": "DEBUG"}"""
+    levels = {}
+    for item in os.getenv("LOG_LEVELS", "").split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _level_filter(default_level):
+    """
+    loguru 的字典过滤器：key 是模块名前缀 ("" 表示所有模块)，value 是该模块的最低级别
+    这样一个 sink 里可以让 app 只输出 WARNING，而 database 输出 DEBUG
+    """
+    return {"": default_level, **_module_levels()}
+
+
+def _min_level(default_level):
+    """
+    sink 本身的级别取所有模块级别里最低的那个
+    注意不能直接写 level=0：loguru 会先拿日志级别和所有 sink 的最低级别比较，低于它直接返回，
+    这是"被过滤的日志几乎零开销"的关键，sink 级别设成 0 这个快速路径就失效了
+    """
+    return min(logger.level(level).no for level in _level_filter(default_level).values())
+
 
 # 移除默认的 handler（避免重复打印）
 logger.remove()
@@ -14,20 +64,58 @@ logger.remove()
 logger.add(
     sys.stderr,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+    level=_min_level(LEVEL),
+    filter=_level_filter(LEVEL),
+    serialize=SERIALIZE,
+    enqueue=ENQUEUE,
 )
 
 # 2. 这是一个文件 Handler (File)
 # 作用：把日志存到文件里，跑飞书自动化或者出问题时可以回溯
+# 固定文件名 (不再每次 import 都新建一个 runtime_{time}.log)，由 rotation 负责切割：
 # rotation="500 MB": 单个文件超过 500MB 自动切割
 # retention="10 days": 只保留最近 10 天的日志
-logger.add(
-    os.path.join(log_dir, "runtime_{time}.log"),
-    rotation="500 MB",
-    retention="10 days",
-    encoding="utf-8",
-    level="DEBUG"
-)
+if LOG_FILE:
+    log_dir = os.path.dirname(LOG_FILE)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    logger.add(
+        LOG_FILE,
+        rotation="500 MB",
+        retention="10 days",
+        encoding="utf-8",
+        level=_min_level(FILE_LEVEL),
+        filter=_level_filter(FILE_LEVEL),
+        serialize=SERIALIZE,
+        enqueue=ENQUEUE,
+    )
+
+
+class Sampler:
+    """
+    按比例采样的开关 (用于访问日志这类高频日志)
+    rate=0.01 表示每 100 次调用返回一次 True；rate>=1 每次都返回 True，rate<=0 从不返回 True
+    用法:
+        access_sample = Sampler(0.01)
+        if access_sample():
+            logger.info("收到 API 请求: {}", request.full_path)
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self._every = round(1 / rate) if 0 < rate < 1 else None
+        # itertools.count 的 next() 在 CPython 里是原子的，多线程下不需要加锁
+        self._counter = itertools.count()
+
+    def __call__(self):
+        if self.rate >= 1:
+            return True
+        if self._every is None:
+            return False
+        return next(self._counter) % self._every == 0
+
+
+# 访问日志的默认采样器
+access_sample = Sampler(float(os.getenv("LOG_ACCESS_SAMPLE", 1)))
 
 # 导出 logger 供其他模块使用
-__all__ = ["logger"]
+__all__ = ["logger", "Sampler", "access_sample"]
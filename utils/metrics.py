@@ -0,0 +1,442 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===============================
+# 轻量级指标库 (Prometheus 文本格式)
+# ===============================
+# 没有引入 prometheus_client，几十行就能覆盖我们需要的三种指标：
+#   Counter   只增不减的计数 (请求数、写入行数)
+#   Gauge     可增可减的当前值 (队列长度、上次抓取时间)
+#   Histogram 耗时分布 (请求耗时、SQL 耗时、抓取各阶段耗时)
+# 面试亮点：为什么开销低到可以一直开着？
+# 每次记录只是 "一次字典查找 + 一次 bisect + 几个整数加法"，在一把细粒度锁里完成；
+# 格式化成文本的工作只在 /api/metrics 被抓取时做一次，不在请求路径上。
+
+# 默认的耗时桶 (秒)：覆盖 1ms ~ 30s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + inner + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    指标基类
+    传入 fn 时不用主动记录，每次渲染时调用 fn() 取值 (适合把连接池、缓存现成的统计数字直接导出)
+    """
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _collect(self):
+        """当前所有样本 [(标签值, 值)]；fn 取值失败 (比如数据库连不上) 时返回 None，不输出样本"""
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return None
+            with self._lock:
+                self._values[()] = value
+        with self._lock:
+            return [(key, self._copy_value(value)) for key, value in self._values.items()]
+
+    def _copy_value(self, value):
+        return value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        items = self._collect()
+        if items is not None:
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def snapshot(self):
+        """可 JSON 序列化的快照 (多进程汇总时写文件用)"""
+        return {
+            "type": self.TYPE,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in (self._collect() or [])],
+        }
+
+    def reset(self):
+        """清空记录过的值 (fn 指标每次渲染重新取值，不受影响)"""
+        with self._lock:
+            self._values.clear()
+
+    def _render_samples(self, items):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._add(self._key(labels), amount)
+
+    def _add(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_to_current_time(self, **labels):
+        self.set(time.time(), **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    """
+    耗时分布 (累积桶)
+    用法:
+        REQUEST_SECONDS.observe(0.012, route="/api/products")
+        with REQUEST_SECONDS.time(route="/api/products"):
+            ...
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [每个桶的计数 (非累积，渲染时再累加) + 一个 +Inf 桶, 总和, 总数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """计时上下文管理器 / 装饰器"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _copy_value(self, state):
+        return [list(state[0]), state[1], state[2]]
+
+    def snapshot(self):
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+    def _merge(self, key, state):
+        """把另一个进程的同一组样本 ([桶计数, 总和, 总数]) 累加进来"""
+        counts, total, count = state
+        with self._lock:
+            mine = self._values.get(key)
+            if mine is None:
+                mine = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            mine[0] = [a + b for a, b in zip(mine[0], counts)]
+            mine[1] += total
+            mine[2] += count
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    """Histogram.time() / timed() 返回的对象，既能当 with 用，也能当装饰器用"""
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def timed(histogram, **labels):
+    """
+    计时装饰器 / 上下文管理器
+        @timed(DB_OPERATION_SECONDS, operation="save_product")
+        def save_product(...): ...
+
+        with timed(SCRAPE_PHASE_SECONDS, phase="login"):
+            ...
+    """
+    return _Timer(histogram, labels)
+
+
+class Registry:
+    """指标注册表：同名指标只创建一次 (模块被多次 import / 多个地方声明同一个指标都安全)"""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.TYPE}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=(), fn=None):
+        return self._get_or_create(Counter, name, documentation, labelnames, fn=fn)
+
+    def gauge(self, name, documentation, labelnames=(), fn=None):
+        return self._get_or_create(Gauge, name, documentation, labelnames, fn=fn)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        lines = []
+        for metric in self._all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self):
+        """所有指标的当前值 {指标名: 快照}"""
+        return {metric.name: metric.snapshot() for metric in self._all()}
+
+    def reset(self):
+        """清空所有指标的值 (fork 出来的子进程用：不继承父进程的计数)"""
+        for metric in self._all():
+            metric.reset()
+
+    def merge(self, snapshot, worker=None):
+        """
+        把一个进程的快照合并进来 (多进程汇总)
+        Counter / Histogram 直接累加；Gauge 不能相加 (比如熔断器状态)，加一个 worker 标签按进程分别输出，
+        worker=None 表示这个进程已经退出，它的 Gauge 不再输出
+        """
+        for name, data in snapshot.items():
+            labelnames = tuple(data["labelnames"])
+            if data["type"] == "counter":
+                metric = self.counter(name, data["help"], labelnames)
+                for key, value in data["samples"]:
+                    metric._add(tuple(key), value)
+            elif data["type"] == "histogram":
+                metric = self.histogram(name, data["help"], labelnames, buckets=data["buckets"])
+                for key, state in data["samples"]:
+                    metric._merge(tuple(key), state)
+            elif data["type"] == "gauge" and worker is not None:
+                metric = self.gauge(name, data["help"], labelnames + ("worker",))
+                for key, value in data["samples"]:
+                    metric.set(value, **dict(zip(metric.labelnames, list(key) + [worker])))
+
+
+# 进程内默认注册表
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ===============================
+# 多进程汇总 (gunicorn 多 worker)
+# ===============================
+# 面试亮点：注册表是进程内的，gunicorn 开了多个 worker 时，每次抓取 /api/metrics 落到哪个 worker 是随机的，
+# Prometheus 看到的计数会在几个 worker 之间来回跳，rate() 算出来全是假的"重置"。
+# 做法和 prometheus_client 的 multiprocess 模式一样：每个 worker 定期 (以及每次被抓取时)
+# 把自己的快照写到共享目录 METRICS_MULTIPROC_DIR 下的 <pid>.json，
+# /api/metrics 读出所有文件合并：计数累加 (退出了的 worker 的计数保留，总数不会倒退)，Gauge 按 worker 分开。
+
+DEAD_SUFFIX = ".dead.json"
+
+
+class MultiprocessExporter:
+    """
+    用法 (每个 worker 进程 fork 之后):
+        exporter = MultiprocessExporter(directory).start()
+        text = exporter.render()     # 所有 worker 汇总后的 Prometheus 文本
+        exporter.stop()              # worker 退出时最后写一次
+    """
+    def __init__(self, directory, registry=None, interval=None, worker=None):
+        self.directory = directory
+        self.registry = registry or REGISTRY
+        self.interval = interval if interval is not None else float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+        self.worker = str(worker if worker is not None else os.getpid())
+        self.path = os.path.join(directory, f"{self.worker}.json")
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """写入本进程的快照 (先写临时文件再改名，别的进程读不到写了一半的文件)"""
+        data = self.registry.snapshot()
+        with self._flush_lock:
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(f"{self.path}.tmp", self.path)
+
+    def render(self):
+        self.flush()
+        return collect(self.directory)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except OSError:
+                # 磁盘暂时写不了就等下一轮，本进程的计数还在内存里
+                pass
+
+
+def collect(directory):
+    """合并目录下所有进程的快照，返回 Prometheus 文本"""
+    merged = Registry()
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+    except OSError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        worker = None if name.endswith(DEAD_SUFFIX) else name[:-len(".json")]
+        merged.merge(snapshot, worker=worker)
+    return merged.render()
+
+
+def mark_process_dead(directory, pid):
+    """worker 退出后调用 (gunicorn 的 child_exit 钩子，在 master 里执行)：保留它的计数，不再输出它的 Gauge"""
+    path = os.path.join(directory, f"{pid}.json")
+    try:
+        os.replace(path, os.path.join(directory, f"{pid}{DEAD_SUFFIX}"))
+    except OSError:
+        pass
+
+
+def clear_multiproc_dir(directory):
+    """服务启动时清掉上一次运行留下的快照文件"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """
+    给没有 Web 框架的常驻进程 (抓取守护进程) 开一个 /metrics 端口，后台线程运行
+    """
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # 不往 stderr 打访问日志
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -1,21 +1,56 @@
 import requests
+import atexit
+import json
 import os
+import queue
 import sys
+import threading
+import time
+import uuid
+from collections import deque
+from requests.adapters import HTTPAdapter
+from utils import metrics
 from utils.logger import logger
+from utils.rate_limit import TokenBucket, backoff_delays
 
-def send_feishu_notification(webhook_url, title, text, success=True):
+DEFAULT_FOOTER = "来自 GitHub Actions 自动构建"
+# 连接超时 / 读超时 (秒)：webhook 卡住时最多等这么久，不会把调用方一直挂住
+CONNECT_TIMEOUT = float(os.getenv('NOTIFY_CONNECT_TIMEOUT', 3))
+READ_TIMEOUT = float(os.getenv('NOTIFY_READ_TIMEOUT', 10))
+
+# 通知队列的指标：每条消息的去向 (送达 / 失败 / 重试 / 丢弃 / 写盘 / 死信) 和入队到送达的耗时，
+# 随时能在 /metrics 上看到，而不是等进程退出时 close() 打一行日志
+NOTIFICATIONS = metrics.counter("saucemall_notifications_total", "Notification queue events by outcome", ["outcome"])
+NOTIFICATION_DELIVERY_SECONDS = metrics.histogram(
+    "saucemall_notification_delivery_seconds", "Notification latency from enqueue to delivery",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
     """
-    发送飞书 (Lark) 机器人通知
+    进程内共享的 HTTP Session (Keep-Alive 连接池)
+    每次 requests.post() 都要重新 DNS + TCP + TLS 握手；Session 会复用到同一个 webhook 的连接。
     """
-    if not webhook_url:
-        logger.warning("未配置 FEISHU_WEBHOOK 环境变量，跳过发送通知。")
-        return
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=int(os.getenv('NOTIFY_POOL_SIZE', 4)))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
 
+
+def build_card(title, text, success=True, status_text=None, footer=DEFAULT_FOOTER):
+    """构造飞书富文本卡片 (status_text 不传时显示构建成功 / 失败)"""
     # 构造颜色和卡片内容
     color = "green" if success else "red"
-    status_text = "✅ 构建成功" if success else "❌ 构建失败"
-    
-    headers = {"Content-Type": "application/json"}
+    if status_text is None:
+        status_text = "✅ 构建成功" if success else "❌ 构建失败"
     
     # 飞书富文本卡片格式
     data = {
@@ -47,22 +82,364 @@ def send_feishu_notification(webhook_url, title, text, success=True):
                     "elements": [
                         {
                             "tag": "plain_text",
-                            "content": "来自 GitHub Actions 自动构建"
+                            "content": footer
                         }
                     ]
                 }
             ]
         }
     }
+    return data
+
+
+def send_feishu_notification(webhook_url, title, text, success=True, status_text=None, footer=DEFAULT_FOOTER):
+    """
+    发送飞书 (Lark) 机器人通知
+    返回是否发送成功 (调用方可以据此重试)
+    """
+    if not webhook_url:
+        logger.warning("未配置 FEISHU_WEBHOOK 环境变量，跳过发送通知。")
+        return False
+
+    data = build_card(title, text, success, status_text, footer)
 
     try:
-        response = requests.post(webhook_url, json=data)
-        if response.status_code == 200:
+        response = get_session().post(webhook_url, json=data, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        # 飞书被限流 / 参数错误时 HTTP 状态码也可能是 200，要看返回体里的 code
+        if response.status_code == 200 and response.json().get("code", 0) == 0:
             logger.info("飞书通知发送成功")
-        else:
-            logger.error(f"飞书通知发送失败: {response.text}")
+            return True
+        logger.error(f"飞书通知发送失败: {response.text}")
     except Exception as e:
         logger.error(f"发送通知时发生异常: {e}")
+    return False
+
+
+class NotificationQueue:
+    """
+    异步通知队列 (后台线程投递)
+    面试亮点：
+    1. 调用方 enqueue() 之后立刻返回，webhook 慢 / 卡住只影响后台线程，不会拖慢爬虫或 API；
+    2. 队列有上限，满了按策略处理 (NOTIFY_OVERFLOW)：
+       drop_oldest 丢最旧的 / drop_newest 丢新来的 / spool 新来的写到磁盘，下次启动再发；
+    3. 令牌桶限流 (默认 5 次/秒突发，100 次/分钟) + 失败按指数退避重试；
+    4. 重试用完仍失败、或者退出时还没发出去的消息写入磁盘 (spool)，进程重启后自动补发；
+    5. 补发也有上限：累计尝试超过 max_attempts 次、或者入队超过 max_age 秒的消息不再重发，
+       移进死信文件 (spool 目录下的 dead_letter.jsonl) 并打一条错误日志，
+       避免 webhook 地址失效 / 消息格式被拒时一条消息永远在磁盘和队列之间打转。
+    """
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "spool")
+    DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+    def __init__(self, webhook_url=None, maxsize=None, overflow=None, spool_dir=None,
+                 rate=None, burst=None, max_retries=None, max_attempts=None, max_age=None,
+                 sender=send_feishu_notification):
+        self.webhook_url = webhook_url if webhook_url is not None else os.getenv("FEISHU_WEBHOOK")
+        self._queue = queue.Queue(maxsize=maxsize or int(os.getenv('NOTIFY_QUEUE_SIZE', 100)))
+        self.overflow = overflow or os.getenv('NOTIFY_OVERFLOW', 'spool')
+        if self.overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"NOTIFY_OVERFLOW must be one of {self.OVERFLOW_POLICIES}, got {self.overflow!r}")
+        self.spool_dir = spool_dir or os.getenv('NOTIFY_SPOOL_DIR', '.notify_spool')
+        # 令牌桶：rate 个/秒匀速补充，最多突发 burst 个
+        self.bucket = TokenBucket(
+            rate=rate or float(os.getenv('NOTIFY_RATE_PER_SEC', 100 / 60)),
+            capacity=burst or int(os.getenv('NOTIFY_BURST', 5)),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('NOTIFY_MAX_RETRIES', 3))
+        # 跨重启累计的尝试次数上限 / 消息最长存活秒数 (默认 20 次 / 24 小时)，超过就进死信文件
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv('NOTIFY_MAX_ATTEMPTS', 20))
+        self.max_age = max_age if max_age is not None else float(os.getenv('NOTIFY_MAX_AGE', 24 * 3600))
+        self.sender = sender
+        self._thread = None
+        self._closing = threading.Event()   # 不再接收新消息，发完队列里的就退出
+        self._abandon = threading.Event()   # 退出等待超时：剩下的不再发送，直接写盘
+
+        # 运行统计
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.dead_lettered = 0
+        self._latencies = deque(maxlen=1000)  # 最近 1000 条消息从入队到送达的耗时 (秒)
+
+    def start(self):
+        """启动后台投递线程，并把上次没发出去的消息重新入队"""
+        if self._thread is not None:
+            return self
+        self._load_spool()
+        self._thread = threading.Thread(target=self._run, name="notification-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def enqueue(self, title, text, **card_options):
+        """放入一条通知，立即返回是否被接收 (不会阻塞)"""
+        if not self.webhook_url:
+            logger.warning("未配置 FEISHU_WEBHOOK 环境变量，跳过发送通知。")
+            return False
+        message = {"title": title, "text": text, "options": card_options,
+                   "enqueued_at": time.time(), "attempts": 0}
+        if self._closing.is_set():
+            self._spool(message)
+            return False
+        self.enqueued += 1
+        NOTIFICATIONS.inc(outcome="enqueued")
+        return self._offer(message)
+
+    def close(self, timeout=None):
+        """停止接收新消息，最多等 timeout 秒把队列发完，剩下的写入磁盘"""
+        if self._thread is None:
+            return
+        timeout = timeout if timeout is not None else float(os.getenv('NOTIFY_DRAIN_TIMEOUT', 5))
+        self._closing.set()
+        self._thread.join(timeout)
+        self._abandon.set()
+        while True:
+            try:
+                self._spool(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._thread = None
+        logger.info(f"通知队列已关闭 | {self.stats()}")
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "spooled": self.spooled,
+            "dead_lettered": self.dead_lettered,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        }
+
+    def _offer(self, message):
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            pass
+        if self.overflow == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+                NOTIFICATIONS.inc(outcome="dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(message)
+                return True
+            except queue.Full:
+                pass
+        elif self.overflow == "spool":
+            self._spool(message)
+            logger.warning("通知队列已满，消息已写入磁盘稍后补发。")
+            return True
+        self.dropped += 1
+        NOTIFICATIONS.inc(outcome="dropped")
+        logger.warning("通知队列已满，丢弃一条通知。")
+        return False
+
+    # ===============================
+    # 后台投递线程
+    # ===============================
+    def _run(self):
+        while True:
+            try:
+                message = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                if self._closing.is_set():
+                    return
+                continue
+            if self._abandon.is_set():
+                self._spool(message)
+                continue
+            self._deliver(message)
+
+    def _deliver(self, message):
+        delays = backoff_delays(self.max_retries)
+        while True:
+            self.bucket.acquire()
+            message["attempts"] += 1
+            if self.sender(self.webhook_url, message["title"], message["text"], **message["options"]):
+                latency = time.time() - message["enqueued_at"]
+                self.delivered += 1
+                self._latencies.append(latency)
+                NOTIFICATIONS.inc(outcome="delivered")
+                NOTIFICATION_DELIVERY_SECONDS.observe(latency)
+                return True
+            delay = next(delays, None)
+            if delay is None or self._abandon.is_set():
+                self.failed += 1
+                NOTIFICATIONS.inc(outcome="failed")
+                if self._give_up(message):
+                    return False
+                logger.error(f"通知发送失败 (已尝试 {message['attempts']} 次)，写入磁盘稍后补发。")
+                self._spool(message)
+                return False
+            self.retries += 1
+            NOTIFICATIONS.inc(outcome="retried")
+            logger.warning(f"通知发送失败，{delay:.1f}s 后重试...")
+            # 可被 close() 打断的等待
+            if self._abandon.wait(delay):
+                self._spool(message)
+                return False
+
+    # ===============================
+    # 磁盘暂存 (Spool)
+    # ===============================
+    def _spool(self, message):
+        """写到磁盘 (先写临时文件再改名，避免写一半)"""
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f"{time.time_ns()}_{uuid.uuid4().hex[:8]}.json")
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(message, f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+            self.spooled += 1
+            NOTIFICATIONS.inc(outcome="spooled")
+        except OSError as e:
+            self.dropped += 1
+            NOTIFICATIONS.inc(outcome="dropped")
+            logger.error(f"通知写入磁盘失败，丢弃: {e}")
+
+    def _give_up(self, message):
+        """尝试次数或存活时间超限的消息移进死信文件，不再补发；返回是否已放弃"""
+        age = time.time() - message.get("enqueued_at", time.time())
+        if message.get("attempts", 0) < self.max_attempts and age < self.max_age:
+            return False
+        summary = (f"通知 '{message.get('title')}' 已尝试 {message.get('attempts', 0)} 次、"
+                   f"存活 {age / 3600:.1f} 小时仍未送达，放弃补发")
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            with open(os.path.join(self.spool_dir, self.DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(message, dead_at=time.time()), ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.dropped += 1
+            NOTIFICATIONS.inc(outcome="dropped")
+            logger.error(f"{summary}，写入死信文件失败，丢弃: {e}")
+            return True
+        self.dead_lettered += 1
+        NOTIFICATIONS.inc(outcome="dead_lettered")
+        logger.error(f"{summary}，已移入死信文件 {self.DEAD_LETTER_FILE}")
+        return True
+
+    def _load_spool(self):
+        try:
+            names = sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".json"))
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    message = json.load(f)
+                os.remove(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取暂存通知失败 {path}: {e}")
+                continue
+            if self._give_up(message):
+                continue
+            # 重新入队；队列放不下的按溢出策略处理 (spool 策略会原样写回磁盘)
+            self._offer(message)
+        if names:
+            logger.info(f"从磁盘恢复了 {len(names)} 条未发送的通知")
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    """进程内共享的通知队列 (懒加载；进程退出时尽量发完，发不完的写盘)"""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = NotificationQueue().start()
+            atexit.register(_notifier.close)
+        return _notifier
+
+
+class NotificationDispatcher:
+    """
+    价格变动通知分发器
+    面试亮点：合并 (Coalescing)：一个抓取周期里的所有变动事件先攒着，flush() 时合成一张卡片，
+    一万个商品同时调价也只发一条消息，而不是一万次阻塞的 POST。
+    卡片交给异步通知队列 (NotificationQueue) 投递，限流 / 重试 / 超时都在后台线程里处理。
+    """
+    def __init__(self, notifier=None, max_lines=None):
+        self.notifier = notifier
+        # 一张卡片里最多列出多少条明细 (其余的只给数量)，卡片太大飞书会拒收
+        self.max_lines = max_lines or int(os.getenv('NOTIFY_MAX_LINES', 30))
+        self._pending = []
+
+        # 运行统计
+        self.cards = 0
+        self.coalesced = 0   # 被合并进卡片的事件总数
+
+    def add(self, event):
+        self._pending.append(event)
+
+    def extend(self, events):
+        self._pending.extend(events)
+
+    def flush(self, title="SauceMall 价格监控"):
+        """把攒着的事件合成一张卡片放进通知队列，立即返回是否入队成功 (没有事件时返回 None)"""
+        if not self._pending:
+            return None
+        events, self._pending = self._pending, []
+        notifier = self.notifier or get_notifier()
+        if not notifier.webhook_url:
+            logger.info(f"未配置 FEISHU_WEBHOOK，{len(events)} 条变动事件只记录日志。")
+            return None
+        self.cards += 1
+        self.coalesced += len(events)
+        return notifier.enqueue(title, self.render(events), status_text=f"🔔 {len(events)} 条变动",
+                                footer="来自 SauceMall 价格监控")
+
+    def render(self, events):
+        """把事件渲染成卡片正文 (lark_md)：汇总 + 按变动幅度排序的明细"""
+        counts = {}
+        for event in events:
+            counts[event.kind] = counts.get(event.kind, 0) + 1
+        lines = [
+            f"**调价** {counts.get('changed', 0)} | **上架** {counts.get('added', 0)} | "
+            f"**下架** {counts.get('removed', 0)}",
+            "",
+        ]
+
+        # 变动幅度大的排在前面 (上下架排在调价后面)
+        def weight(event):
+            return abs(event.pct) if event.pct is not None else -1
+
+        for event in sorted(events, key=weight, reverse=True)[:self.max_lines]:
+            if event.kind == "changed":
+                arrow = "📈" if event.delta > 0 else "📉"
+                pct = f" ({event.pct:+.2f}%)" if event.pct is not None else ""
+                lines.append(f"{arrow} {event.name}: ${event.old_price:.2f} → ${event.new_price:.2f}{pct}")
+            elif event.kind == "added":
+                lines.append(f"🆕 {event.name}: ${event.new_price:.2f}")
+            else:
+                lines.append(f"🗑️ {event.name} (原价 ${event.old_price:.2f})")
+        if len(events) > self.max_lines:
+            lines.append(f"... 其余 {len(events) - self.max_lines} 条省略")
+        return "\n".join(lines)
+
+    def stats(self):
+        return {"cards": self.cards, "coalesced": self.coalesced}
+
 
 if __name__ == "__main__":
     # 从命令行参数获取状态 (可以在 CI yml 里传)
@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流器 (线程安全)
+    面试亮点：为什么用令牌桶而不是固定 sleep？
+    令牌按 rate 个/秒匀速补充，最多攒 capacity 个：平时来一条发一条不用等，
+    短时间突发也能一次发出 capacity 条，持续高频时自动被限制在 rate 的速度，
+    刚好对应飞书机器人 "每秒 5 次 / 每分钟 100 次" 这类限制。
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)          # 每秒补充多少个令牌
+        self.capacity = float(capacity)  # 桶的容量 (允许的最大突发)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """有令牌就拿走返回 True，没有立即返回 False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """阻塞直到拿到令牌；timeout 秒内拿不到返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def backoff_delays(retries, base=0.5, cap=30.0):
+    """
+    指数退避 + 随机抖动 (Full Jitter) 的等待时间序列
+    第 n 次重试等待 [0, min(cap, base * 2^n)] 之间的随机秒数，
+    避免很多客户端在同一时刻一起重试，把刚恢复的服务又打挂。
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
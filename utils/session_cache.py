@@ -0,0 +1,59 @@
+import os
+import re
+import time
+from utils.logger import logger
+
+
+class SessionCache:
+    """
+    登录会话缓存 (按用户保存浏览器 storage state 到磁盘)
+    面试亮点：为什么要缓存登录态？
+    每次抓取都"打开登录页 -> 填表 -> 提交"，是一次完整导航 + 一次表单提交。
+    登录成功后把 Cookie / localStorage 存下来，下次直接带着它打开商品页，
+    会话过期 (被重定向回登录页) 时再自动退回正常登录。
+    """
+    def __init__(self, directory=None, ttl=None):
+        self.directory = directory or os.getenv('SESSION_CACHE_DIR', '.sessions')
+        # SauceDemo 的登录 Cookie 有效期是 10 分钟，默认 TTL 比它略短
+        self.ttl = ttl if ttl is not None else float(os.getenv('SESSION_TTL', 540))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, username):
+        # 用户名只保留安全字符，防止拼出奇怪的路径
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', username)
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def load(self, username):
+        """返回未过期的 storage state 文件路径，没有或已过期返回 None"""
+        path = self.path(username)
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+        if age > self.ttl:
+            logger.info(f"登录会话已过期 ({username}, {age:.0f}s)，需要重新登录")
+            self.invalidate(username)
+            return None
+        return path
+
+    def save(self, context, username):
+        """登录成功后保存当前上下文的 storage state (先写临时文件再改名，避免写一半被读到)"""
+        path = self.path(username)
+        tmp_path = f"{path}.tmp"
+        context.storage_state(path=tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"登录会话已缓存: {path}")
+
+    async def save_async(self, context, username):
+        """异步 API 版本的 save() (playwright.async_api 的 BrowserContext)"""
+        path = self.path(username)
+        tmp_path = f"{path}.tmp"
+        await context.storage_state(path=tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"登录会话已缓存: {path}")
+
+    def invalidate(self, username):
+        try:
+            os.remove(self.path(username))
+        except OSError:
+            pass
@@ -0,0 +1,8 @@
+from app import create_app
+
+# ===============================
+# WSGI 入口 (生产环境)
+# ===============================
+# gunicorn -c gunicorn.conf.py wsgi:app
+# 进程数 / 线程数 / Keep-Alive 等参数见 gunicorn.conf.py
+app = create_app()